@@ -1,29 +1,81 @@
+import sqlite3
 from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from config import config
+from config import config, validate_config
+from .services.admission import AdmissionControl
+from .services.autosave import AutosaveCoalescer
+from .services.counters import CounterAggregator
+from .services.events import ChangeBroker
+from .services.revocation import RevocationList
+from .services.sharding import ShardedSession, ShardRouter
+from .services.themes import ThemeRegistry
+from .services.thumbnails import ThumbnailPipeline
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': ShardedSession})
 jwt = JWTManager()
+admission = AdmissionControl()
+autosave = AutosaveCoalescer()
+counters = CounterAggregator()
+events = ChangeBroker()
+revocations = RevocationList()
+shards = ShardRouter()
+themes = ThemeRegistry()
+thumbnails = ThumbnailPipeline()
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores ON DELETE CASCADE unless foreign keys are switched on per connection."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def init_migrations(app):
+    """Flask-Migrate imports Alembic, which only the ``flask db`` commands need;
+    servers turn it off with ``DB_MIGRATIONS=0``."""
+    from flask_migrate import Migrate
+    Migrate(app, db)
 
 def create_app(config_name='default'):
+    validate_config(config[config_name])
+    
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
     
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    if app.config['DB_MIGRATIONS']:
+        init_migrations(app)
     jwt.init_app(app)
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    revocations.init_app(app)
+    shards.init_app(app)
+    admission.init_app(app)
+    events.init_app(app)
+    autosave.init_app(app)
+    counters.init_app(app)
+    themes.init_app(app)
+    thumbnails.init_app(app)
+    # Retry-After tells the dashboard when to ask for a pending thumbnail again
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['Retry-After'])
     
     # Register blueprints
-    from .routes import auth, resumes, sections
+    from .routes import auth, autosave as autosave_routes, resumes, sections, sync, versions
+    from .routes import thumbnails as thumbnail_routes
     app.register_blueprint(auth.bp, url_prefix='/api/auth')
     app.register_blueprint(resumes.bp, url_prefix='/api/resumes')
+    app.register_blueprint(versions.bp, url_prefix='/api/resumes')
+    app.register_blueprint(autosave_routes.bp, url_prefix='/api/resumes')
     app.register_blueprint(sections.bp, url_prefix='/api/sections')
+    app.register_blueprint(sync.bp, url_prefix='/api/sync')
+    app.register_blueprint(thumbnail_routes.bp, url_prefix='/api')
     
     # Error handlers
     @app.errorhandler(404)
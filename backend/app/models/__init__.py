@@ -2,3 +2,10 @@ from .user import User
 from .resume import Resume
 from .section import Section
 from .entry import Entry
+from .version import ResumeVersion, VersionBlob
+from .change import Change
+from .directory import UserDirectory
+from .revocation import RevokedToken
+from .maintenance import MaintenanceCheckpoint
+from .thumbnail import ResumeThumbnail
+from .stat import ResumeStat
@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from .. import db
+
+class Change(db.Model):
+    """One row of the per-user change journal read by ``GET /api/sync``.
+    
+    ``id`` is the sync cursor: it only grows, and the ``(user_id, id)`` index
+    lets a client catch up in time proportional to what changed. Rows for
+    deleted objects are the tombstones. ``resume_id`` is a plain column so a
+    resume's tombstone outlives the resume itself.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_user_id_id', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    resume_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    object_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<Change {self.id} {self.op} {self.kind} {self.object_id}>'
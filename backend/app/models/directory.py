@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+from .. import db
+
+class UserDirectory(db.Model):
+    """Global index of users, kept in the default database.
+    
+    It allocates user ids, enforces username/email uniqueness across shards
+    and records which shard holds each user's data. ``epoch`` is bumped
+    whenever a user is moved to another shard, which invalidates their sync
+    cursors.
+    """
+    __tablename__ = 'user_directory'
+    # Never routed to a shard; see ShardedSession.get_bind
+    __table_args__ = {'info': {'global': True}}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), index=True, unique=True, nullable=False)
+    email = db.Column(db.String(120), index=True, unique=True, nullable=False)
+    shard = db.Column(db.String(50), nullable=False, default='default')
+    epoch = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<UserDirectory {self.id} on {self.shard}>'
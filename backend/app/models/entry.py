@@ -1,8 +1,12 @@
 from datetime import datetime, timezone
 from .. import db
+from .serialization import serialize
 
 class Entry(db.Model):
     __tablename__ = 'entries'
+    __table_args__ = (
+        db.Index('ix_entries_section_id_order', 'section_id', 'order'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -15,22 +19,18 @@ class Entry(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                          onupdate=lambda: datetime.now(timezone.utc))
-    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id', ondelete='CASCADE'), nullable=False)
+    # Bumped on every write; clients send it back for optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Keys of ``to_dict``, in order; services/records.py reads the same columns
+    FIELDS = ('id', 'title', 'subtitle', 'description', 'start_date', 'end_date', 'current',
+              'order', 'section_id', 'created_at', 'updated_at', 'version')
     
     def __repr__(self):
         return f'<Entry {self.title}>'
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'subtitle': self.subtitle,
-            'description': self.description,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
-            'current': self.current,
-            'order': self.order,
-            'section_id': self.section_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return serialize(self, self.FIELDS)
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from .. import db
+
+class MaintenanceCheckpoint(db.Model):
+    """Progress of one id range of a batched maintenance job on one shard.
+    
+    ``last_key`` is the keyset cursor: the range's rows up to and including
+    it have been processed. ``upper`` is exclusive, and ``None`` for the
+    last range so rows inserted while the job runs are covered too.
+    """
+    __tablename__ = 'maintenance_checkpoints'
+    # Never routed to a shard; see ShardedSession.get_bind
+    __table_args__ = (
+        db.UniqueConstraint('job', 'shard', 'lower', name='uq_maintenance_checkpoints_range'),
+        {'info': {'global': True}},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(100), nullable=False)
+    shard = db.Column(db.String(50), nullable=False, default='default')
+    lower = db.Column(db.Integer, nullable=False)
+    upper = db.Column(db.Integer)
+    last_key = db.Column(db.Integer, nullable=False)
+    batches = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<MaintenanceCheckpoint {self.job} {self.shard} [{self.lower}, {self.upper})>'
@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from .. import db
+from .serialization import serialize
 
 class Resume(db.Model):
     __tablename__ = 'resumes'
@@ -11,23 +12,28 @@ class Resume(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                          onupdate=lambda: datetime.now(timezone.utc))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # Bumped on every write; clients send it back for optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Keys of ``to_dict`` besides ``sections``; services/records.py reads the same columns
+    FIELDS = ('id', 'title', 'slug', 'theme', 'user_id', 'created_at', 'updated_at', 'version')
     
     # Relationships
     sections = db.relationship('Section', backref='resume', lazy='dynamic',
-                             cascade='all, delete-orphan')
+                             cascade='all, delete-orphan', passive_deletes=True)
+    versions = db.relationship('ResumeVersion', backref='resume', lazy='dynamic',
+                             cascade='all, delete-orphan', passive_deletes=True)
+    version_blobs = db.relationship('VersionBlob', lazy='dynamic',
+                                  cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Resume {self.title}>'
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'slug': self.slug,
-            'theme': self.theme,
-            'user_id': self.user_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'sections': [section.to_dict() for section in self.sections]
-        }
+    def to_dict(self, include_sections=True):
+        data = serialize(self, self.FIELDS)
+        if include_sections:
+            data['sections'] = [section.to_dict() for section in self.sections]
+        return data
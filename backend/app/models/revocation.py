@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+from .. import db
+
+class RevokedToken(db.Model):
+    """A revoked access token (``jti``) or every token of a user issued
+    before ``not_before``.
+    
+    Kept in the default database next to the user directory so one table
+    covers every shard. ``expires`` (a Unix time, like the JWT claims) is
+    when the row stops mattering because the tokens it revokes have
+    expired anyway.
+    """
+    __tablename__ = 'revoked_tokens'
+    # Never routed to a shard; see ShardedSession.get_bind
+    __table_args__ = {'info': {'global': True}}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), index=True, unique=True)
+    user_id = db.Column(db.Integer, index=True)
+    # Unix time with sub-second precision; see services/revocation.py
+    not_before = db.Column(db.Float)
+    expires = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        if self.jti:
+            return f'<RevokedToken {self.jti}>'
+        return f'<RevokedToken user {self.user_id} before {self.not_before}>'
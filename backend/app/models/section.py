@@ -1,8 +1,13 @@
 from datetime import datetime, timezone
 from .. import db
+from .entry import Entry
+from .serialization import serialize
 
 class Section(db.Model):
     __tablename__ = 'sections'
+    __table_args__ = (
+        db.Index('ix_sections_resume_id_order', 'resume_id', 'order'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -10,22 +15,23 @@ class Section(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                          onupdate=lambda: datetime.now(timezone.utc))
-    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id'), nullable=False)
+    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id', ondelete='CASCADE'), nullable=False)
+    # Bumped on every write; clients send it back for optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Keys of ``to_dict`` besides ``entries``; services/records.py reads the same columns
+    FIELDS = ('id', 'title', 'order', 'resume_id', 'created_at', 'updated_at', 'version')
     
     # Relationships
     entries = db.relationship('Entry', backref='section', lazy='dynamic',
-                            cascade='all, delete-orphan')
+                            cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Section {self.title}>'
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'order': self.order,
-            'resume_id': self.resume_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'entries': [entry.to_dict() for entry in self.entries.order_by(Entry.order)]
-        }
+        data = serialize(self, self.FIELDS)
+        data['entries'] = [entry.to_dict() for entry in self.entries.order_by(Entry.order)]
+        return data
@@ -0,0 +1,13 @@
+from datetime import date
+
+def serialize(obj, fields):
+    """``{name: value}`` of ``obj``'s ``fields`` in order, dates as ISO strings.
+
+    Shared by the models' ``to_dict`` and the read-only records in
+    services/records.py, so both give the same document.
+    """
+    data = {}
+    for name in fields:
+        value = getattr(obj, name)
+        data[name] = value.isoformat() if isinstance(value, date) else value
+    return data
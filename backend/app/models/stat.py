@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from .. import db
+
+class ResumeStat(db.Model):
+    """View and PDF download totals of a resume.
+    
+    Hits are counted in memory and added here in batches; see
+    services/counters.py.
+    """
+    __tablename__ = 'resume_stats'
+    
+    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id', ondelete='CASCADE'),
+                          primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    downloads = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<ResumeStat of resume {self.resume_id}>'
@@ -0,0 +1,27 @@
+import json
+from datetime import datetime, timezone
+from .. import db
+
+class ResumeThumbnail(db.Model):
+    """Latest page-one thumbnails of a resume, one PNG digest per size.
+    
+    ``fingerprint`` hashes the HTML and stylesheet they were rendered from,
+    so an edit that does not change the rendered page does not re-render it.
+    The images themselves are files named by their SHA-256; see
+    services/thumbnails.py.
+    """
+    __tablename__ = 'resume_thumbnails'
+    
+    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id', ondelete='CASCADE'),
+                          primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    digests = db.Column(db.Text, nullable=False)
+    rendered_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Set while a process renders it; see ThumbnailPipeline._claim
+    claimed_until = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ResumeThumbnail of resume {self.resume_id}>'
+    
+    def digest(self, size):
+        return json.loads(self.digests).get(size)
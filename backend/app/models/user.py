@@ -13,10 +13,12 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), 
                           onupdate=lambda: datetime.now(timezone.utc))
+    # Highest change journal id expired for this user; older cursors resnapshot
+    journal_horizon = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     resumes = db.relationship('Resume', backref='author', lazy='dynamic', 
-                            cascade='all, delete-orphan')
+                            cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from .. import db
+
+class ResumeVersion(db.Model):
+    __tablename__ = 'resume_versions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(100))
+    root_hash = db.Column(db.String(64), nullable=False)
+    # Change journal cursor when the snapshot was taken; None when unknown
+    change_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<ResumeVersion {self.id} of resume {self.resume_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'root_hash': self.root_hash,
+            'resume_id': self.resume_id,
+            'created_at': self.created_at.isoformat()
+        }
+
+class VersionBlob(db.Model):
+    """Content-addressed snapshot of a resume, section or entry.
+    
+    Blobs are keyed by the SHA-256 of their canonical JSON, so an entry that
+    does not change between versions is stored exactly once per resume.
+    """
+    __tablename__ = 'version_blobs'
+    
+    resume_id = db.Column(db.Integer, db.ForeignKey('resumes.id', ondelete='CASCADE'), primary_key=True)
+    hash = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    
+    def __repr__(self):
+        return f'<VersionBlob {self.kind} {self.hash[:12]}>'
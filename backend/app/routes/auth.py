@@ -1,15 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import (
-    create_access_token, get_jwt_identity, jwt_required
+    create_access_token, get_jwt, get_jwt_identity, jwt_required
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 from ..models.user import User
-from .. import db
-from email_validator import validate_email, EmailNotValidError
+from ..models.directory import UserDirectory
+from .. import db, revocations, shards
 
 bp = Blueprint('auth', __name__)
 
 def validate_email_address(email):
+    # Imported here: email_validator is slow to import and only needed at registration
+    from email_validator import validate_email, EmailNotValidError
     try:
         # Validate the email
         valid = validate_email(email)
@@ -31,20 +33,34 @@ def register():
     if not email:
         return {'error': 'Invalid email address'}, 400
     
-    # Check if user already exists
-    if User.query.filter_by(username=data['username']).first():
+    # Check if user already exists; the directory spans every shard
+    if UserDirectory.query.filter_by(username=data['username']).first():
         return {'error': 'Username already exists'}, 400
-    if User.query.filter_by(email=email).first():
+    if UserDirectory.query.filter_by(email=email).first():
         return {'error': 'Email already registered'}, 400
     
+    try:
+        # The directory allocates the id, which decides the user's shard
+        listing = UserDirectory(username=data['username'], email=email)
+        db.session.add(listing)
+        db.session.flush()
+        listing.shard = shards.shard_for_new_user(listing.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Registration error: {str(e)}')
+        return {'error': 'Registration failed'}, 500
+    
     # Create new user
     user = User(
+        id=listing.id,
         username=data['username'],
         email=email
     )
     user.set_password(data['password'])
     
     try:
+        shards.activate(listing.shard)
         db.session.add(user)
         db.session.commit()
         
@@ -58,6 +74,9 @@ def register():
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Registration error: {str(e)}')
+        # Give the username and email back
+        UserDirectory.query.filter_by(id=listing.id).delete()
+        db.session.commit()
         return {'error': 'Registration failed'}, 500
 
 @bp.route('/login', methods=['POST'])
@@ -67,7 +86,11 @@ def login():
     if not all(k in data for k in ['email', 'password']):
         return {'error': 'Missing email or password'}, 400
     
-    user = User.query.filter_by(email=data['email']).first()
+    listing = UserDirectory.query.filter_by(email=data['email']).first()
+    user = None
+    if listing:
+        shards.activate(listing.shard)
+        user = User.query.get(listing.id)
     
     if user and user.check_password(data['password']):
         access_token = user.get_token()
@@ -107,9 +130,26 @@ def change_password():
     
     try:
         user.set_password(data['new_password'])
+        # Sign out every other session; this one continues with a new token
+        revocations.revoke_user(current_user_id)
         db.session.commit()
-        return {'message': 'Password updated successfully'}, 200
+        return {
+            'message': 'Password updated successfully',
+            'access_token': user.get_token()
+        }, 200
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Password change error: {str(e)}')
         return {'error': 'Failed to update password'}, 500
+
+@bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    try:
+        revocations.revoke_token(get_jwt())
+        db.session.commit()
+        return {'message': 'Logged out'}, 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Logout error: {str(e)}')
+        return {'error': 'Failed to log out'}, 500
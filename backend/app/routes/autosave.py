@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from .. import autosave, db
+from ..services.autosave import CONFLICT, NOT_FOUND, SAVED, parse_changes
+from ..services.patching import PatchError
+
+bp = Blueprint('autosave', __name__)
+
+@bp.route('/<int:resume_id>/autosave', methods=['POST'])
+@jwt_required()
+def autosave_resume(resume_id):
+    """Versioned partial updates, coalesced per row; see services/autosave.py.
+
+    Body: ``{"changes": [{"kind", "id", "version", "fields"}], "flush": false}``.
+    Each result carries the version to send with the row's next change.
+    Answers 202 while changes are buffered, 200 once all are written, and
+    409 if any change was based on a stale version.
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True)
+    
+    try:
+        changes = parse_changes(data)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    
+    try:
+        results = autosave.submit(current_user_id, resume_id, changes,
+                                  flush=data.get('flush') is True)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error autosaving resume: {str(e)}')
+        return {'error': 'Failed to save changes'}, 500
+    
+    statuses = {result['status'] for result in results}
+    if CONFLICT in statuses:
+        code = 409
+    elif NOT_FOUND in statuses:
+        code = 404
+    elif statuses == {SAVED}:
+        code = 200
+    else:
+        code = 202
+    return jsonify({'results': results}), code
@@ -1,20 +1,25 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import Resume, Section, User
-from .. import db
-from datetime import datetime
-import re
-from urllib.parse import unquote
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+from ..models import Resume, Section, Entry, User
+from .. import counters, db, events
+from ..services.events import resume_channel
+from ..services.exporter import EXPORT_FORMATS, iter_json_array, iter_resume_documents
+from ..services.importer import import_stream
+from ..services.pdf import PDFUnavailable, load_weasyprint, render_resume_pdf
+from ..services.records import user_resume
+from ..services.preview import fragments, render_preview
+from ..services.patching import (
+    RESUME_FIELDS, PatchError, expected_version, parse_patch, patch_response, timestamp,
+    version_conflict
+)
+from ..services.slugs import slug_for_title, slugify
+from ..services.sync import DELETED, REPLACED, record_change
+from datetime import datetime, timezone
 
 bp = Blueprint('resumes', __name__)
 
-def slugify(text):
-    """Convert text to a URL-friendly slug."""
-    text = unquote(text.lower())
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[\s-]+', '-', text).strip('-_')
-    return text
-
 @bp.route('', methods=['POST'])
 @jwt_required()
 def create_resume():
@@ -43,6 +48,8 @@ def create_resume():
         )
         
         db.session.add(resume)
+        db.session.flush()
+        record_change(current_user_id, resume.id, 'resume', resume.id)
         db.session.commit()
         
         return jsonify(resume.to_dict()), 201
@@ -54,14 +61,79 @@ def create_resume():
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_resumes():
+    """Every resume of the user with its sections and entries, as one JSON array.
+    
+    Streamed a page of ``RESUME_LIST_PAGE_SIZE`` resumes at a time, so memory
+    is bounded by the page rather than the account.
+    """
     current_user_id = get_jwt_identity()
+    documents = iter_resume_documents(user_id=current_user_id,
+                                      page_size=current_app.config['RESUME_LIST_PAGE_SIZE'])
     
     try:
-        resumes = Resume.query.filter_by(user_id=current_user_id).all()
-        return jsonify([r.to_dict() for r in resumes]), 200
+        # Load the first page here, so a failure can still answer 500
+        first = next(documents, None)
     except Exception as e:
         current_app.logger.error(f'Error fetching resumes: {str(e)}')
         return {'error': 'Failed to fetch resumes'}, 500
+    
+    def stream():
+        if first is not None:
+            yield first
+            yield from documents
+    
+    return Response(stream_with_context(iter_json_array(stream())),
+                    mimetype='application/json')
+
+@bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_resumes():
+    """Stream JSON Resume / PaperTrail documents (JSON or NDJSON) into the account."""
+    current_user_id = get_jwt_identity()
+    
+    fmt = request.args.get('format') or \
+        ('ndjson' if 'ndjson' in (request.mimetype or '') else 'json')
+    if fmt not in ('json', 'ndjson'):
+        return {'error': 'Unsupported import format'}, 400
+    
+    try:
+        summary = import_stream(request.stream, current_user_id, fmt,
+                                batch_size=request.args.get('batch_size', type=int))
+        return jsonify(summary), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error importing resumes: {str(e)}')
+        return {'error': 'Failed to import resumes'}, 500
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_resumes():
+    """Stream every resume in the account as NDJSON or a zip, resumable via ``?after=<id>``.
+    
+    Zip exports include a rendered PDF per resume when ``?pdf=1`` is given.
+    """
+    current_user_id = get_jwt_identity()
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return {'error': 'Unsupported export format'}, 400
+    mimetype, extension, serialize = EXPORT_FORMATS[fmt]
+    after_id = request.args.get('after', 0, type=int)
+    options = {'include_pdf': request.args.get('pdf') in ('1', 'true')} if fmt == 'zip' else {}
+    if options.get('include_pdf'):
+        # Fail before streaming starts rather than midway through the archive
+        try:
+            load_weasyprint()
+        except PDFUnavailable as e:
+            current_app.logger.error(f'PDF export unavailable: {str(e)}')
+            return {'error': 'PDF export is not available'}, 503
+    
+    documents = iter_resume_documents(user_id=current_user_id, after_id=after_id)
+    return Response(
+        stream_with_context(serialize(documents, **options)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=resumes.{extension}'}
+    )
 
 @bp.route('/<int:resume_id>', methods=['GET'])
 @jwt_required()
@@ -69,7 +141,7 @@ def get_resume(resume_id):
     current_user_id = get_jwt_identity()
     
     try:
-        resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+        resume = user_resume(current_user_id, resume_id)
         
         if not resume:
             return {'error': 'Resume not found'}, 404
@@ -79,18 +151,101 @@ def get_resume(resume_id):
         current_app.logger.error(f'Error fetching resume: {str(e)}')
         return {'error': 'Failed to fetch resume'}, 500
 
+@bp.route('/<int:resume_id>/stats', methods=['GET'])
+@jwt_required()
+def get_resume_stats(resume_id):
+    """View and PDF download counts, including hits not yet written; see
+    services/counters.py."""
+    current_user_id = get_jwt_identity()
+    
+    try:
+        owned = db.session.query(Resume.id).filter_by(id=resume_id, user_id=current_user_id)\
+            .first()
+        
+        if not owned:
+            return {'error': 'Resume not found'}, 404
+        
+        return jsonify({'resume_id': resume_id, **counters.totals(resume_id)}), 200
+    except Exception as e:
+        current_app.logger.error(f'Error fetching resume stats: {str(e)}')
+        return {'error': 'Failed to fetch resume stats'}, 500
+
+@bp.route('/<int:resume_id>/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def resume_events(resume_id):
+    """Server-sent change feed for an open editor.
+
+    ``EventSource`` cannot set headers, so this endpoint alone also accepts
+    the access token as ``?jwt=``. Reconnecting clients send
+    ``Last-Event-ID`` (or ``?last_event_id=``) to receive what they missed.
+    """
+    current_user_id = get_jwt_identity()
+    
+    try:
+        owned = db.session.query(Resume.id).filter_by(id=resume_id, user_id=current_user_id)\
+            .first()
+        # Release the connection now; the stream may stay open for hours
+        db.session.close()
+        
+        if not owned:
+            return {'error': 'Resume not found'}, 404
+        
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        last_id = int(last_id) if last_id and last_id.isdigit() else None
+    except Exception as e:
+        current_app.logger.error(f'Error opening change feed: {str(e)}')
+        return {'error': 'Failed to open change feed'}, 500
+    
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', 15)
+    retry = current_app.config.get('EVENTS_RETRY_MS', 3000)
+    subscription, missed = events.subscribe(resume_channel(resume_id), last_id)
+    
+    def stream():
+        try:
+            yield f'retry: {retry}\n\n'
+            sent = last_id or 0
+            if missed is None:
+                yield 'event: reset\ndata: {}\n\n'
+            else:
+                for event in missed:
+                    sent = event.id
+                    yield event.encode()
+            while not subscription.closed:
+                event = subscription.get(heartbeat)
+                if event is None:
+                    # Comments keep proxies from timing out an idle stream
+                    yield ': keep-alive\n\n'
+                elif event.id > sent:
+                    sent = event.id
+                    yield event.encode()
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @bp.route('/<int:resume_id>', methods=['PUT'])
 @jwt_required()
 def update_resume(resume_id):
     current_user_id = get_jwt_identity()
     data = request.get_json()
     
+    try:
+        expected = expected_version(data)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    
     try:
         resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
         
         if not resume:
             return {'error': 'Resume not found'}, 404
         
+        if expected is not None and expected != resume.version:
+            return version_conflict(Resume, resume_id)
+        
         if 'title' in data:
             resume.title = data['title']
             # Update slug if title changes
@@ -100,28 +255,84 @@ def update_resume(resume_id):
             resume.theme = data['theme']
         
         resume.updated_at = datetime.utcnow()
+        record_change(current_user_id, resume_id, 'resume', resume_id)
         
         db.session.commit()
         
-        return jsonify(resume.to_dict()), 200
+        doc = resume.to_dict()
+        events.notify(resume_id, 'resume.updated', {key: doc[key] for key in (
+            'id', 'title', 'slug', 'theme', 'updated_at')})
+        return jsonify(doc), 200
+    except StaleDataError:
+        # Another request wrote the resume after it was loaded here
+        db.session.rollback()
+        return version_conflict(Resume, resume_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error updating resume: {str(e)}')
         return {'error': 'Failed to update resume'}, 500
 
+@bp.route('/<int:resume_id>', methods=['PATCH'])
+@jwt_required()
+def patch_resume(resume_id):
+    """Partial update in one UPDATE; ``sections`` is only loaded for ``?return=full``."""
+    current_user_id = get_jwt_identity()
+    
+    try:
+        values, mode, fields = parse_patch(request.get_json(silent=True), RESUME_FIELDS,
+                                           request.args)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    
+    try:
+        if 'title' in values:
+            # Keep the slug in step with the title, as PUT does, but unique
+            values['slug'] = slug_for_title(values['title'], resume_id)
+        
+        updated_at = datetime.now(timezone.utc)
+        version = db.session.execute(
+            update(Resume)
+            .where(Resume.id == resume_id, Resume.user_id == current_user_id)
+            .values(updated_at=updated_at, version=Resume.version + 1, **values)
+            .returning(Resume.version)
+            .execution_options(synchronize_session=False)).scalar()
+        
+        if version is None:
+            db.session.rollback()
+            return {'error': 'Resume not found'}, 404
+        
+        values['version'] = version
+        record_change(current_user_id, resume_id, 'resume', resume_id)
+        db.session.commit()
+        events.notify(resume_id, 'resume.updated',
+                      dict(values, id=resume_id, updated_at=timestamp(updated_at)))
+        
+        def load_full(fields):
+            include_sections = fields is None or 'sections' in fields
+            return Resume.query.get(resume_id).to_dict(include_sections=include_sections)
+        
+        return patch_response(resume_id, values, updated_at, mode, fields, load_full)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error patching resume: {str(e)}')
+        return {'error': 'Failed to update resume'}, 500
+
 @bp.route('/<int:resume_id>', methods=['DELETE'])
 @jwt_required()
 def delete_resume(resume_id):
     current_user_id = get_jwt_identity()
     
     try:
-        resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+        # Sections, entries and versions go with it via ON DELETE CASCADE
+        deleted = Resume.query.filter_by(id=resume_id, user_id=current_user_id)\
+            .delete(synchronize_session=False)
         
-        if not resume:
+        if not deleted:
             return {'error': 'Resume not found'}, 404
         
-        db.session.delete(resume)
+        record_change(current_user_id, resume_id, 'resume', resume_id, DELETED)
         db.session.commit()
+        events.notify(resume_id, 'resume.deleted', {'id': resume_id})
         
         return '', 204
     except Exception as e:
@@ -185,6 +396,7 @@ def duplicate_resume(resume_id):
                 )
                 db.session.add(new_entry)
         
+        record_change(current_user_id, new_resume.id, 'resume', new_resume.id, REPLACED)
         db.session.commit()
         
         return jsonify(new_resume.to_dict()), 201
@@ -199,20 +411,44 @@ def export_pdf(resume_id):
     current_user_id = get_jwt_identity()
     
     try:
-        resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+        resume = user_resume(current_user_id, resume_id)
         
         if not resume:
             return {'error': 'Resume not found'}, 404
         
-        # This is a placeholder for the actual PDF generation
-        # In a real implementation, you would use WeasyPrint or another library
-        # to generate a PDF from the resume data
-        
-        # For now, return a success message with the resume data
-        return jsonify({
-            'message': 'PDF export would be generated here',
-            'resume': resume.to_dict()
-        }), 200
+        pdf = render_resume_pdf(resume.to_dict())
+        counters.increment(resume_id, 'downloads')
+        return Response(pdf, mimetype='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename={resume.slug}.pdf'
+        })
+    except PDFUnavailable as e:
+        current_app.logger.error(f'PDF export unavailable: {str(e)}')
+        return {'error': 'PDF export is not available'}, 503
     except Exception as e:
         current_app.logger.error(f'Error exporting resume: {str(e)}')
         return {'error': 'Failed to export resume'}, 500
+
+@bp.route('/<int:resume_id>/preview', methods=['GET'])
+@jwt_required()
+def preview_resume(resume_id):
+    """Server-rendered HTML preview; unchanged sections come from the fragment cache."""
+    current_user_id = get_jwt_identity()
+    
+    try:
+        resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+        
+        if not resume:
+            return {'error': 'Resume not found'}, 404
+        
+        html, hits, misses = render_preview(resume)
+        # The editor loads the resume through GET /<id>; the preview is what is viewed
+        counters.increment(resume_id, 'views')
+        return Response(html, mimetype='text/html', headers={
+            'Cache-Control': 'no-store',
+            'X-Fragment-Hits': str(hits),
+            'X-Fragment-Misses': str(misses),
+            'X-Fragment-Hit-Rate': f'{fragments.hit_rate():.3f}'
+        })
+    except Exception as e:
+        current_app.logger.error(f'Error rendering resume preview: {str(e)}')
+        return {'error': 'Failed to render preview'}, 500
@@ -1,8 +1,16 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm.exc import StaleDataError
 from ..models import Section, Entry, Resume
-from .. import db
-from datetime import datetime
+from .. import db, events
+from ..services.patching import (
+    ENTRY_FIELDS, SECTION_FIELDS, PatchError, expected_version, parse_patch, patch_response,
+    timestamp, version_conflict
+)
+from ..services.records import resume_sections, section_entries
+from ..services.sync import DELETED, UPSERTED, record_change, record_changes
+from datetime import datetime, timezone
 
 bp = Blueprint('sections', __name__)
 
@@ -10,6 +18,15 @@ def get_resume_for_user(user_id, resume_id):
     """Helper function to get a resume if it belongs to the user."""
     return Resume.query.filter_by(id=resume_id, user_id=user_id).first()
 
+def resume_owned_by(user_id, resume_id):
+    """SQL condition that the resume exists and belongs to the user."""
+    return exists().where(Resume.id == resume_id, Resume.user_id == user_id)
+
+def section_owned_by(user_id, resume_id, section_id):
+    """SQL condition that the section exists in the user's resume."""
+    return exists().where(Section.id == section_id, Section.resume_id == resume_id,
+                          resume_owned_by(user_id, resume_id))
+
 # Section Routes
 @bp.route('/<int:resume_id>/sections', methods=['POST'])
 @jwt_required()
@@ -36,9 +53,13 @@ def create_section(resume_id):
         )
         
         db.session.add(section)
+        db.session.flush()
+        record_change(current_user_id, resume_id, 'section', section.id)
         db.session.commit()
         
-        return jsonify(section.to_dict()), 201
+        doc = section.to_dict()
+        events.notify(resume_id, 'section.created', doc)
+        return jsonify(doc), 201
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error creating section: {str(e)}')
@@ -50,12 +71,11 @@ def get_sections(resume_id):
     current_user_id = get_jwt_identity()
     
     # Check if resume exists and belongs to user
-    resume = get_resume_for_user(current_user_id, resume_id)
-    if not resume:
+    if not db.session.scalar(select(resume_owned_by(current_user_id, resume_id))):
         return {'error': 'Resume not found'}, 404
     
     try:
-        sections = Section.query.filter_by(resume_id=resume_id).order_by(Section.order).all()
+        sections = resume_sections(resume_id)
         return jsonify([s.to_dict() for s in sections]), 200
     except Exception as e:
         current_app.logger.error(f'Error fetching sections: {str(e)}')
@@ -77,16 +97,24 @@ def update_sections_order(resume_id):
     
     try:
         # Update the order of sections
+        moved = []
         for section_data in data['sections']:
             section = Section.query.filter_by(id=section_data['id'], resume_id=resume_id).first()
             if section:
                 section.order = section_data['order']
+                moved.append((resume_id, 'section', section.id, UPSERTED))
         
+        record_changes(current_user_id, moved)
         db.session.commit()
         
         # Return the updated list of sections
         sections = Section.query.filter_by(resume_id=resume_id).order_by(Section.order).all()
+        events.notify(resume_id, 'sections.reordered',
+                      {'order': [{'id': s.id, 'order': s.order} for s in sections]})
         return jsonify([s.to_dict() for s in sections]), 200
+    except StaleDataError:
+        db.session.rollback()
+        return {'error': 'Sections were changed by another request'}, 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error updating sections order: {str(e)}')
@@ -107,6 +135,13 @@ def update_section(resume_id, section_id):
     if not section:
         return {'error': 'Section not found'}, 404
     
+    try:
+        expected = expected_version(data)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    if expected is not None and expected != section.version:
+        return version_conflict(Section, section_id)
+    
     try:
         if 'title' in data:
             section.title = data['title']
@@ -115,14 +150,63 @@ def update_section(resume_id, section_id):
             section.order = data['order']
         
         section.updated_at = datetime.utcnow()
+        record_change(current_user_id, resume_id, 'section', section_id)
         db.session.commit()
         
-        return jsonify(section.to_dict()), 200
+        doc = section.to_dict()
+        events.notify(resume_id, 'section.updated',
+                      {key: value for key, value in doc.items() if key != 'entries'})
+        return jsonify(doc), 200
+    except StaleDataError:
+        # Another request wrote the section after it was loaded here
+        db.session.rollback()
+        return version_conflict(Section, section_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error updating section: {str(e)}')
         return {'error': 'Failed to update section'}, 500
 
+@bp.route('/<int:resume_id>/sections/<int:section_id>', methods=['PATCH'])
+@jwt_required()
+def patch_section(resume_id, section_id):
+    """Partial update in one ownership-checked UPDATE; see services/patching.py."""
+    current_user_id = get_jwt_identity()
+    
+    try:
+        values, mode, fields = parse_patch(request.get_json(silent=True), SECTION_FIELDS,
+                                           request.args)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    
+    try:
+        updated_at = datetime.now(timezone.utc)
+        version = db.session.execute(
+            update(Section)
+            .where(Section.id == section_id, Section.resume_id == resume_id,
+                   resume_owned_by(current_user_id, resume_id))
+            .values(updated_at=updated_at, version=Section.version + 1, **values)
+            .returning(Section.version)
+            .execution_options(synchronize_session=False)).scalar()
+        
+        if version is None:
+            db.session.rollback()
+            return {'error': 'Section not found'}, 404
+        
+        values['version'] = version
+        record_change(current_user_id, resume_id, 'section', section_id)
+        db.session.commit()
+        events.notify(resume_id, 'section.updated',
+                      dict(values, id=section_id, updated_at=timestamp(updated_at)))
+        
+        def load_full(fields):
+            return Section.query.get(section_id).to_dict()
+        
+        return patch_response(section_id, values, updated_at, mode, fields, load_full)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error patching section: {str(e)}')
+        return {'error': 'Failed to update section'}, 500
+
 @bp.route('/<int:resume_id>/sections/<int:section_id>', methods=['DELETE'])
 @jwt_required()
 def delete_section(resume_id, section_id):
@@ -138,12 +222,11 @@ def delete_section(resume_id, section_id):
         return {'error': 'Section not found'}, 404
     
     try:
-        # Delete all entries in this section first
-        Entry.query.filter_by(section_id=section_id).delete()
-        
-        # Then delete the section
+        # Entries are removed by the database via ON DELETE CASCADE
         db.session.delete(section)
+        record_change(current_user_id, resume_id, 'section', section_id, DELETED)
         db.session.commit()
+        events.notify(resume_id, 'section.deleted', {'id': section_id})
         
         return '', 204
     except Exception as e:
@@ -187,9 +270,13 @@ def create_entry(resume_id, section_id):
         )
         
         db.session.add(entry)
+        db.session.flush()
+        record_change(current_user_id, resume_id, 'entry', entry.id)
         db.session.commit()
         
-        return jsonify(entry.to_dict()), 201
+        doc = entry.to_dict()
+        events.notify(resume_id, 'entry.created', doc)
+        return jsonify(doc), 201
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error creating entry: {str(e)}')
@@ -201,16 +288,14 @@ def get_entries(resume_id, section_id):
     current_user_id = get_jwt_identity()
     
     # Check if resume and section exist and belong to user
-    resume = get_resume_for_user(current_user_id, resume_id)
-    if not resume:
+    if not db.session.scalar(select(resume_owned_by(current_user_id, resume_id))):
         return {'error': 'Resume not found'}, 404
     
-    section = Section.query.filter_by(id=section_id, resume_id=resume_id).first()
-    if not section:
+    if not db.session.scalar(select(section_owned_by(current_user_id, resume_id, section_id))):
         return {'error': 'Section not found'}, 404
     
     try:
-        entries = Entry.query.filter_by(section_id=section_id).order_by(Entry.order).all()
+        entries = section_entries(section_id)
         return jsonify([e.to_dict() for e in entries]), 200
     except Exception as e:
         current_app.logger.error(f'Error fetching entries: {str(e)}')
@@ -236,16 +321,26 @@ def update_entries_order(resume_id, section_id):
     
     try:
         # Update the order of entries
+        moved = []
         for entry_data in data['entries']:
             entry = Entry.query.filter_by(id=entry_data['id'], section_id=section_id).first()
             if entry:
                 entry.order = entry_data['order']
+                moved.append((resume_id, 'entry', entry.id, UPSERTED))
         
+        record_changes(current_user_id, moved)
         db.session.commit()
         
         # Return the updated list of entries
         entries = Entry.query.filter_by(section_id=section_id).order_by(Entry.order).all()
+        events.notify(resume_id, 'entries.reordered', {
+            'section_id': section_id,
+            'order': [{'id': e.id, 'order': e.order} for e in entries]
+        })
         return jsonify([e.to_dict() for e in entries]), 200
+    except StaleDataError:
+        db.session.rollback()
+        return {'error': 'Entries were changed by another request'}, 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error updating entries order: {str(e)}')
@@ -270,6 +365,13 @@ def update_entry(resume_id, section_id, entry_id):
     if not entry:
         return {'error': 'Entry not found'}, 404
     
+    try:
+        expected = expected_version(data)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    if expected is not None and expected != entry.version:
+        return version_conflict(Entry, entry_id)
+    
     try:
         if 'title' in data:
             entry.title = data['title']
@@ -293,14 +395,62 @@ def update_entry(resume_id, section_id, entry_id):
             entry.order = data['order']
         
         entry.updated_at = datetime.utcnow()
+        record_change(current_user_id, resume_id, 'entry', entry_id)
         db.session.commit()
         
-        return jsonify(entry.to_dict()), 200
+        doc = entry.to_dict()
+        events.notify(resume_id, 'entry.updated', doc)
+        return jsonify(doc), 200
+    except StaleDataError:
+        # Another request wrote the entry after it was loaded here
+        db.session.rollback()
+        return version_conflict(Entry, entry_id)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error updating entry: {str(e)}')
         return {'error': 'Failed to update entry'}, 500
 
+@bp.route('/<int:resume_id>/sections/<int:section_id>/entries/<int:entry_id>', methods=['PATCH'])
+@jwt_required()
+def patch_entry(resume_id, section_id, entry_id):
+    """Partial update in one ownership-checked UPDATE; see services/patching.py."""
+    current_user_id = get_jwt_identity()
+    
+    try:
+        values, mode, fields = parse_patch(request.get_json(silent=True), ENTRY_FIELDS,
+                                           request.args)
+    except PatchError as e:
+        return {'error': str(e)}, 400
+    
+    try:
+        updated_at = datetime.now(timezone.utc)
+        version = db.session.execute(
+            update(Entry)
+            .where(Entry.id == entry_id, Entry.section_id == section_id,
+                   section_owned_by(current_user_id, resume_id, section_id))
+            .values(updated_at=updated_at, version=Entry.version + 1, **values)
+            .returning(Entry.version)
+            .execution_options(synchronize_session=False)).scalar()
+        
+        if version is None:
+            db.session.rollback()
+            return {'error': 'Entry not found'}, 404
+        
+        values['version'] = version
+        record_change(current_user_id, resume_id, 'entry', entry_id)
+        db.session.commit()
+        events.notify(resume_id, 'entry.updated', dict(
+            values, id=entry_id, section_id=section_id, updated_at=timestamp(updated_at)))
+        
+        def load_full(fields):
+            return Entry.query.get(entry_id).to_dict()
+        
+        return patch_response(entry_id, values, updated_at, mode, fields, load_full)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error patching entry: {str(e)}')
+        return {'error': 'Failed to update entry'}, 500
+
 @bp.route('/<int:resume_id>/sections/<int:section_id>/entries/<int:entry_id>', methods=['DELETE'])
 @jwt_required()
 def delete_entry(resume_id, section_id, entry_id):
@@ -321,7 +471,9 @@ def delete_entry(resume_id, section_id, entry_id):
     
     try:
         db.session.delete(entry)
+        record_change(current_user_id, resume_id, 'entry', entry_id, DELETED)
         db.session.commit()
+        events.notify(resume_id, 'entry.deleted', {'id': entry_id, 'section_id': section_id})
         
         return '', 204
     except Exception as e:
@@ -0,0 +1,39 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from .. import shards
+from ..services.sync import delta_since, format_cursor, parse_cursor, snapshot
+
+bp = Blueprint('sync', __name__)
+
+@bp.route('', methods=['GET'])
+@jwt_required()
+def sync():
+    """Changes since ``?since=<cursor>``; without a cursor, the whole account.
+    
+    Keep calling with the returned ``cursor`` while ``has_more`` is true.
+    A cursor from before the user moved shard also gets the whole account.
+    """
+    current_user_id = get_jwt_identity()
+    
+    cursor = request.args.get('since')
+    try:
+        epoch, since = parse_cursor(cursor) if cursor else (None, 0)
+    except ValueError:
+        return {'error': 'since must be a cursor returned by a previous sync'}, 400
+    
+    try:
+        placement = shards.placement(current_user_id)
+        if placement is None:
+            return {'error': 'User not found'}, 404
+        
+        current_epoch = placement[1]
+        if epoch != current_epoch:
+            delta = snapshot(current_user_id)
+        else:
+            limit = current_app.config.get('SYNC_PAGE_SIZE', 1000)
+            delta = delta_since(current_user_id, since, limit)
+        delta['cursor'] = format_cursor(current_epoch, delta['cursor'])
+        return jsonify(delta), 200
+    except Exception as e:
+        current_app.logger.error(f'Error syncing: {str(e)}')
+        return {'error': 'Failed to sync'}, 500
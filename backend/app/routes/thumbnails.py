@@ -0,0 +1,64 @@
+import json
+import os
+from flask import Blueprint, Response, request, send_file, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
+from ..models import Resume, ResumeThumbnail
+from .. import db, thumbnails
+from ..services.thumbnails import placeholder_svg
+
+bp = Blueprint('thumbnails', __name__)
+
+def placeholder(size, status):
+    response = Response(placeholder_svg(thumbnails.sizes[size]), status=status,
+                        mimetype='image/svg+xml')
+    response.headers['Cache-Control'] = 'no-store'
+    if status == 202:
+        response.headers['Retry-After'] = str(max(int(thumbnails.debounce), 1))
+    return response
+
+@bp.route('/resumes/<int:resume_id>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_thumbnail(resume_id):
+    """Page-one image of a resume, for the dashboard.
+    
+    Answers with the current image, whose ETag is its digest, so a browser
+    revalidates its private copy with a 304; a resume never rendered gets a
+    blank placeholder with 202 while its render is pending. ``?size=`` is
+    one of ``THUMBNAIL_SIZES`` (default ``small``).
+    """
+    current_user_id = get_jwt_identity()
+    size = request.args.get('size', 'small')
+    
+    if size not in thumbnails.sizes:
+        return {'error': f'size must be one of {", ".join(sorted(thumbnails.sizes))}'}, 400
+    
+    try:
+        row = db.session.execute(
+            select(Resume.id, ResumeThumbnail.digests)
+            .outerjoin(ResumeThumbnail, ResumeThumbnail.resume_id == Resume.id)
+            .where(Resume.id == resume_id, Resume.user_id == current_user_id)).first()
+        
+        if not row:
+            return {'error': 'Resume not found'}, 404
+        
+        digest = json.loads(row.digests).get(size) if row.digests else None
+        if digest is None:
+            status = thumbnails.status(resume_id)
+            if status == 'failed':
+                return placeholder(size, 200)
+            if status is None:
+                thumbnails.schedule(resume_id, delay=0)
+            return placeholder(size, 202)
+        
+        path = thumbnails.store.path(digest)
+        if not os.path.exists(path):
+            return {'error': 'Thumbnail not found'}, 404
+        
+        # Until a pending re-render lands, the previous image is served
+        response = send_file(path, mimetype='image/png', etag=digest)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        current_app.logger.error(f'Error fetching thumbnail: {str(e)}')
+        return {'error': 'Failed to fetch thumbnail'}, 500
@@ -0,0 +1,125 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..models import Resume, ResumeVersion
+from .. import db, events
+from ..services.versions import (
+    BlobWriter, build_tree, create_version, diff_trees, restore_version
+)
+from ..services.sync import REPLACED, record_change
+
+bp = Blueprint('versions', __name__)
+
+def get_version(resume_id, version_id):
+    return ResumeVersion.query.filter_by(id=version_id, resume_id=resume_id).first()
+
+@bp.route('/<int:resume_id>/versions', methods=['POST'])
+@jwt_required()
+def create_resume_version(resume_id):
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+
+    resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+    if not resume:
+        return {'error': 'Resume not found'}, 404
+
+    try:
+        version, created = create_version(resume, label=data.get('label'))
+        db.session.commit()
+
+        return jsonify(version.to_dict()), 201 if created else 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error creating resume version: {str(e)}')
+        return {'error': 'Failed to create version'}, 500
+
+@bp.route('/<int:resume_id>/versions', methods=['GET'])
+@jwt_required()
+def get_resume_versions(resume_id):
+    current_user_id = get_jwt_identity()
+
+    resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+    if not resume:
+        return {'error': 'Resume not found'}, 404
+
+    try:
+        versions = resume.versions.order_by(ResumeVersion.id.desc()).all()
+        return jsonify([v.to_dict() for v in versions]), 200
+    except Exception as e:
+        current_app.logger.error(f'Error fetching resume versions: {str(e)}')
+        return {'error': 'Failed to fetch versions'}, 500
+
+@bp.route('/<int:resume_id>/versions/<int:version_id>/diff', methods=['GET'])
+@jwt_required()
+def diff_resume_version(resume_id, version_id):
+    """Diff a version against ``?base=`` (a version id, ``current``, or the previous version)."""
+    current_user_id = get_jwt_identity()
+
+    resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+    if not resume:
+        return {'error': 'Resume not found'}, 404
+
+    version = get_version(resume_id, version_id)
+    if not version:
+        return {'error': 'Version not found'}, 404
+
+    base = request.args.get('base')
+
+    try:
+        writer = None
+        if base == 'current':
+            writer = BlobWriter(resume_id)
+            base_root = build_tree(resume, writer)
+        elif base:
+            if not base.isdigit():
+                return {'error': 'Invalid base version'}, 400
+            base_version = get_version(resume_id, int(base))
+            if not base_version:
+                return {'error': 'Base version not found'}, 404
+            base_root = base_version.root_hash
+        else:
+            previous = resume.versions.filter(ResumeVersion.id < version_id)\
+                .order_by(ResumeVersion.id.desc()).first()
+            base_root = previous.root_hash if previous else None
+
+        if base_root is None:
+            return {'error': 'Version has no predecessor to diff against'}, 400
+
+        return jsonify({
+            'version_id': version.id,
+            'base': base or 'previous',
+            'changes': diff_trees(resume_id, base_root, version.root_hash, writer)
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f'Error diffing resume version: {str(e)}')
+        return {'error': 'Failed to diff version'}, 500
+
+@bp.route('/<int:resume_id>/versions/<int:version_id>/restore', methods=['POST'])
+@jwt_required()
+def restore_resume_version(resume_id, version_id):
+    current_user_id = get_jwt_identity()
+
+    resume = Resume.query.filter_by(id=resume_id, user_id=current_user_id).first()
+    if not resume:
+        return {'error': 'Resume not found'}, 404
+
+    version = get_version(resume_id, version_id)
+    if not version:
+        return {'error': 'Version not found'}, 404
+
+    try:
+        backup, changes = restore_version(resume, version)
+        record_change(current_user_id, resume_id, 'resume', resume_id, REPLACED)
+        db.session.commit()
+        # The whole tree was rewritten; open editors refetch it
+        events.notify(resume_id, 'reset', {'restored_version_id': version.id})
+
+        return jsonify({
+            'message': 'Version restored successfully',
+            'restored_version_id': version.id,
+            'backup_version_id': backup.id,
+            'changes': changes
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error restoring resume version: {str(e)}')
+        return {'error': 'Failed to restore version'}, 500
@@ -0,0 +1,230 @@
+"""Admission control for expensive endpoints.
+
+Each policy in ``ADMISSION_LIMITS`` is keyed by endpoint (``auth.login``) or
+by blueprint (``auth``), the endpoint entry winning, and may set:
+
+* ``rate``/``per``/``burst``: a token bucket per caller (user id when a valid
+  token is presented, otherwise the client IP) refilling ``rate`` tokens every
+  ``per`` seconds up to ``burst``. Empty buckets get ``429``.
+* ``concurrency``: how many requests to the endpoint may run at once across
+  all callers. Extra requests get ``503`` immediately instead of queueing
+  behind a busy worker pool.
+
+Both rejections carry ``Retry-After``. State lives in process memory by
+default; ``ADMISSION_BACKEND = 'sqlite'`` shares it between the workers on a
+host through a small SQLite file.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+class MemoryStore:
+    """Per-process limiter state."""
+
+    # Full buckets are forgotten after this many operations to bound memory
+    SWEEP_EVERY = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.active = {}
+        self.operations = 0
+
+    def take(self, key, rate, capacity):
+        """Take one token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            self.operations += 1
+            if self.operations % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def _sweep(self, now):
+        self.buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+            if now - updated < 3600
+        }
+
+    def acquire(self, key, limit, ttl):
+        with self.lock:
+            if self.active.get(key, 0) >= limit:
+                return None
+            self.active[key] = self.active.get(key, 0) + 1
+            return key
+
+    def release(self, key, token):
+        with self.lock:
+            count = self.active.get(key, 0) - 1
+            if count > 0:
+                self.active[key] = count
+            else:
+                self.active.pop(key, None)
+
+class SQLiteStore:
+    """Limiter state shared by the worker processes of one host.
+
+    Concurrency slots carry an expiry so a worker that dies mid-request
+    cannot leak its slot forever. A bucket row records when it will be full
+    again; past that it is the same as no row, so sweeps delete it.
+    """
+
+    SWEEP_EVERY = MemoryStore.SWEEP_EVERY
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.operations = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                           '(key TEXT PRIMARY KEY, tokens REAL, updated REAL, full_at REAL)')
+        try:
+            # Files created before buckets were swept
+            connection.execute('ALTER TABLE buckets ADD COLUMN full_at REAL')
+        except sqlite3.OperationalError:
+            pass
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)')
+        connection.execute('CREATE TABLE IF NOT EXISTS slots '
+                           '(token TEXT PRIMARY KEY, key TEXT, expires REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_slots_key ON slots (key, expires)')
+
+    def _connection(self):
+        # Connections are per thread and must not survive a fork into workers
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.connection = sqlite3.connect(self.path, timeout=5,
+                                                    isolation_level=None)
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def take(self, key, rate, capacity):
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?',
+                                     (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) '
+                               'VALUES (?, ?, ?, ?)',
+                               (key, tokens, now, now + (capacity - tokens) / rate))
+            self.operations += 1
+            if self.operations % self.SWEEP_EVERY == 0:
+                # One anonymous caller per address: without this the table only grows
+                connection.execute('DELETE FROM buckets WHERE full_at < ? OR full_at IS NULL',
+                                   (now,))
+            connection.execute('COMMIT')
+            return wait
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def acquire(self, key, limit, ttl):
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('DELETE FROM slots WHERE key = ? AND expires < ?', (key, now))
+            (active,) = connection.execute('SELECT COUNT(*) FROM slots WHERE key = ?',
+                                           (key,)).fetchone()
+            token = None
+            if active < limit:
+                token = uuid.uuid4().hex
+                connection.execute('INSERT INTO slots (token, key, expires) VALUES (?, ?, ?)',
+                                   (token, key, now + ttl))
+            connection.execute('COMMIT')
+            return token
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def release(self, key, token):
+        self._connection().execute('DELETE FROM slots WHERE token = ?', (token,))
+
+class AdmissionControl:
+    """Flask extension applying ``ADMISSION_LIMITS`` before each request."""
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_LIMITS', {})
+        app.config.setdefault('ADMISSION_BACKEND', 'memory')
+        app.config.setdefault('ADMISSION_SLOT_TTL', 300)
+        if not app.config.get('ADMISSION_SQLITE_PATH'):
+            app.config['ADMISSION_SQLITE_PATH'] = os.path.join(app.instance_path, 'admission.db')
+        if app.config['ADMISSION_BACKEND'] == 'sqlite':
+            self.store = SQLiteStore(app.config['ADMISSION_SQLITE_PATH'])
+        else:
+            self.store = MemoryStore()
+        self.limits = app.config['ADMISSION_LIMITS']
+        self.slot_ttl = app.config['ADMISSION_SLOT_TTL']
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    def policy_for(self, endpoint, blueprint):
+        if endpoint in self.limits:
+            return self.limits[endpoint]
+        return self.limits.get(blueprint)
+
+    def caller(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            # An expired or malformed token on e.g. /login must not block it
+            identity = None
+        if identity is not None:
+            return f'user:{identity}'
+        # The client's own address once ProxyFix has applied TRUSTED_PROXIES;
+        # otherwise every caller behind the proxy would share one bucket
+        return f'ip:{request.remote_addr}'
+
+    def admit(self):
+        if request.method == 'OPTIONS' or request.endpoint is None:
+            return None
+        policy = self.policy_for(request.endpoint, request.blueprint)
+        if not policy:
+            return None
+
+        if policy.get('rate'):
+            rate = policy['rate'] / policy.get('per', 1)
+            capacity = policy.get('burst', policy['rate'])
+            wait = self.store.take(f'rate:{request.endpoint}:{self.caller()}', rate, capacity)
+            if wait:
+                return ({'error': 'Too many requests'}, 429,
+                        {'Retry-After': str(max(1, math.ceil(wait)))})
+
+        if policy.get('concurrency'):
+            key = f'busy:{request.endpoint}'
+            token = self.store.acquire(key, policy['concurrency'], self.slot_ttl)
+            if token is None:
+                return ({'error': 'Service busy, please retry'}, 503,
+                        {'Retry-After': str(policy.get('retry_after', 1))})
+            g.admission_slot = (key, token)
+        return None
+
+    def release(self, exc=None):
+        slot = g.pop('admission_slot', None)
+        if slot is not None:
+            self.store.release(*slot)
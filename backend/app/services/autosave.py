@@ -0,0 +1,351 @@
+"""Coalescing autosave for the editor.
+
+The editor sends ``POST /api/resumes/<id>/autosave`` as the user types, each
+change carrying the ``version`` of the row it was based on. The first change
+to a row in a burst costs one ownership-and-version query; later ones are
+merged in memory and answered straight away with the row's *pending*
+version, which the client sends back with its next keystroke. A row is
+written once it has been idle for ``AUTOSAVE_WINDOW`` seconds, or at the
+latest ``AUTOSAVE_MAX_DELAY`` seconds after its first buffered change, with
+one conditional UPDATE per row and one commit per user.
+
+Concurrency is optimistic: a change based on an older version than the row
+(or its pending write) gets a conflict instead of waiting on a lock. A
+buffered write beaten by another writer at flush time is reported as an
+``<kind>.conflict`` event on the resume's change feed (services/events.py),
+carrying the row's current version, and again to the next change based on it.
+
+Buffers are per process. When a keystroke reaches a worker other than the
+one buffering the previous burst, its version is ahead of the database. It
+is buffered all the same and answered straight away; at flush time the
+write waits, up to ``AUTOSAVE_MAX_DELAY`` after it was buffered, for that
+burst to land. ``AUTOSAVE_WINDOW = 0`` writes every change through immediately.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import exists, select, update
+from .patching import (
+    ENTRY_FIELDS, RESUME_FIELDS, SECTION_FIELDS, PatchError, timestamp, validate_fields
+)
+from .sharding import current_shard
+
+PENDING = 'pending'
+SAVED = 'saved'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+
+FIELDS = {'resume': RESUME_FIELDS, 'section': SECTION_FIELDS, 'entry': ENTRY_FIELDS}
+
+# Changes accepted in one autosave request
+MAX_CHANGES = 100
+
+def parse_changes(data):
+    """Validate an autosave body; returns ``[(kind, id, version, fields)]``."""
+    changes = data.get('changes') if isinstance(data, dict) else None
+    if not isinstance(changes, list) or not changes:
+        raise PatchError('No changes to save')
+    if len(changes) > MAX_CHANGES:
+        raise PatchError(f'At most {MAX_CHANGES} changes per request')
+    parsed = []
+    for change in changes:
+        if not isinstance(change, dict) or change.get('kind') not in FIELDS:
+            raise PatchError(f"kind must be one of {', '.join(FIELDS)}")
+        for key in ('id', 'version'):
+            value = change.get(key)
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise PatchError(f'{key} must be an integer')
+        parsed.append((change['kind'], change['id'], change['version'],
+                       validate_fields(change.get('fields'), FIELDS[change['kind']])))
+    return parsed
+
+def _target(kind, obj_id, user_id, resume_id):
+    """``(model, parent column, ownership conditions)`` for one row."""
+    from ..models import Resume, Section, Entry
+    owned = exists().where(Resume.id == resume_id, Resume.user_id == user_id)
+    if kind == 'resume':
+        return Resume, None, [Resume.id == obj_id, Resume.id == resume_id,
+                              Resume.user_id == user_id]
+    if kind == 'section':
+        return Section, None, [Section.id == obj_id, Section.resume_id == resume_id, owned]
+    return Entry, Entry.section_id, [
+        Entry.id == obj_id,
+        exists().where(Section.id == Entry.section_id, Section.resume_id == resume_id, owned)
+    ]
+
+class _Pending:
+    __slots__ = ('user_id', 'resume_id', 'section_id', 'expected', 'fields', 'first', 'last',
+                 'ahead')
+
+    def __init__(self, user_id, resume_id, section_id, expected, fields, now, ahead=False):
+        self.user_id = user_id
+        self.resume_id = resume_id
+        self.section_id = section_id
+        # Version of the row in the database; the write makes it ``expected + 1``
+        self.expected = expected
+        self.fields = fields
+        self.first = now
+        self.last = now
+        # Buffered before the database reached ``expected``
+        self.ahead = ahead
+
+    def owned_by(self, user_id, resume_id):
+        return self.user_id == user_id and self.resume_id == resume_id
+
+class AutosaveCoalescer:
+    """Flask extension buffering autosaved changes and writing them in batches."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        # (shard, kind, id) -> _Pending
+        self.pending = {}
+        self.inflight = {}
+        # Pending versions whose write lost to another writer
+        self.lost = OrderedDict()
+        self.max_lost = 10000
+        self.window = 0.5
+        self.max_delay = 3.0
+        self.app = None
+        self.flusher_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOSAVE_WINDOW', 0.5)
+        app.config.setdefault('AUTOSAVE_MAX_DELAY', 3.0)
+        self.window = app.config['AUTOSAVE_WINDOW']
+        self.max_delay = app.config['AUTOSAVE_MAX_DELAY']
+        if self.app is None:
+            atexit.register(self.flush_all)
+        self.app = app
+        app.extensions['autosave'] = self
+
+    def submit(self, user_id, resume_id, changes, flush=False):
+        """Buffer ``(kind, id, version, fields)`` changes; returns a result per change.
+
+        With ``flush`` (or no window) the rows are written before returning.
+        """
+        shard = current_shard()
+        keys = []
+        results = []
+        for kind, obj_id, version, fields in changes:
+            key = (shard, kind, obj_id)
+            result = self._merge(key, user_id, resume_id, version, fields)
+            if result is None:
+                result = self._admit(key, user_id, resume_id, version, fields)
+            if result['status'] == PENDING:
+                keys.append(key)
+            results.append(dict(result, kind=kind, id=obj_id))
+
+        if keys and (flush or self.window <= 0):
+            written = self.flush(keys)
+            for result in results:
+                outcome = written.get((shard, result['kind'], result['id']))
+                if outcome is not None:
+                    result.update(outcome)
+        elif keys:
+            self._start()
+        return results
+
+    def _merge(self, key, user_id, resume_id, version, fields):
+        """Fold a change into the row's buffered write; ``None`` if there is none."""
+        now = time.monotonic()
+        with self.lock:
+            if key in self.lost and self.lost[key] == version:
+                del self.lost[key]
+                return {'status': CONFLICT, 'version': None}
+            pending = self.pending.get(key)
+            if pending is not None:
+                if not pending.owned_by(user_id, resume_id):
+                    return {'status': NOT_FOUND, 'version': None}
+                if version != pending.expected + 1:
+                    return {'status': CONFLICT, 'version': pending.expected + 1}
+                pending.fields.update(fields)
+                pending.last = now
+                return {'status': PENDING, 'version': version}
+            inflight = self.inflight.get(key)
+            # A write that may yet be put back (see ``_write``) cannot be chained onto
+            if inflight is not None and inflight.owned_by(user_id, resume_id) \
+                    and version == inflight.expected + 1 and not inflight.ahead:
+                # Chain onto the write in progress; if it fails, so does this one
+                self.pending[key] = _Pending(user_id, resume_id, inflight.section_id,
+                                             version, dict(fields), now)
+                return {'status': PENDING, 'version': version + 1}
+        return None
+
+    def _admit(self, key, user_id, resume_id, version, fields):
+        """Start buffering a row after checking its owner and version."""
+        from .. import db
+        _, kind, obj_id = key
+        model, parent, owned = _target(kind, obj_id, user_id, resume_id)
+        columns = [model.version] if parent is None else [model.version, parent]
+        row = db.session.execute(select(*columns).where(*owned)).first()
+        db.session.rollback()
+        if row is None:
+            return {'status': NOT_FOUND, 'version': None}
+        if row.version > version:
+            return {'status': CONFLICT, 'version': row.version}
+
+        with self.lock:
+            if key in self.pending or key in self.inflight:
+                # A concurrent request based on the same version got there first
+                return {'status': CONFLICT, 'version': version + 1}
+            # Ahead of the database: another worker is still buffering the
+            # previous burst, which it writes within one window
+            self.pending[key] = _Pending(user_id, resume_id, row[1] if parent is not None else None,
+                                         version, dict(fields), time.monotonic(),
+                                         ahead=row.version < version)
+        return {'status': PENDING, 'version': version + 1}
+
+    def due(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return [key for key, pending in self.pending.items()
+                    if now - pending.last >= self.window
+                    or now - pending.first >= self.max_delay]
+
+    def flush(self, keys=None):
+        """Write the buffered rows in ``keys`` (default: those due).
+
+        Returns ``{key: {'status': ..., 'version': ...}}``. Needs an app context.
+        """
+        from .. import shards
+        keys = self.due() if keys is None else keys
+        with self.lock:
+            batch = {key: self.pending.pop(key) for key in keys if key in self.pending}
+            self.inflight.update(batch)
+        if not batch:
+            return {}
+
+        groups = {}
+        for key, pending in batch.items():
+            groups.setdefault((key[0], pending.user_id), []).append((key, pending))
+        outcomes = {}
+        try:
+            for (shard, user_id), items in groups.items():
+                with shards.use(shard):
+                    outcomes.update(self._write(user_id, items))
+        finally:
+            now = time.monotonic()
+            with self.lock:
+                for key, pending in batch.items():
+                    if self.inflight.get(key) is pending:
+                        del self.inflight[key]
+                    status = outcomes.get(key, {}).get('status')
+                    if status == PENDING and key not in self.pending:
+                        # Still waiting for the database to catch up; retry a window later
+                        pending.last = now
+                        self.pending[key] = pending
+                    elif status != SAVED:
+                        self._lose(key, pending.expected + 1)
+        return outcomes
+
+    def _lose(self, key, version):
+        self.lost[key] = version
+        self.lost.move_to_end(key)
+        while len(self.lost) > self.max_lost:
+            self.lost.popitem(last=False)
+
+    def _write(self, user_id, items):
+        """One transaction for a user's rows on the current shard."""
+        from .. import db, events
+        from .slugs import slug_for_title
+        from .sync import UPSERTED, record_changes
+        updated_at = datetime.now(timezone.utc)
+        outcomes = {}
+        written = []
+        lost = []
+        try:
+            for key, pending in items:
+                _, kind, obj_id = key
+                model, _, owned = _target(kind, obj_id, user_id, pending.resume_id)
+                values = dict(pending.fields)
+                if kind == 'resume' and 'title' in values:
+                    values['slug'] = slug_for_title(values['title'], obj_id)
+                version = db.session.execute(
+                    update(model)
+                    .where(model.version == pending.expected, *owned)
+                    .values(updated_at=updated_at, version=model.version + 1, **values)
+                    .returning(model.version)
+                    .execution_options(synchronize_session=False)).scalar()
+                if version is None:
+                    current = db.session.execute(select(model.version).where(*owned)).scalar()
+                    if pending.ahead and current is not None and current < pending.expected \
+                            and time.monotonic() - pending.first < self.max_delay:
+                        outcomes[key] = {'status': PENDING, 'version': pending.expected + 1}
+                    else:
+                        outcomes[key] = {'status': CONFLICT, 'version': current}
+                        lost.append((key, pending, current))
+                else:
+                    outcomes[key] = {'status': SAVED, 'version': version}
+                    written.append((key, pending, values, version))
+            record_changes(user_id, [(pending.resume_id, key[1], key[2], UPSERTED)
+                                     for key, pending, _, _ in written])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Error flushing autosaved changes: {str(e)}')
+            self._report_lost([(key, pending, None) for key, pending in items])
+            return {key: {'status': CONFLICT, 'version': None} for key, _ in items}
+
+        self._report_lost(lost)
+        for (_, kind, obj_id), pending, values, version in written:
+            data = dict(values, id=obj_id, version=version, updated_at=timestamp(updated_at))
+            if kind == 'entry':
+                data['section_id'] = pending.section_id
+            events.notify(pending.resume_id, f'{kind}.updated', data)
+        return outcomes
+
+    def _report_lost(self, lost):
+        """Tell the resume's editors about buffered writes that were not made.
+
+        The request that buffered them was answered long ago, so the client
+        learns of the loss from the change feed rather than its next change.
+        """
+        from .. import events
+        from .events import resume_channel
+        for (_, kind, obj_id), pending, current in lost:
+            data = {'id': obj_id, 'version': current, 'lost_version': pending.expected + 1,
+                    'fields': sorted(pending.fields)}
+            if kind == 'entry':
+                data['section_id'] = pending.section_id
+            try:
+                events.publish(resume_channel(pending.resume_id), f'{kind}.conflict', data)
+            except Exception as e:
+                current_app.logger.warning(f'Error publishing {kind}.conflict: {str(e)}')
+
+    def flush_all(self):
+        """Write everything still buffered, e.g. when the worker exits."""
+        if self.pending and self.app is not None:
+            with self.app.app_context():
+                self.flush(list(self.pending))
+
+    def _start(self):
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._run, args=(current_app._get_current_object(),),
+                                  name='autosave-flusher', daemon=True)
+        thread.start()
+
+    def _run(self, app):
+        tick = max(self.window / 2, 0.05)
+        while True:
+            time.sleep(tick)
+            if not self.due():
+                continue
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception as e:
+                app.logger.error(f'Error in autosave flusher: {str(e)}')
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'inflight': len(self.inflight)}
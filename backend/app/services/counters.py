@@ -0,0 +1,196 @@
+"""Write-behind view and download counters.
+
+A view is a rendered preview (``GET /api/resumes/<id>/preview``) and a
+download a PDF export. Counting a hit with its own UPDATE would turn every
+one of them into a write transaction. ``increment`` adds to an in-memory delta
+instead, and a flusher thread adds the deltas to ``resume_stats`` with one
+upsert per shard every ``COUNTER_FLUSH_INTERVAL`` seconds, or as soon as
+``COUNTER_FLUSH_EVENTS`` hits have accumulated. Deltas are flushed from an
+``atexit`` hook and gunicorn's ``worker_exit`` when a worker stops; a worker
+that is killed loses at most one interval of hits.
+
+``totals`` adds this process's unflushed deltas to the stored totals, so a
+user sees their own views straight away; hits counted by other workers
+show up after those workers' next flush.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from .sharding import current_shard
+
+COUNTERS = ('views', 'downloads')
+
+class CounterAggregator:
+    """Flask extension buffering resume counters in memory."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        # One flush at a time, so ``inflight`` belongs to it
+        self.flush_lock = threading.Lock()
+        # (shard, resume id) -> {counter: delta}
+        self.pending = {}
+        # Deltas taken by a flush that has not committed yet
+        self.inflight = {}
+        self.events = 0
+        self.interval = 5
+        self.max_events = 1000
+        self.wakeup = threading.Event()
+        self.app = None
+        self.flusher_pid = None
+        self.flushes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COUNTER_FLUSH_INTERVAL', 5)
+        app.config.setdefault('COUNTER_FLUSH_EVENTS', 1000)
+        self.interval = app.config['COUNTER_FLUSH_INTERVAL']
+        self.max_events = app.config['COUNTER_FLUSH_EVENTS']
+        if self.app is None:
+            atexit.register(self.flush_all)
+        self.app = app
+        app.extensions['counters'] = self
+
+    def increment(self, resume_id, counter, amount=1):
+        """Count ``amount`` hits of ``counter`` on ``resume_id`` (current shard)."""
+        if counter not in COUNTERS:
+            raise ValueError(f'Unknown counter {counter!r}')
+        key = (current_shard(), resume_id)
+        with self.lock:
+            deltas = self.pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            deltas[counter] += amount
+            self.events += amount
+            full = self.events >= self.max_events
+        if full:
+            self.wakeup.set()
+        self._start()
+
+    def totals(self, resume_id):
+        """Stored totals of ``resume_id`` plus the deltas not yet written."""
+        from .. import db
+        from ..models import ResumeStat
+        row = db.session.execute(select(ResumeStat.views, ResumeStat.downloads)
+                                 .where(ResumeStat.resume_id == resume_id)).first()
+        totals = dict(zip(COUNTERS, row)) if row else dict.fromkeys(COUNTERS, 0)
+        key = (current_shard(), resume_id)
+        with self.lock:
+            for buffered in (self.inflight, self.pending):
+                for counter, delta in buffered.get(key, {}).items():
+                    totals[counter] += delta
+        return totals
+
+    def flush(self):
+        """Write every buffered delta; needs an app context."""
+        from .. import db, shards
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                taken, self.pending, self.events = self.pending, {}, 0
+                self.inflight = dict(taken)
+            by_shard = {}
+            for (shard, resume_id), deltas in taken.items():
+                by_shard.setdefault(shard, {})[resume_id] = deltas
+            written = 0
+            for shard, deltas in by_shard.items():
+                try:
+                    with shards.use(shard):
+                        written += self._write(deltas)
+                        db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f'Error writing counters on shard {shard}: {str(e)}')
+                    self._settle(shard, deltas, restore=True)
+                else:
+                    self._settle(shard, deltas)
+            self.flushes += 1
+            return written
+
+    def _settle(self, shard, deltas, restore=False):
+        """Take a shard's deltas out of ``inflight`` once its commit is done.
+
+        With ``restore`` they failed to write and go back to ``pending`` for
+        the next flush, in the same step so ``totals`` counts them once.
+        """
+        with self.lock:
+            for resume_id, counts in deltas.items():
+                key = (shard, resume_id)
+                self.inflight.pop(key, None)
+                if not restore:
+                    continue
+                pending = self.pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                for counter, delta in counts.items():
+                    pending[counter] += delta
+                    self.events += delta
+
+    def _write(self, deltas):
+        """Add ``{resume id: {counter: delta}}`` to ``resume_stats`` in one upsert."""
+        from .. import db
+        from ..models import Resume, ResumeStat
+        stats = ResumeStat.__table__
+        # Hits on resumes deleted since are dropped rather than failing the batch
+        live = set(db.session.execute(select(Resume.id).where(Resume.id.in_(list(deltas))))
+                   .scalars())
+        rows = [dict(resume_id=resume_id, updated_at=datetime.now(timezone.utc), **counts)
+                for resume_id, counts in deltas.items() if resume_id in live]
+        if not rows:
+            return 0
+        dialect = db.session.get_bind(mapper=ResumeStat.__mapper__).dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            statement = upsert(stats)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=[stats.c.resume_id],
+                set_={**{counter: stats.c[counter] + statement.excluded[counter]
+                         for counter in COUNTERS},
+                      'updated_at': statement.excluded.updated_at}), rows)
+            return len(rows)
+        # Elsewhere: add to the rows that exist, then insert the rest
+        existing = set(db.session.execute(select(stats.c.resume_id)
+                                          .where(stats.c.resume_id.in_(list(live)))).scalars())
+        for row in rows:
+            if row['resume_id'] in existing:
+                db.session.execute(update(stats).where(stats.c.resume_id == row['resume_id'])
+                                   .values(updated_at=row['updated_at'],
+                                           **{counter: stats.c[counter] + row[counter]
+                                              for counter in COUNTERS}))
+        fresh = [row for row in rows if row['resume_id'] not in existing]
+        if fresh:
+            db.session.execute(insert(stats), fresh)
+        return len(rows)
+
+    def flush_all(self):
+        """Write everything still buffered, e.g. when the worker exits."""
+        if self.pending and self.app is not None:
+            with self.app.app_context():
+                self.flush()
+
+    def _start(self):
+        with self.lock:
+            if self.flusher_pid == os.getpid() or self.app is None:
+                return
+            self.flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='counter-flusher', daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                self.app.logger.error(f'Error in counter flusher: {str(e)}')
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'events': self.events,
+                    'flushes': self.flushes}
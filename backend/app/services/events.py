@@ -0,0 +1,297 @@
+"""Change feed for open resume editors.
+
+Mutating routes publish small deltas (``entry.updated``, ``section.deleted``,
+``sections.reordered``...) to the resume's channel after they commit, and
+``GET /api/resumes/<id>/events`` streams them to the browser as server-sent
+events. Each channel keeps the last ``EVENTS_HISTORY`` events so a client
+reconnecting with ``Last-Event-ID`` receives what it missed; if it fell
+further behind it gets a ``reset`` event and refetches the resume.
+
+Events are fanned out in process by default. ``EVENTS_BACKEND = 'sqlite'``
+routes them through a small SQLite file instead, so an edit served by one
+worker reaches editors connected to another worker on the same host; each
+process then runs one poller thread that dispatches new rows locally.
+
+Subscribers wait on a queue rather than a worker thread of their own, so
+under the gevent worker an idle connection costs one greenlet.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import current_app
+from .sharding import current_shard
+
+class Event:
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, id, type, data):
+        self.id = id
+        self.type = type
+        self.data = data
+
+    def encode(self):
+        return f'id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n'
+
+class Subscription:
+    """One connected client; ``get`` returns ``None`` when the wait times out."""
+
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A client this far behind resumes from Last-Event-ID instead
+            self.closed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.closed = True
+        self.broker.unsubscribe(self)
+
+class _Channel:
+    __slots__ = ('history', 'subscribers', 'since')
+
+    def __init__(self, history, since):
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        # Events up to this id are no longer (or never were) in ``history``
+        self.since = since
+
+class MemoryBackend:
+    """Event ids are per process; enough for a single worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = 0
+
+    def publish(self, broker, channel, event_type, data):
+        # Dispatch under the lock too, so subscribers get ids in ascending order
+        with self.lock:
+            self.last_id += 1
+            event = Event(self.last_id, event_type, data)
+            broker.dispatch(channel, event)
+        return event.id
+
+    def replay(self, broker, channel, last_id):
+        return broker.local_replay(channel, last_id)
+
+    def start(self, broker):
+        pass
+
+class SQLiteBackend:
+    """Events shared by the worker processes of one host through a SQLite file."""
+
+    def __init__(self, path, poll_interval, retention):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.local = threading.local()
+        self.wakeup = threading.Event()
+        self.poller_pid = None
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS events '
+                           '(id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, '
+                           'type TEXT, data TEXT)')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_events_channel '
+                           'ON events (channel, id)')
+
+    def _connection(self):
+        # Connections are per thread and must not survive a fork into workers
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.connection = sqlite3.connect(self.path, timeout=5,
+                                                    isolation_level=None)
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def publish(self, broker, channel, event_type, data):
+        cursor = self._connection().execute(
+            'INSERT INTO events (channel, type, data) VALUES (?, ?, ?)',
+            (channel, event_type, data))
+        event_id = cursor.lastrowid
+        if event_id % 1000 == 0:
+            self._connection().execute('DELETE FROM events WHERE id <= ?',
+                                       (event_id - self.retention,))
+        # Deliver to this process's subscribers without waiting for the next poll
+        self.wakeup.set()
+        return event_id
+
+    def replay(self, broker, channel, last_id):
+        connection = self._connection()
+        oldest, newest = connection.execute('SELECT MIN(id), MAX(id) FROM events').fetchone()
+        if oldest is not None and (oldest > last_id + 1 or newest < last_id):
+            # Trimmed past the client's position, or an id from another file
+            return None
+        rows = connection.execute(
+            'SELECT id, type, data FROM events WHERE channel = ? AND id > ? ORDER BY id',
+            (channel, last_id)).fetchall()
+        return [Event(*row) for row in rows]
+
+    def start(self, broker):
+        with self.lock:
+            if self.poller_pid == os.getpid():
+                return
+            self.poller_pid = os.getpid()
+        thread = threading.Thread(target=self._poll, args=(broker,), name='events-poller',
+                                  daemon=True)
+        thread.start()
+
+    def _poll(self, broker):
+        connection = self._connection()
+        (last_id,) = connection.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                rows = connection.execute(
+                    'SELECT id, channel, type, data FROM events WHERE id > ? ORDER BY id',
+                    (last_id,)).fetchall()
+            except sqlite3.Error:
+                time.sleep(self.poll_interval)
+                continue
+            for event_id, channel, event_type, data in rows:
+                broker.dispatch(channel, Event(event_id, event_type, data))
+                last_id = event_id
+
+class ChangeBroker:
+    """Flask extension fanning change events out to subscribed clients."""
+
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        self.lock = threading.Lock()
+        self.channels = OrderedDict()
+        self.last_dispatched = 0
+        self.history = 256
+        self.max_channels = 10000
+        self.max_pending = 1000
+        # Called as ``listener(resume_id, event_type)`` for changes made here
+        self.listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_BACKEND', 'memory')
+        app.config.setdefault('EVENTS_HISTORY', 256)
+        app.config.setdefault('EVENTS_MAX_CHANNELS', 10000)
+        app.config.setdefault('EVENTS_MAX_PENDING', 1000)
+        self.history = app.config['EVENTS_HISTORY']
+        self.max_channels = app.config['EVENTS_MAX_CHANNELS']
+        self.max_pending = app.config['EVENTS_MAX_PENDING']
+        if not app.config.get('EVENTS_SQLITE_PATH'):
+            app.config['EVENTS_SQLITE_PATH'] = os.path.join(app.instance_path, 'events.db')
+        if app.config['EVENTS_BACKEND'] == 'sqlite':
+            self.backend = SQLiteBackend(app.config['EVENTS_SQLITE_PATH'],
+                                         app.config.get('EVENTS_POLL_INTERVAL', 0.5),
+                                         app.config.get('EVENTS_RETENTION', 100000))
+        else:
+            self.backend = MemoryBackend()
+        app.extensions['events'] = self
+
+    def _channel(self, name):
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = _Channel(self.history, self.last_dispatched)
+            # Forget the least recently used channels nobody is listening to
+            if len(self.channels) > self.max_channels:
+                for stale in list(self.channels):
+                    if len(self.channels) <= self.max_channels:
+                        break
+                    if not self.channels[stale].subscribers:
+                        del self.channels[stale]
+        self.channels.move_to_end(name)
+        return channel
+
+    def publish(self, channel, event_type, data):
+        """Publish ``data`` (JSON-serialisable) on ``channel``; returns the event id."""
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        return self.backend.publish(self, channel, event_type, payload)
+
+    def notify(self, resume_id, event_type, data):
+        """Publish a change to ``resume_id``'s editors once it is committed.
+
+        Failures are logged, not raised: the write already succeeded, and a
+        lost event only costs the clients a refetch on their next reset.
+        """
+        for listener in self.listeners:
+            try:
+                listener(resume_id, event_type)
+            except Exception as e:
+                current_app.logger.warning(f'Error handling {event_type}: {str(e)}')
+        try:
+            return self.publish(resume_channel(resume_id), event_type, data)
+        except Exception as e:
+            current_app.logger.warning(f'Error publishing {event_type}: {str(e)}')
+            return None
+
+    def listen(self, listener):
+        """Also tell ``listener`` about every change committed by this process."""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def dispatch(self, name, event):
+        with self.lock:
+            channel = self._channel(name)
+            if len(channel.history) == channel.history.maxlen:
+                channel.since = channel.history[0].id
+            channel.history.append(event)
+            self.last_dispatched = max(self.last_dispatched, event.id)
+            subscribers = list(channel.subscribers)
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def local_replay(self, name, last_id):
+        with self.lock:
+            channel = self._channel(name)
+            if not channel.since <= last_id <= self.last_dispatched:
+                # Older than the ring buffer, or an id from before a restart
+                return None
+            return [event for event in channel.history if event.id > last_id]
+
+    def subscribe(self, channel, last_id=None):
+        """Subscribe to ``channel``; returns ``(subscription, missed)``.
+
+        ``missed`` lists the events after ``last_id``, or is ``None`` when
+        they are no longer all available and the client must resynchronise.
+        """
+        self.backend.start(self)
+        subscription = Subscription(self, channel, self.max_pending)
+        with self.lock:
+            self._channel(channel).subscribers.add(subscription)
+        missed = [] if last_id is None else self.backend.replay(self, channel, last_id)
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            channel = self.channels.get(subscription.channel)
+            if channel is not None:
+                channel.subscribers.discard(subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'channels': len(self.channels),
+                'subscribers': sum(len(c.subscribers) for c in self.channels.values())
+            }
+
+def resume_channel(resume_id):
+    # Resume ids are only unique within a shard
+    return f'resume:{current_shard()}:{resume_id}'
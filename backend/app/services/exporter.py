@@ -0,0 +1,98 @@
+"""Streaming bulk export of resumes.
+
+Resumes are walked in id order one keyset page at a time, so memory stays
+bounded by the page size rather than the account size, and an interrupted
+export can resume from the last id it produced (the ``after`` cursor).
+Documents use the ``Resume.to_dict`` shape, which the importer accepts back.
+"""
+import io
+import json
+import zipfile
+
+from flask import current_app
+from .. import db
+from .pdf import render_resume_pdf
+from .records import ResumeRecord, attach_sections, fetch
+
+def load_documents(resumes):
+    """Full ``Resume.to_dict`` documents for ``ResumeRecord`` s, in the same order."""
+    return [resume.to_dict() for resume in attach_sections(resumes)]
+
+def _load_page(user_id, after_id, page_size):
+    resumes = ResumeRecord.table
+    stmt = ResumeRecord.select().where(resumes.c.id > after_id)\
+        .order_by(resumes.c.id).limit(page_size)
+    if user_id is not None:
+        stmt = stmt.where(resumes.c.user_id == user_id)
+    return load_documents(fetch(ResumeRecord, stmt))
+
+def iter_resume_documents(user_id=None, after_id=0, page_size=None):
+    """Yield resume documents with ``id > after_id`` in id order.
+
+    ``user_id=None`` walks every account. The session is released between
+    pages so a long export does not hold one transaction open throughout.
+    """
+    page_size = page_size or current_app.config.get('EXPORT_PAGE_SIZE', 100)
+    while True:
+        page = _load_page(user_id, after_id, page_size)
+        db.session.rollback()
+        if not page:
+            return
+        for doc in page:
+            yield doc
+        after_id = page[-1]['id']
+
+def iter_ndjson(documents):
+    for doc in documents:
+        yield json.dumps(doc, separators=(',', ':')) + '\n'
+
+def iter_json_array(documents):
+    """One JSON array, a document at a time, encoded as ``jsonify`` would."""
+    separator = '['
+    for doc in documents:
+        yield separator + current_app.json.dumps(doc)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+class _ZipBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink that hands back what was written so far."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def resume_filename(doc, extension):
+    return f"{doc['id']}-{doc['slug']}.{extension}"
+
+def iter_zip(documents, include_pdf=False):
+    """Yield a zip archive holding ``<id>-<slug>.json`` (and ``.pdf``) per resume.
+
+    Entries are written with data descriptors, so each member can be sent as
+    soon as it is compressed instead of building the archive in memory.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for doc in documents:
+            archive.writestr(resume_filename(doc, 'json'), json.dumps(doc, indent=2))
+            if include_pdf:
+                # PDFs are already compressed internally
+                archive.writestr(resume_filename(doc, 'pdf'), render_resume_pdf(doc),
+                                 compress_type=zipfile.ZIP_STORED)
+            yield buffer.drain()
+    yield buffer.drain()
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson', iter_ndjson),
+    'zip': ('application/zip', 'zip', iter_zip),
+}
@@ -0,0 +1,472 @@
+"""Streaming bulk import of resumes.
+
+Records are parsed one at a time from NDJSON (one document per line) or from
+a JSON stream holding a single document, a top-level array of documents or
+several concatenated documents. A record that cannot be parsed, or is
+larger than ``max_record_bytes``, is reported and skipped, and reading
+resumes with the record after it. Each record may be a JSON Resume
+(https://jsonresume.org/schema) or a PaperTrail export as produced by
+``Resume.to_dict``. Valid records are inserted in batches of ``batch_size``
+with three multi-row INSERTs per batch (resumes, sections, entries), using
+``RETURNING`` to remap the new ids onto child rows.
+"""
+import codecs
+import json
+import re
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import insert
+from .. import db
+from ..models import Resume, Section, Entry
+from .slugs import SlugAllocator
+from .sync import REPLACED, record_changes
+
+READ_SIZE = 64 * 1024
+MAX_BATCH_SIZE = 5000
+
+# (JSON Resume key, section title, title fields, subtitle fields, start date, end date)
+JSON_RESUME_SECTIONS = (
+    ('work', 'Work Experience', ('name', 'company'), ('position',), 'startDate', 'endDate'),
+    ('volunteer', 'Volunteer', ('organization',), ('position',), 'startDate', 'endDate'),
+    ('education', 'Education', ('institution',), ('studyType', 'area'), 'startDate', 'endDate'),
+    ('projects', 'Projects', ('name',), ('entity', 'type'), 'startDate', 'endDate'),
+    ('awards', 'Awards', ('title',), ('awarder',), 'date', None),
+    ('certificates', 'Certificates', ('name',), ('issuer',), 'date', None),
+    ('publications', 'Publications', ('name',), ('publisher',), 'releaseDate', None),
+    ('skills', 'Skills', ('name',), ('level',), None, None),
+    ('languages', 'Languages', ('language',), ('fluency',), None, None),
+    ('interests', 'Interests', ('name',), (), None, None),
+    ('references', 'References', ('name',), (), None, None),
+)
+
+# Column limits, checked up front so one oversized value fails its own
+# record instead of the whole batch
+MAX_LENGTHS = {'resume': 100, 'section': 100, 'entry': 200}
+
+class RecordError(ValueError):
+    """A single input record could not be parsed or mapped."""
+
+def _parse_date(value, field):
+    """Parse ``YYYY``, ``YYYY-MM`` or ``YYYY-MM-DD`` (JSON Resume allows all three)."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    parts = str(value).split('T')[0].split('-')
+    try:
+        numbers = [int(p) for p in parts] + [1] * (3 - len(parts))
+        return date(*numbers[:3])
+    except (TypeError, ValueError):
+        raise RecordError(f'Invalid date for {field}: {value!r}')
+
+def _text(value, field, kind):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    if len(value) > MAX_LENGTHS[kind]:
+        raise RecordError(f'{field} is longer than {MAX_LENGTHS[kind]} characters')
+    return value
+
+def _first(item, keys):
+    for key in keys:
+        if item.get(key):
+            return item[key]
+    return None
+
+def _description(item):
+    lines = []
+    for key in ('summary', 'description', 'reference'):
+        if item.get(key):
+            lines.append(str(item[key]))
+    for key in ('highlights', 'keywords', 'courses', 'roles'):
+        if isinstance(item.get(key), list) and item[key]:
+            lines.extend(f'- {value}' for value in item[key])
+    if item.get('url'):
+        lines.append(str(item['url']))
+    return '\n'.join(lines)
+
+def _map_json_resume(doc):
+    basics = doc.get('basics') or {}
+    meta = doc.get('meta') or {}
+    title = basics.get('name') or basics.get('label') or 'Imported resume'
+    sections = []
+    for key, section_title, title_keys, subtitle_keys, start_key, end_key in JSON_RESUME_SECTIONS:
+        items = doc.get(key)
+        if not items:
+            continue
+        if not isinstance(items, list):
+            raise RecordError(f'{key} must be a list')
+        entries = []
+        for position, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                raise RecordError(f'{key}[{position - 1}] must be an object')
+            entry_title = _first(item, title_keys)
+            if not entry_title:
+                raise RecordError(f'{key}[{position - 1}] has no {title_keys[0]}')
+            subtitle = ', '.join(str(item[k]) for k in subtitle_keys if item.get(k))
+            start_date = _parse_date(item.get(start_key), f'{key}.{start_key}') if start_key else None
+            end_date = _parse_date(item.get(end_key), f'{key}.{end_key}') if end_key else None
+            entries.append({
+                'title': _text(entry_title, f'{key}.{title_keys[0]}', 'entry'),
+                'subtitle': _text(subtitle, f'{key} subtitle', 'entry'),
+                'description': _description(item),
+                'start_date': start_date,
+                'end_date': end_date,
+                'current': bool(end_key and start_date and not end_date),
+                'order': position
+            })
+        sections.append({'title': section_title, 'order': len(sections) + 1, 'entries': entries})
+    return {
+        'title': _text(title, 'basics.name', 'resume'),
+        'theme': meta.get('theme') or 'classic',
+        'sections': sections
+    }
+
+def _map_papertrail(doc):
+    if not doc.get('title'):
+        raise RecordError('Missing required field: title')
+    sections = []
+    for position, section in enumerate(doc.get('sections') or [], 1):
+        if not isinstance(section, dict) or not section.get('title'):
+            raise RecordError(f'sections[{position - 1}] is missing a title')
+        entries = []
+        for entry_position, entry in enumerate(section.get('entries') or [], 1):
+            if not isinstance(entry, dict) or not entry.get('title'):
+                raise RecordError(f'sections[{position - 1}].entries[{entry_position - 1}] '
+                                  'is missing a title')
+            entries.append({
+                'title': _text(entry['title'], 'entry title', 'entry'),
+                'subtitle': _text(entry.get('subtitle', ''), 'entry subtitle', 'entry'),
+                'description': entry.get('description', ''),
+                'start_date': _parse_date(entry.get('start_date'), 'start_date'),
+                'end_date': _parse_date(entry.get('end_date'), 'end_date'),
+                'current': bool(entry.get('current', False)),
+                'order': entry.get('order', entry_position)
+            })
+        sections.append({
+            'title': _text(section['title'], 'section title', 'section'),
+            'order': section.get('order', position),
+            'entries': entries
+        })
+    return {
+        'title': _text(doc['title'], 'title', 'resume'),
+        'theme': doc.get('theme') or 'classic',
+        'sections': sections
+    }
+
+def map_record(doc):
+    """Normalise one input document into ``{title, theme, sections: [...]}``."""
+    if not isinstance(doc, dict):
+        raise RecordError('Record must be a JSON object')
+    if isinstance(doc.get('sections'), list):
+        return _map_papertrail(doc)
+    return _map_json_resume(doc)
+
+def _iter_lines(stream, max_record_bytes):
+    """Yield ``(line_number, bytes)`` pairs, with ``None`` for lines over the limit.
+
+    Reads fixed-size chunks, so an overlong line is skipped rather than held
+    in memory whole.
+    """
+    pending = b''
+    number = 0
+    skipping = False
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            break
+        data = pending + chunk if pending else chunk
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            number += 1
+            yield number, None if skipping or end - start > max_record_bytes else data[start:end]
+            skipping = False
+            start = end + 1
+        pending = data[start:]
+        if skipping or len(pending) > max_record_bytes:
+            skipping = True
+            pending = b''
+    if skipping or pending:
+        yield number + 1, None if skipping else pending
+
+def _iter_ndjson(stream, max_record_bytes):
+    for number, line in _iter_lines(stream, max_record_bytes):
+        if line is None:
+            yield number, RecordError(f'Record larger than {max_record_bytes} bytes')
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield number, RecordError(f'Invalid JSON: {e}')
+
+_WHITESPACE = re.compile(r'\s*')
+_SEPARATORS = re.compile(r'[\s,]*')
+_STRUCTURE = re.compile(r'["{}\[\]]')
+_STRING = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[\s,\]]')
+
+class _RecordScanner:
+    """Finds where a top-level JSON value ends by tracking brackets and strings.
+
+    The scan carries on across reads, so a record that fails to parse, or is
+    too large to keep, can be skipped and the records after it still read.
+    A record whose brackets or quotes do not balance has no trustworthy end
+    and takes the rest of the stream with it.
+    """
+
+    def __init__(self, text, start):
+        self.start = start
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.scalar = text[start] not in '{["'
+        # A scalar takes at least its first character, so the scan always moves on
+        self.pos = start + 1 if self.scalar else start
+
+    def scan(self, text, eof):
+        """The offset just past the value in ``text``, or ``None`` if it goes on."""
+        if self.scalar:
+            match = _SCALAR_END.search(text, self.pos)
+            if match:
+                return match.start()
+            self.pos = len(text)
+            return len(text) if eof else None
+        pos = self.pos
+        while True:
+            if self.escaped:
+                if pos >= len(text):
+                    break
+                pos += 1
+                self.escaped = False
+            if self.in_string:
+                match = _STRING.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    self.escaped = True
+                    continue
+                self.in_string = False
+                if self.depth == 0:
+                    return pos
+                continue
+            match = _STRUCTURE.search(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth <= 0:
+                    return pos
+        self.pos = len(text)
+        return None
+
+    def shift(self, offset):
+        self.start -= offset
+        self.pos -= offset
+
+def _iter_json(stream, max_record_bytes):
+    """Yield the documents of a JSON stream without reading it all at once.
+
+    Records are decoded in place with ``raw_decode``; one that does not
+    decode (cut off by the read, malformed or oversized) is delimited with a
+    ``_RecordScanner`` instead, then parsed or reported, and reading carries
+    on after it.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    pos = 0
+    in_array = False
+    started = False
+    number = 0
+    scanner = None
+    # The current record is over the limit; its text is dropped as it is read
+    skipping = False
+    eof = False
+    while not eof:
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        # Drop consumed input once per read rather than once per record
+        buffer = buffer[pos:] + text.decode(chunk or b'', final=eof)
+        if scanner is not None:
+            scanner.shift(pos)
+        pos = 0
+        while True:
+            if scanner is None:
+                pos = (_SEPARATORS if in_array else _WHITESPACE).match(buffer, pos).end()
+                if pos == len(buffer):
+                    break
+                if in_array and buffer[pos] == ']':
+                    in_array = False
+                    pos += 1
+                    continue
+                if not started:
+                    started = True
+                    if buffer[pos] == '[':
+                        in_array = True
+                        pos += 1
+                        continue
+                try:
+                    doc, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    doc = end = None
+                # A number cut off by the read ("4" of "4.5") decodes too soon
+                if end is not None and (eof or isinstance(doc, (dict, list, str)) or
+                                        _SCALAR_END.match(buffer, end)):
+                    number += 1
+                    if end - pos > max_record_bytes:
+                        yield number, RecordError(f'Record larger than {max_record_bytes} bytes')
+                    else:
+                        yield number, doc
+                    pos = end
+                    continue
+                scanner = _RecordScanner(buffer, pos)
+
+            end = scanner.scan(buffer, eof)
+            if end is None:
+                if not skipping and len(buffer) - scanner.start > max_record_bytes:
+                    skipping = True
+                if eof:
+                    number += 1
+                    yield number, RecordError(
+                        f'Record larger than {max_record_bytes} bytes' if skipping else
+                        'Invalid JSON: unexpected end of input')
+                    scanner, skipping = None, False
+                if skipping:
+                    pos = len(buffer)
+                break
+            number += 1
+            if skipping or end - scanner.start > max_record_bytes:
+                yield number, RecordError(f'Record larger than {max_record_bytes} bytes')
+            else:
+                try:
+                    yield number, json.loads(buffer[scanner.start:end])
+                except ValueError as e:
+                    yield number, RecordError(f'Invalid JSON: {e}')
+            scanner, skipping, pos = None, False, end
+
+def iter_records(stream, fmt='json', max_record_bytes=1024 * 1024):
+    """Yield ``(record_number, document_or_RecordError)`` pairs from ``stream``.
+
+    A record that cannot be read is reported in its place and reading goes
+    on with the next one.
+    """
+    if fmt == 'ndjson':
+        return _iter_ndjson(stream, max_record_bytes)
+    return _iter_json(stream, max_record_bytes)
+
+class ResumeImporter:
+    """Accumulates mapped records for one user and inserts them in batches."""
+
+    def __init__(self, user_id, batch_size=None, max_errors=None):
+        config = current_app.config
+        self.user_id = user_id
+        self.batch_size = max(1, min(batch_size or config.get('IMPORT_BATCH_SIZE', 500),
+                                     MAX_BATCH_SIZE))
+        self.max_errors = max_errors if max_errors is not None else \
+            config.get('IMPORT_MAX_ERRORS', 100)
+        self.slugs = SlugAllocator()
+        self.batch = []
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'record': number, 'error': message})
+
+    def add(self, number, doc):
+        if isinstance(doc, Exception):
+            self.error(number, str(doc))
+            return
+        try:
+            self.batch.append((number, map_record(doc)))
+        except RecordError as e:
+            self.error(number, str(e))
+            return
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def _insert(self, records):
+        slugs = self.slugs.allocate([record['title'] for record in records])
+        resume_ids = db.session.scalars(
+            insert(Resume).returning(Resume.id, sort_by_parameter_order=True),
+            [{'title': record['title'], 'slug': slug, 'theme': record['theme'],
+              'user_id': self.user_id}
+             for record, slug in zip(records, slugs)]).all()
+
+        section_rows = []
+        section_entries = []
+        for record, resume_id in zip(records, resume_ids):
+            for section in record['sections']:
+                section_rows.append({'title': section['title'], 'order': section['order'],
+                                     'resume_id': resume_id})
+                section_entries.append(section['entries'])
+        if section_rows:
+            section_ids = db.session.scalars(
+                insert(Section).returning(Section.id, sort_by_parameter_order=True),
+                section_rows).all()
+
+            entry_rows = [dict(entry, section_id=section_id)
+                          for entries, section_id in zip(section_entries, section_ids)
+                          for entry in entries]
+            if entry_rows:
+                db.session.execute(insert(Entry), entry_rows)
+
+        # One journal row per resume; sync clients fetch each tree whole
+        record_changes(self.user_id, [(resume_id, 'resume', resume_id, REPLACED)
+                                      for resume_id in resume_ids])
+
+    def flush(self):
+        """Insert the pending batch; on failure, retry record by record."""
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        try:
+            self._insert([record for _, record in batch])
+            db.session.commit()
+            self.imported += len(batch)
+            return
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                current_app.logger.error(f'Error importing record {batch[0][0]}: {str(e)}')
+                self.error(batch[0][0], 'Failed to insert record')
+                return
+        for number, record in batch:
+            self.batch = [(number, record)]
+            self.flush()
+
+    def finish(self):
+        self.flush()
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+def import_stream(stream, user_id, fmt='json', batch_size=None, progress=None):
+    """Import every record in ``stream`` for ``user_id`` and return a summary."""
+    importer = ResumeImporter(user_id, batch_size=batch_size)
+    max_record_bytes = current_app.config.get('IMPORT_MAX_RECORD_BYTES', 1024 * 1024)
+    for number, doc in iter_records(stream, fmt, max_record_bytes):
+        importer.add(number, doc)
+        if progress is not None and number % importer.batch_size == 0:
+            progress(importer)
+    return importer.finish()
@@ -0,0 +1,340 @@
+"""Batched data maintenance that is safe to run on a live database.
+
+A job walks one table in keyset order (``WHERE key > :last ORDER BY key
+LIMIT :n``), so each batch is an index range scan and a short transaction
+of its own, and no lock is held between batches. Progress is recorded per
+``(job, shard, range)`` in ``maintenance_checkpoints`` after every batch;
+rerunning an interrupted job picks up where it stopped, while rerunning a
+finished one starts over. The checkpoint lives in the default database and
+is committed after the batch it covers, so a crash can make a batch run
+twice but never skips one; every job is idempotent for that reason.
+
+A job may narrow its table with ``where``, e.g. to expired rows; the plan
+and the batches then only cover matching rows.
+
+Jobs throttle themselves: after each batch they sleep long enough to be
+busy at most ``load`` of the time (0.5 sleeps as long as the batch took),
+plus a fixed ``pause``. The key range can be split into ``parts`` ranges
+with a checkpoint each, run by one thread per range or, with ``part``, one
+range per process.
+"""
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, exists, func, select, update
+from .. import db, shards
+from ..models import (
+    Change, Entry, MaintenanceCheckpoint, Resume, ResumeStat, ResumeThumbnail, ResumeVersion,
+    RevokedToken, Section, User, VersionBlob
+)
+from .sharding import DEFAULT_SHARD
+from .sync import UPSERTED, record_changes
+
+class MaintenanceError(RuntimeError):
+    """A job was asked for something it cannot do."""
+
+class Job:
+    """A batched job: ``process(keys)`` handles one batch and returns rows changed."""
+
+    def __init__(self, name, key, process, sharded=True, distinct=False, where=None):
+        self.name = name
+        self.key = key
+        self.process = process
+        # Only rows matching this clause are planned and batched
+        self.where = where
+        # Global tables only live in the default database
+        self.sharded = sharded
+        # ``key`` is not unique (a foreign key), so batches select distinct values
+        self.distinct = distinct
+
+    def batch_keys(self, last_key, upper, size):
+        query = select(self.key).where(self.key > last_key)
+        if upper is not None:
+            query = query.where(self.key < upper)
+        if self.where is not None:
+            query = query.where(self.where)
+        if self.distinct:
+            query = query.group_by(self.key)
+        return db.session.execute(query.order_by(self.key).limit(size)).scalars().all()
+
+def _renumber(table, parent, kind, parent_ids, owners):
+    """Close gaps and ties in ``order`` under each parent, keeping the order."""
+    rows = db.session.execute(
+        select(table.c.id, parent, table.c.order).where(parent.in_(parent_ids))
+        .order_by(parent, table.c.order, table.c.id)).all()
+    moves = []
+    position, current_parent = 0, None
+    for row in rows:
+        if row[1] != current_parent:
+            position, current_parent = 0, row[1]
+        position += 1
+        if row.order != position:
+            moves.append({'b_id': row.id, 'b_order': position, 'b_parent': row[1]})
+    if not moves:
+        return 0
+
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('b_id'))
+        .values(order=bindparam('b_order'), version=table.c.version + 1), moves)
+    # Journal the new positions so synced clients pick them up
+    by_user = {}
+    for move in moves:
+        user_id, resume_id = owners[move['b_parent']]
+        by_user.setdefault(user_id, []).append((resume_id, kind, move['b_id'], UPSERTED))
+    for user_id, changes in by_user.items():
+        record_changes(user_id, changes)
+    return len(moves)
+
+def repair_entry_order(section_ids):
+    owners = {row.id: (row.user_id, row.resume_id) for row in db.session.execute(
+        select(Section.id, Section.resume_id, Resume.user_id)
+        .join(Resume, Resume.id == Section.resume_id).where(Section.id.in_(section_ids)))}
+    entries = Entry.__table__
+    return _renumber(entries, entries.c.section_id, 'entry', section_ids, owners)
+
+def repair_section_order(resume_ids):
+    owners = {row.id: (row.user_id, row.id) for row in db.session.execute(
+        select(Resume.id, Resume.user_id).where(Resume.id.in_(resume_ids)))}
+    sections = Section.__table__
+    return _renumber(sections, sections.c.resume_id, 'section', resume_ids, owners)
+
+def _prune(table, key, column, parent):
+    """Job body deleting rows of ``table`` whose ``column`` matches no ``parent`` row."""
+    def process(keys):
+        return db.session.execute(
+            delete(table).where(key >= keys[0], key <= keys[-1],
+                                ~exists().where(parent.c.id == column))).rowcount
+    return process
+
+# Parents first, so the children of a pruned orphan are pruned in the same run
+ORPHANS = [
+    ('resumes', Resume.__table__, Resume.__table__.c.user_id, User.__table__),
+    ('sections', Section.__table__, Section.__table__.c.resume_id, Resume.__table__),
+    ('entries', Entry.__table__, Entry.__table__.c.section_id, Section.__table__),
+    ('resume_versions', ResumeVersion.__table__, ResumeVersion.__table__.c.resume_id,
+     Resume.__table__),
+    ('version_blobs', VersionBlob.__table__, VersionBlob.__table__.c.resume_id,
+     Resume.__table__),
+    ('change_log', Change.__table__, Change.__table__.c.user_id, User.__table__),
+    ('resume_thumbnails', ResumeThumbnail.__table__, ResumeThumbnail.__table__.c.resume_id,
+     Resume.__table__),
+    ('resume_stats', ResumeStat.__table__, ResumeStat.__table__.c.resume_id, Resume.__table__),
+]
+
+def prune_jobs(tables=None):
+    """One job per table in ``tables`` (default: all), in ``ORPHANS`` order."""
+    jobs = []
+    for name, table, column, parent in ORPHANS:
+        if tables and name not in tables:
+            continue
+        # Tables without an id have primary keys starting with resume_id
+        key = table.c.id if 'id' in table.c else column
+        jobs.append(Job(f'prune-orphans:{name}', key, _prune(table, key, column, parent),
+                        distinct='id' not in table.c))
+    return jobs
+
+def _coerce(column, value):
+    python_type = column.type.python_type
+    if value is not None and python_type in (date, datetime) and isinstance(value, str):
+        return python_type.fromisoformat(value)
+    return value
+
+def backfill_job(table_name, column_name, value=None, source=None):
+    """Set ``column`` where it is NULL, to a JSON ``value`` or another column."""
+    table = db.metadata.tables.get(table_name)
+    if table is None or 'id' not in table.c:
+        raise MaintenanceError(f'Unknown table {table_name!r}')
+    if column_name not in table.c or table.c[column_name].primary_key:
+        raise MaintenanceError(f'{table_name} has no column {column_name!r} to backfill')
+    column = table.c[column_name]
+    if source is not None:
+        if source not in table.c:
+            raise MaintenanceError(f'{table_name} has no column {source!r}')
+        new_value = table.c[source]
+    else:
+        try:
+            new_value = _coerce(column, json.loads(value))
+        except ValueError as e:
+            raise MaintenanceError(f'Invalid value {value!r}: {e}')
+
+    def process(keys):
+        return db.session.execute(
+            update(table).where(table.c.id >= keys[0], table.c.id <= keys[-1],
+                                column.is_(None)).values({column: new_value})).rowcount
+
+    sharded = not table.info.get('global', False)
+    return Job(f'backfill:{table_name}.{column_name}', table.c.id, process, sharded=sharded)
+
+def expire_changes_job(days):
+    """Delete change journal rows older than ``days``, raising each user's horizon."""
+    if days < 0:
+        raise MaintenanceError('days must not be negative')
+    cutoff = _now() - timedelta(days=days)
+    changes, users = Change.__table__, User.__table__
+    expired = changes.c.created_at < cutoff
+
+    def process(keys):
+        batch = (changes.c.id >= keys[0], changes.c.id <= keys[-1], expired)
+        horizons = db.session.execute(
+            select(changes.c.user_id, func.max(changes.c.id)).where(*batch)
+            .group_by(changes.c.user_id)).all()
+        if horizons:
+            # Keep updated_at, which onupdate would otherwise bump
+            db.session.execute(
+                update(users).where(users.c.id == bindparam('b_user'),
+                                    users.c.journal_horizon < bindparam('b_horizon'))
+                .values(journal_horizon=bindparam('b_horizon'), updated_at=users.c.updated_at),
+                [{'b_user': user_id, 'b_horizon': horizon} for user_id, horizon in horizons])
+        return db.session.execute(delete(changes).where(*batch)).rowcount
+
+    return Job('expire-change-log', changes.c.id, process, where=expired)
+
+def _purge_revoked(keys):
+    return db.session.execute(
+        delete(RevokedToken).where(RevokedToken.id >= keys[0], RevokedToken.id <= keys[-1],
+                                   RevokedToken.expires < int(time.time()))
+        .execution_options(synchronize_session=False)).rowcount
+
+JOBS = {
+    'repair-entry-order': Job('repair-entry-order', Section.id, repair_entry_order),
+    'repair-section-order': Job('repair-section-order', Resume.id, repair_section_order),
+    'purge-revoked-tokens': Job('purge-revoked-tokens', RevokedToken.id, _purge_revoked,
+                                sharded=False),
+}
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def plan(job, shard, parts=1, restart=False):
+    """Checkpoints to run ``job`` on ``shard``: the unfinished ones of an
+    interrupted run, or ``parts`` fresh ranges covering the table."""
+    checkpoints = MaintenanceCheckpoint.query.filter_by(job=job.name, shard=shard)\
+        .order_by(MaintenanceCheckpoint.lower).all()
+    if checkpoints and not restart and any(c.finished_at is None for c in checkpoints):
+        return [c for c in checkpoints if c.finished_at is None]
+    for checkpoint in checkpoints:
+        db.session.delete(checkpoint)
+
+    # Ids are per shard; the checkpoints themselves stay in the default database
+    query = select(func.min(job.key), func.max(job.key))
+    if job.where is not None:
+        query = query.where(job.where)
+    with shards.use(shard):
+        lowest, highest = db.session.execute(query).one()
+    if lowest is None:
+        db.session.commit()
+        return []
+    step = max((highest - lowest + 1) // parts, 1)
+    bounds = sorted({lowest + i * step for i in range(parts)})
+    checkpoints = [
+        MaintenanceCheckpoint(job=job.name, shard=shard, lower=lower, last_key=lower - 1,
+                              upper=bounds[i + 1] if i + 1 < len(bounds) else None)
+        for i, lower in enumerate(bounds)]
+    db.session.add_all(checkpoints)
+    db.session.commit()
+    return checkpoints
+
+def run_range(job, shard, checkpoint_id, batch_size=1000, load=0.5, pause=0.0):
+    """Process one checkpointed range to its end; returns the rows changed."""
+    checkpoints = MaintenanceCheckpoint.__table__
+    checkpoint = db.session.get(MaintenanceCheckpoint, checkpoint_id)
+    last_key, upper = checkpoint.last_key, checkpoint.upper
+    db.session.rollback()
+    changed = 0
+    with shards.use(shard):
+        while True:
+            started = time.monotonic()
+            keys = job.batch_keys(last_key, upper, batch_size)
+            if not keys:
+                db.session.rollback()
+                db.session.execute(update(checkpoints).where(checkpoints.c.id == checkpoint_id)
+                                   .values(finished_at=_now(), updated_at=_now()))
+                db.session.commit()
+                return changed
+            try:
+                count = job.process(keys)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            changed += count
+            last_key = keys[-1]
+            db.session.execute(update(checkpoints).where(checkpoints.c.id == checkpoint_id)
+                               .values(last_key=last_key, updated_at=_now(),
+                                       batches=checkpoints.c.batches + 1,
+                                       processed=checkpoints.c.processed + count))
+            db.session.commit()
+
+            elapsed = time.monotonic() - started
+            time.sleep(pause + elapsed * (1 - load) / load)
+
+def run(job, shard, parts=1, part=None, restart=False, **options):
+    """Run ``job`` on ``shard``, one thread per unfinished range.
+
+    ``part`` (0-based) runs only that range of the plan, so ranges can be
+    spread over processes; every process must pass the same ``parts``.
+    Returns the rows changed.
+    """
+    if not 0 < options.get('load', 0.5) <= 1:
+        raise MaintenanceError('load must be in (0, 1]')
+    checkpoints = plan(job, shard, parts, restart)
+    ids = [checkpoint.id for checkpoint in checkpoints]
+    db.session.rollback()
+    if part is not None:
+        ids = ids[part:part + 1]
+    if len(ids) <= 1:
+        return sum(run_range(job, shard, checkpoint_id, **options) for checkpoint_id in ids)
+
+    app = current_app._get_current_object()
+    results, errors = [], []
+
+    def worker(checkpoint_id):
+        # Each thread gets its own app context, hence its own session
+        with app.app_context():
+            try:
+                results.append(run_range(job, shard, checkpoint_id, **options))
+            except Exception as e:
+                app.logger.error(f'Error in {job.name} on {shard}: {str(e)}')
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(checkpoint_id,),
+                                name=f'{job.name}-{checkpoint_id}') for checkpoint_id in ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise MaintenanceError(f'{len(errors)} of {len(ids)} ranges failed; '
+                               f'rerun to resume them: {errors[0]}')
+    return sum(results)
+
+def target_shards(job, shard=None):
+    if not job.sharded:
+        return [DEFAULT_SHARD]
+    return [shard] if shard else shards.names
+
+def vacuum(shard, tables=None):
+    """Reclaim space and refresh planner statistics on ``shard``.
+
+    PostgreSQL gets a plain ``VACUUM (ANALYZE)`` per table, which runs
+    alongside reads and writes. SQLite can only rebuild the whole file,
+    which blocks writers while it runs.
+    """
+    engine = shards.engine(shard)
+    names = tables or [table.name for table in db.metadata.sorted_tables
+                       if shard == DEFAULT_SHARD or not table.info.get('global')]
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        preparer = engine.dialect.identifier_preparer
+        if engine.dialect.name == 'postgresql':
+            for name in names:
+                connection.exec_driver_sql(f'VACUUM (ANALYZE) {preparer.quote(name)}')
+        elif engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql('VACUUM')
+            connection.exec_driver_sql('ANALYZE')
+        else:
+            for name in names:
+                connection.exec_driver_sql(f'ANALYZE TABLE {preparer.quote(name)}')
+    return names
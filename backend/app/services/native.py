@@ -0,0 +1,32 @@
+"""Run CPU-bound work on native OS threads.
+
+Under the gevent worker ``threading`` is monkey-patched, so a
+``threading.Thread`` is just another greenlet on the worker's hub, and a
+multi-second WeasyPrint render on it stalls every request the worker is
+serving. ``run`` hands such work to the hub's pool of native threads and
+parks only the calling greenlet; the interpreter hands the GIL back to the
+hub every switch interval, so requests keep being served meanwhile. Without
+gevent, ``run`` calls straight through and ``start`` uses a plain thread.
+"""
+import sys
+import threading
+
+def _gevent_patched():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def run(function, *args, **kwargs):
+    """``function(*args, **kwargs)`` on a native thread; waits for the result."""
+    if _gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args, kwargs)
+    return function(*args, **kwargs)
+
+def start(function, *args, name=None):
+    """Start ``function(*args)`` on a native thread without waiting for it."""
+    if _gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.spawn(function, *args)
+    thread = threading.Thread(target=function, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
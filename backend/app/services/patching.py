@@ -0,0 +1,117 @@
+"""Helpers for the PATCH endpoints.
+
+A PATCH writes only the fields present in the body, with a single UPDATE
+whose WHERE clause also checks ownership, and lets the client choose how
+much comes back through ``?return=``:
+
+* ``minimal``: ``204 No Content``
+* ``changed`` (default): the id, the fields written and the new ``updated_at``
+* ``full``: the object re-read, as ``GET`` would return it
+
+``?fields=a,b`` further limits the response body to the named fields.
+
+The PUT endpoints share ``expected_version`` and ``version_conflict``: a PUT
+may send the ``version`` it was based on, and one that loses to another
+write gets ``409`` with the row's current version.
+"""
+from datetime import date
+
+from flask import jsonify
+from sqlalchemy import select
+
+RETURN_MODES = ('minimal', 'changed', 'full')
+
+class PatchError(ValueError):
+    """The PATCH request itself is invalid (400)."""
+
+def text(max_length, required=False):
+    def coerce(value, field):
+        if value is None and not required:
+            return None
+        if not isinstance(value, str) or (required and not value.strip()):
+            raise PatchError(f'{field} must be a non-empty string' if required
+                             else f'{field} must be a string')
+        if max_length and len(value) > max_length:
+            raise PatchError(f'{field} must be at most {max_length} characters')
+        return value
+    return coerce
+
+def integer(value, field):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise PatchError(f'{field} must be an integer')
+    return value
+
+def boolean(value, field):
+    if not isinstance(value, bool):
+        raise PatchError(f'{field} must be true or false')
+    return value
+
+def iso_date(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PatchError(f'{field} must be a YYYY-MM-DD date')
+
+RESUME_FIELDS = {'title': text(100, required=True), 'theme': text(50, required=True)}
+SECTION_FIELDS = {'title': text(100, required=True), 'order': integer}
+ENTRY_FIELDS = {
+    'title': text(200, required=True),
+    'subtitle': text(200),
+    'description': text(None),
+    'start_date': iso_date,
+    'end_date': iso_date,
+    'current': boolean,
+    'order': integer
+}
+
+def parse_patch(data, spec, args):
+    """Validate a PATCH body and query; returns ``(values, mode, fields)``."""
+    mode = args.get('return', 'changed')
+    if mode not in RETURN_MODES:
+        raise PatchError(f"return must be one of {', '.join(RETURN_MODES)}")
+    fields = set(args['fields'].split(',')) if args.get('fields') else None
+    return validate_fields(data, spec), mode, fields
+
+def validate_fields(data, spec):
+    """Coerce a ``{field: value}`` body against ``spec``; raises ``PatchError``."""
+    if not isinstance(data, dict) or not data:
+        raise PatchError('No fields to update')
+    unknown = sorted(set(data) - set(spec))
+    if unknown:
+        raise PatchError(f"Unknown fields: {', '.join(unknown)}")
+    return {field: spec[field](value, field) for field, value in data.items()}
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def timestamp(value):
+    """``value`` as ``to_dict`` reads it back: the columns hold naive UTC."""
+    return value.replace(tzinfo=None).isoformat()
+
+def patch_response(obj_id, values, updated_at, mode, fields, load_full):
+    """Build the PATCH response for ``mode``; ``load_full`` re-reads the object."""
+    if mode == 'minimal':
+        return '', 204
+    if mode == 'full':
+        doc = load_full(fields)
+    else:
+        doc = {field: _serialize(value) for field, value in values.items()}
+        doc.update(id=obj_id, updated_at=timestamp(updated_at))
+    if fields is not None:
+        doc = {key: value for key, value in doc.items() if key in fields or key == 'id'}
+    return jsonify(doc), 200
+
+def expected_version(data):
+    """The optional ``version`` of a PUT body; raises ``PatchError``."""
+    if not isinstance(data, dict) or data.get('version') is None:
+        return None
+    return integer(data['version'], 'version')
+
+def version_conflict(model, obj_id):
+    """409 for a write to ``obj_id`` based on a version that is no longer current."""
+    from .. import db
+    version = db.session.execute(select(model.version).where(model.id == obj_id)).scalar()
+    return {'error': f'{model.__name__} was changed by another request',
+            'version': version}, 409
@@ -0,0 +1,39 @@
+"""PDF rendering for resumes.
+
+WeasyPrint loads cairo and pango through cffi, which costs hundreds of
+milliseconds and a good deal of memory. It is imported on the first render
+instead of at startup, so workers that never export a PDF never pay for it.
+Compiled stylesheets and fonts come from the shared theme registry. Layout
+runs on a native thread (see services/native.py) so that under gevent a
+render does not stall the worker's other requests.
+"""
+from flask import render_template
+from .. import themes
+from . import native
+
+_weasyprint = None
+
+class PDFUnavailable(RuntimeError):
+    """WeasyPrint or its native libraries are not installed."""
+
+def load_weasyprint():
+    global _weasyprint
+    if _weasyprint is None:
+        try:
+            import weasyprint
+        except (ImportError, OSError) as e:
+            raise PDFUnavailable(f'WeasyPrint could not be loaded: {e}')
+        _weasyprint = weasyprint
+    return _weasyprint
+
+def render_resume_html(resume):
+    """Render a resume document (``Resume.to_dict`` shape) to HTML."""
+    return render_template('resume/document.html', resume=resume)
+
+def _write_pdf(weasyprint, html, theme):
+    return weasyprint.HTML(string=html, base_url=themes.themes_dir)\
+        .write_pdf(stylesheets=themes.stylesheets(theme), font_config=themes.font_config)
+
+def render_resume_pdf(resume):
+    weasyprint = load_weasyprint()
+    return native.run(_write_pdf, weasyprint, render_resume_html(resume), resume.get('theme'))
@@ -0,0 +1,101 @@
+"""Incremental HTML preview of resumes.
+
+Each section is rendered to an HTML fragment and cached under
+``(shard, section id, section updated_at, newest entry updated_at, entry
+count, theme)``; ids are only unique within a shard. Editing an entry moves its section's newest ``updated_at`` and
+deleting one changes the count, so only the sections that changed since the
+last preview are re-rendered; everything else is served from the cache.
+"""
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import func, select
+from .. import db, themes
+from ..models import Section, Entry
+from .records import EntryRecord
+from .sharding import current_shard
+
+class FragmentCache:
+    """Thread-safe LRU cache of rendered fragments with hit/miss counters."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            fragment = self.fragments.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self.fragments.move_to_end(key)
+            self.hits += 1
+            return fragment
+
+    def put(self, key, fragment):
+        max_size = self.max_size or current_app.config.get('PREVIEW_CACHE_SIZE', 2048)
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while len(self.fragments) > max_size:
+                self.fragments.popitem(last=False)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+fragments = FragmentCache()
+
+def _section_template(theme):
+    # Themes may override the section markup; Jinja caches whichever compiles
+    return current_app.jinja_env.select_template(
+        [f'resume/{theme}/section.html', 'resume/section.html'])
+
+def render_preview(resume):
+    """Render ``resume`` to HTML; returns ``(html, hits, misses)`` for this render."""
+    theme = resume.theme or 'classic'
+    shard = current_shard()
+    sections = Section.__table__
+    entries = Entry.__table__
+
+    section_rows = db.session.execute(
+        select(sections.c.id, sections.c.title, sections.c.order, sections.c.updated_at,
+               func.max(entries.c.updated_at).label('entries_updated_at'),
+               func.count(entries.c.id).label('entry_count'))
+        .select_from(sections.outerjoin(entries, entries.c.section_id == sections.c.id))
+        .where(sections.c.resume_id == resume.id)
+        .group_by(sections.c.id)
+        .order_by(sections.c.order, sections.c.id)).all()
+
+    rendered = {}
+    stale = {}
+    for row in section_rows:
+        key = (shard, row.id, row.updated_at, row.entries_updated_at, row.entry_count, theme)
+        fragment = fragments.get(key)
+        if fragment is None:
+            stale[row.id] = (key, {'id': row.id, 'title': row.title, 'order': row.order,
+                                   'entries': []})
+        else:
+            rendered[row.id] = fragment
+
+    if stale:
+        for row in db.session.execute(
+                EntryRecord.select().where(entries.c.section_id.in_(list(stale)))
+                .order_by(entries.c.section_id, entries.c.order, entries.c.id)):
+            entry = EntryRecord(*row)
+            stale[entry.section_id][1]['entries'].append(entry.to_dict())
+        template = _section_template(theme)
+        for section_id, (key, doc) in stale.items():
+            fragment = Markup(template.render(section=doc))
+            fragments.put(key, fragment)
+            rendered[section_id] = fragment
+
+    html = render_template('resume/preview.html', resume=resume,
+                           stylesheet=Markup(themes.source(theme)),
+                           fragments=[rendered[row.id] for row in section_rows])
+    return html, len(section_rows) - len(stale), len(stale)
@@ -0,0 +1,129 @@
+"""Read-only records for the list, read and export paths.
+
+Loading ORM instances only to call ``to_dict`` pays for identity-map
+bookkeeping, change tracking and, through the ``dynamic`` relationships, one
+query per section for its entries. These records are built straight from
+Core rows instead: plain ``__slots__`` objects holding the columns named by
+the model's ``FIELDS`` and serialized by the same ``serialize`` as the
+model's ``to_dict``, so both give the same document. A resume tree takes
+three queries however many sections it has, and nothing is left in the
+session afterwards.
+"""
+from flask import current_app
+from sqlalchemy import select
+from .. import db
+from ..models import Resume, Section, Entry
+from ..models.serialization import serialize
+
+class Record:
+    """A row of ``table``'s ``fields``, which are also the keys of ``to_dict``."""
+    __slots__ = ()
+    table = None
+    fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def select(cls):
+        """``SELECT`` of the record's columns, in constructor order."""
+        return select(*[cls.table.c[name] for name in cls.fields])
+
+    def to_dict(self):
+        return serialize(self, self.fields)
+
+class EntryRecord(Record):
+    __slots__ = Entry.FIELDS
+    table = Entry.__table__
+    fields = Entry.FIELDS
+
+class SectionRecord(Record):
+    __slots__ = Section.FIELDS + ('entries',)
+    table = Section.__table__
+    fields = Section.FIELDS
+
+    def __init__(self, *values):
+        super().__init__(*values)
+        self.entries = None
+
+    def to_dict(self):
+        data = super().to_dict()
+        if self.entries is not None:
+            data['entries'] = [entry.to_dict() for entry in self.entries]
+        return data
+
+class ResumeRecord(Record):
+    __slots__ = Resume.FIELDS + ('sections',)
+    table = Resume.__table__
+    fields = Resume.FIELDS
+
+    def __init__(self, *values):
+        super().__init__(*values)
+        self.sections = None
+
+    def to_dict(self):
+        data = super().to_dict()
+        if self.sections is not None:
+            data['sections'] = [section.to_dict() for section in self.sections]
+        return data
+
+def fetch(record_class, statement):
+    """Run a ``record_class.select()`` statement and wrap each row."""
+    return [record_class(*row) for row in db.session.execute(statement)]
+
+def attach_entries(sections):
+    """Fill ``entries`` of ``sections`` in one query, in display order."""
+    by_id = {}
+    for section in sections:
+        section.entries = []
+        by_id[section.id] = section
+    if not by_id:
+        return sections
+    entries = EntryRecord.table
+    # Entries are the bulk of the data; stream them off a server-side cursor
+    rows = db.session.execute(
+        EntryRecord.select().where(entries.c.section_id.in_(list(by_id)))
+        .order_by(entries.c.section_id, entries.c.order, entries.c.id)
+        .execution_options(yield_per=current_app.config.get('EXPORT_YIELD_PER', 1000)))
+    for row in rows:
+        entry = EntryRecord(*row)
+        by_id[entry.section_id].entries.append(entry)
+    return sections
+
+def attach_sections(resumes, include_entries=True):
+    """Fill ``sections`` of ``resumes`` (and their entries) in two queries."""
+    by_id = {}
+    for resume in resumes:
+        resume.sections = []
+        by_id[resume.id] = resume
+    if not by_id:
+        return resumes
+    sections = SectionRecord.table
+    section_records = fetch(SectionRecord, SectionRecord.select()
+                            .where(sections.c.resume_id.in_(list(by_id)))
+                            .order_by(sections.c.resume_id, sections.c.order, sections.c.id))
+    for section in section_records:
+        by_id[section.resume_id].sections.append(section)
+    if include_entries:
+        attach_entries(section_records)
+    return resumes
+
+def user_resume(user_id, resume_id):
+    """The full resume tree, or ``None`` if the user does not own it."""
+    resumes = ResumeRecord.table
+    found = fetch(ResumeRecord, ResumeRecord.select()
+                  .where(resumes.c.id == resume_id, resumes.c.user_id == user_id))
+    return attach_sections(found)[0] if found else None
+
+def resume_sections(resume_id):
+    sections = SectionRecord.table
+    return attach_entries(fetch(SectionRecord, SectionRecord.select()
+                                .where(sections.c.resume_id == resume_id)
+                                .order_by(sections.c.order, sections.c.id)))
+
+def section_entries(section_id):
+    entries = EntryRecord.table
+    return fetch(EntryRecord, EntryRecord.select()
+                 .where(entries.c.section_id == section_id)
+                 .order_by(entries.c.order, entries.c.id))
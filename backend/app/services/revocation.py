@@ -0,0 +1,188 @@
+"""Access token revocation.
+
+Logging out revokes the token's ``jti``; changing the password revokes every
+token the user was issued before that moment. Both are rows in the global
+``revoked_tokens`` table, which each process mirrors in memory so that
+checking a token on an authenticated request normally costs no query:
+
+* revoked ``jti`` values go into a Bloom filter. A token whose ``jti`` is
+  not in the filter is certainly not revoked; one that is (or collides with
+  one that is, about 1% of the time at capacity) is confirmed against the
+  unique index on ``jti``.
+* user-wide revocations are few, so ``not_before`` is kept per user and
+  compared with the token's issue time directly. ``iat`` only has whole
+  seconds, which would spare tokens issued earlier in the same second as
+  the revocation, so tokens also carry the exact time as ``ISSUED_CLAIM``.
+
+The mirror is topped up with the rows created since its last refresh at
+most every ``REVOCATION_REFRESH`` seconds, so a revocation reaches every
+worker within that delay; the worker that revoked refreshes on its next
+check. It is rebuilt from scratch every ``REVOCATION_REBUILD`` seconds to
+drop rows whose tokens have expired, which a Bloom filter cannot forget.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import select
+
+# Rows committed this long before the last refresh are read again, which
+# covers slow commits and clock drift between hosts; re-adding is harmless
+REFRESH_OVERLAP = 60
+
+# Issue time of an access token with sub-second precision (Unix seconds)
+ISSUED_CLAIM = 'iat_exact'
+
+def issued_at(jwt_payload):
+    """When the token was issued; tokens from before the claim have ``iat`` only."""
+    return jwt_payload.get(ISSUED_CLAIM, jwt_payload.get('iat', 0))
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+class RevocationList:
+    """Flask extension deciding whether an access token has been revoked."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.bloom_bits = 1 << 20
+        self.bloom_hashes = 7
+        self.refresh_interval = 5
+        self.rebuild_interval = 3600
+        self.bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+        # user id -> (not_before, expires)
+        self.users = {}
+        self.loaded_at = None
+        self.next_refresh = 0
+        self.next_rebuild = 0
+        self.lookups = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from .. import jwt
+        app.config.setdefault('REVOCATION_REFRESH', 5)
+        app.config.setdefault('REVOCATION_REBUILD', 3600)
+        app.config.setdefault('REVOCATION_BLOOM_BITS', 1 << 20)
+        app.config.setdefault('REVOCATION_BLOOM_HASHES', 7)
+        self.refresh_interval = app.config['REVOCATION_REFRESH']
+        self.rebuild_interval = app.config['REVOCATION_REBUILD']
+        self.bloom_bits = app.config['REVOCATION_BLOOM_BITS']
+        self.bloom_hashes = app.config['REVOCATION_BLOOM_HASHES']
+        self.next_refresh = self.next_rebuild = 0
+        jwt.token_in_blocklist_loader(self.is_revoked)
+        jwt.additional_claims_loader(lambda identity: {ISSUED_CLAIM: time.time()})
+        app.extensions['revocations'] = self
+
+    def is_revoked(self, jwt_header, jwt_payload):
+        self.refresh()
+        revoked = self.users.get(jwt_payload['sub'])
+        if revoked is not None and issued_at(jwt_payload) < revoked[0]:
+            return True
+        jti = jwt_payload.get('jti')
+        if jti is None or jti not in self.bloom:
+            return False
+        return self._lookup(jti)
+
+    def _lookup(self, jti):
+        from .. import db
+        from ..models import RevokedToken
+        self.lookups += 1
+        return db.session.execute(
+            select(RevokedToken.id).where(RevokedToken.jti == jti)).first() is not None
+
+    def revoke_token(self, jwt_payload):
+        """Revoke one token; takes effect once the caller commits."""
+        from .. import db
+        from ..models import RevokedToken
+        db.session.add(RevokedToken(jti=jwt_payload['jti'], user_id=jwt_payload['sub'],
+                                    expires=jwt_payload.get('exp') or self._expiry()))
+        self.next_refresh = 0
+
+    def revoke_user(self, user_id, before=None):
+        """Revoke ``user_id``'s tokens issued before ``before`` (default: now).
+
+        Tokens issued afterwards, such as the one handed out with a password
+        change, stay valid. Takes effect once the caller commits.
+        """
+        from .. import db
+        from ..models import RevokedToken
+        before = time.time() if before is None else before
+        db.session.add(RevokedToken(user_id=user_id, not_before=before,
+                                    expires=int(before) + 1 + self._lifetime()))
+        self.next_refresh = 0
+
+    def _lifetime(self):
+        expires = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        return int(expires.total_seconds() if hasattr(expires, 'total_seconds') else expires)
+
+    def _expiry(self):
+        return int(time.time()) + self._lifetime()
+
+    def refresh(self):
+        """Load rows added since the last refresh, if it is due."""
+        now = time.time()
+        with self.lock:
+            if now < self.next_refresh:
+                return
+            # Other requests carry on with the current state meanwhile
+            self.next_refresh = now + self.refresh_interval
+            rebuild = now >= self.next_rebuild or self.loaded_at is None
+            since = None if rebuild else self.loaded_at - REFRESH_OVERLAP
+
+        from .. import db
+        from ..models import RevokedToken
+        query = select(RevokedToken.jti, RevokedToken.user_id, RevokedToken.not_before,
+                       RevokedToken.expires).where(RevokedToken.expires > int(now))
+        if since is not None:
+            query = query.where(
+                RevokedToken.created_at >= datetime.fromtimestamp(since, timezone.utc))
+        try:
+            rows = db.session.execute(query).all()
+        except Exception as e:
+            # Keep checking against what is loaded; retried after the interval
+            current_app.logger.error(f'Error refreshing revoked tokens: {str(e)}')
+            return
+
+        with self.lock:
+            bloom = BloomFilter(self.bloom_bits, self.bloom_hashes) if rebuild else self.bloom
+            users = {} if rebuild else dict(self.users)
+            for row in rows:
+                if row.jti is not None:
+                    bloom.add(row.jti)
+                elif row.not_before is not None:
+                    current = users.get(row.user_id)
+                    if current is None or row.not_before > current[0]:
+                        users[row.user_id] = (row.not_before, row.expires)
+            if not rebuild:
+                users = {user_id: revoked for user_id, revoked in users.items()
+                         if revoked[1] > now}
+            self.bloom, self.users = bloom, users
+            self.loaded_at = now
+            if rebuild:
+                self.next_rebuild = now + self.rebuild_interval
+
+    def stats(self):
+        with self.lock:
+            return {'users': len(self.users), 'lookups': self.lookups}
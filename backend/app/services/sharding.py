@@ -0,0 +1,285 @@
+"""User-keyed horizontal sharding.
+
+Every table except the global ``user_directory`` hangs off ``users.id``, so
+a user's resumes, sections, entries, versions and change journal live
+together on one shard. ``SHARDS`` names the databases users are spread
+over: ``default`` is ``SQLALCHEMY_DATABASE_URI`` and any other name is a
+``SQLALCHEMY_BINDS`` key. For local testing, several SQLite files will do::
+
+    SHARD_DATABASE_URLS=s1=sqlite:////tmp/s1.db,s2=sqlite:////tmp/s2.db
+    SHARDS=s1,s2
+    flask db upgrade && flask init-shards
+
+New users are placed with a consistent-hash ring over ``SHARDS`` (with
+``SHARD_VNODES`` points per shard), so adding a shard only moves the users
+whose ring segment it takes over. Where a user actually lives is recorded in
+the directory, which stays authoritative while ``flask rebalance-shards``
+moves users to their new placement.
+
+Each request is routed by its JWT identity: the directory entry (cached
+for ``SHARD_CACHE_TTL`` seconds) sets ``g.shard``, and ``ShardedSession``
+sends every statement except those on global tables to that shard's engine.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import delete, insert, select, update
+
+DEFAULT_SHARD = 'default'
+
+def current_shard():
+    """Shard selected for the current request or CLI command."""
+    if has_app_context():
+        return g.get('shard', DEFAULT_SHARD)
+    return DEFAULT_SHARD
+
+def _is_global(mapper, clause):
+    table = getattr(mapper, 'local_table', None)
+    if table is None and clause is not None:
+        table = getattr(clause, 'table', None)
+        if table is None and hasattr(clause, 'get_final_froms'):
+            return any(getattr(f, 'info', {}).get('global') for f in clause.get_final_froms())
+    return table is not None and table.info.get('global', False)
+
+class ShardedSession(Session):
+    """Session sending each statement to the current shard's engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = current_shard()
+            if shard != DEFAULT_SHARD and not _is_global(mapper, clause):
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent-hash ring mapping keys to nodes through virtual nodes."""
+
+    def __init__(self, nodes, vnodes=64):
+        if not nodes:
+            raise ValueError('A hash ring needs at least one node')
+        points = sorted((_hash(f'{node}#{i}'), node) for node in nodes for i in range(vnodes))
+        self.nodes = list(nodes)
+        self.hashes = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self.hashes, _hash(str(key))) % len(self.hashes)
+        return self.owners[index]
+
+class ShardRouter:
+    """Flask extension resolving which shard holds a user's data."""
+
+    def __init__(self, app=None):
+        self.names = [DEFAULT_SHARD]
+        self.ring = HashRing(self.names)
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.placements = OrderedDict()
+        self.cache_ttl = 60
+        self.cache_size = 10000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARDS', [DEFAULT_SHARD])
+        app.config.setdefault('SHARD_VNODES', 64)
+        app.config.setdefault('SHARD_CACHE_TTL', 60)
+        app.config.setdefault('SHARD_CACHE_SIZE', 10000)
+        self.names = list(app.config['SHARDS']) or [DEFAULT_SHARD]
+        self.ring = HashRing(self.names, app.config['SHARD_VNODES'])
+        # Users may still sit on a bind that has left SHARDS, so route
+        # whenever more than one database is configured
+        self.enabled = self.names != [DEFAULT_SHARD] or \
+            bool(app.config.get('SQLALCHEMY_BINDS'))
+        self.cache_ttl = app.config['SHARD_CACHE_TTL']
+        self.cache_size = app.config['SHARD_CACHE_SIZE']
+        app.extensions['shards'] = self
+        if self.enabled:
+            app.before_request(self.route_request)
+
+    def engine(self, shard):
+        from .. import db
+        return db.engines[None if shard == DEFAULT_SHARD else shard]
+
+    def shard_for_new_user(self, user_id):
+        return self.ring.node_for(user_id)
+
+    def placement(self, user_id):
+        """``(shard, epoch)`` of ``user_id``, or ``None`` for an unknown user."""
+        if not self.enabled:
+            return DEFAULT_SHARD, 0
+        now = time.monotonic()
+        with self.lock:
+            cached = self.placements.get(user_id)
+            if cached is not None and cached[0] > now:
+                self.placements.move_to_end(user_id)
+                return cached[1]
+
+        from .. import db
+        from ..models import UserDirectory
+        row = db.session.execute(
+            select(UserDirectory.shard, UserDirectory.epoch)
+            .where(UserDirectory.id == user_id)).first()
+        placement = (row.shard, row.epoch) if row else None
+        with self.lock:
+            self.placements[user_id] = (now + self.cache_ttl, placement)
+            self.placements.move_to_end(user_id)
+            while len(self.placements) > self.cache_size:
+                self.placements.popitem(last=False)
+        return placement
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.placements.clear()
+            else:
+                self.placements.pop(user_id, None)
+
+    def activate(self, shard):
+        """Route the rest of the current context to ``shard``."""
+        g.shard = shard
+
+    @contextmanager
+    def use(self, shard):
+        previous = g.get('shard', DEFAULT_SHARD)
+        g.shard = shard
+        try:
+            yield shard
+        finally:
+            g.shard = previous
+
+    def activate_user(self, user_id):
+        placement = self.placement(user_id)
+        if placement is not None:
+            self.activate(placement[0])
+        return placement
+
+    def route_request(self):
+        try:
+            # The change feed takes its token as ?jwt=; only routing trusts
+            # it here, and the view still checks where it may come from
+            verify_jwt_in_request(optional=True, locations=['headers', 'query_string'])
+            identity = get_jwt_identity()
+        except Exception:
+            # jwt_required on the view reports bad tokens properly
+            identity = None
+        if identity is not None:
+            self.activate_user(identity)
+
+    def create_schema(self, shard):
+        """Create the sharded tables on ``shard``; the default DB uses migrations."""
+        from .. import db
+        tables = [table for table in db.metadata.sorted_tables
+                  if not table.info.get('global')]
+        db.metadata.create_all(self.engine(shard), tables=tables)
+
+    def move_user(self, user_id, target):
+        """Copy ``user_id``'s rows to ``target``, repoint the directory, then
+        delete them from the old shard.
+
+        Rows get new ids on the target, where the old ones may be taken, and
+        the change journal is not copied: bumping the directory epoch makes
+        the user's sync clients start over from a full snapshot. Version
+        blobs keep the ids they were taken with, so restoring a pre-move
+        version re-adds its sections instead of patching them. Safe to
+        rerun after an interruption, since a partial copy on the target is
+        cleared first. Run it while the user's requests are not being served.
+        """
+        from .. import db
+        from ..models import User, Resume, Section, Entry, ResumeVersion, VersionBlob
+        from ..models import ResumeStat, UserDirectory
+        users, resumes, sections = User.__table__, Resume.__table__, Section.__table__
+        entries, versions, blobs = Entry.__table__, ResumeVersion.__table__, VersionBlob.__table__
+        stats = ResumeStat.__table__
+
+        source = db.session.execute(select(UserDirectory.shard)
+                                    .where(UserDirectory.id == user_id)).scalar_one()
+        if source == target:
+            return False
+
+        owned = select(resumes.c.id).where(resumes.c.user_id == user_id)
+        with self.engine(source).connect() as src:
+            user = src.execute(select(users).where(users.c.id == user_id)).mappings().first()
+            resume_rows = src.execute(select(resumes).where(resumes.c.user_id == user_id)
+                                      .order_by(resumes.c.id)).mappings().all()
+            section_rows = src.execute(select(sections).where(sections.c.resume_id.in_(owned))
+                                       .order_by(sections.c.id)).mappings().all()
+            entry_rows = src.execute(
+                select(entries).join(sections, sections.c.id == entries.c.section_id)
+                .where(sections.c.resume_id.in_(owned)).order_by(entries.c.id)).mappings().all()
+            version_rows = src.execute(select(versions).where(versions.c.resume_id.in_(owned))
+                                       .order_by(versions.c.id)).mappings().all()
+            blob_rows = src.execute(select(blobs).where(blobs.c.resume_id.in_(owned)))\
+                .mappings().all()
+            stat_rows = src.execute(select(stats).where(stats.c.resume_id.in_(owned)))\
+                .mappings().all()
+
+        with self.engine(target).begin() as dst:
+            # Leftovers of an interrupted move; cascades to everything owned
+            dst.execute(delete(users).where(users.c.id == user_id))
+            if user is not None:
+                # The journal starts afresh on the target
+                dst.execute(insert(users), [dict(user, journal_horizon=0)])
+            resume_ids = self._copy(dst, resumes, [
+                dict(row, slug=slug) for row, slug in zip(
+                    resume_rows, self._free_slugs(dst, [row['slug'] for row in resume_rows]))
+            ], {})
+            section_ids = self._copy(dst, sections, section_rows, {'resume_id': resume_ids})
+            self._copy(dst, entries, entry_rows, {'section_id': section_ids})
+            # The journal is not copied, so the versions' cursors mean nothing there
+            self._copy(dst, versions, [dict(row, change_id=None) for row in version_rows],
+                       {'resume_id': resume_ids})
+            if blob_rows:
+                dst.execute(insert(blobs), [dict(row, resume_id=resume_ids[row['resume_id']])
+                                            for row in blob_rows])
+            if stat_rows:
+                dst.execute(insert(stats), [dict(row, resume_id=resume_ids[row['resume_id']])
+                                            for row in stat_rows])
+
+        db.session.execute(update(UserDirectory).where(UserDirectory.id == user_id)
+                           .values(shard=target, epoch=UserDirectory.epoch + 1))
+        db.session.commit()
+        with self.engine(source).begin() as src:
+            src.execute(delete(users).where(users.c.id == user_id))
+        self.invalidate(user_id)
+        return True
+
+    def _copy(self, connection, table, rows, remap):
+        """Insert ``rows`` with fresh ids; returns ``{old id: new id}``."""
+        if not rows:
+            return {}
+        new_ids = connection.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [{key: (remap[key][value] if key in remap else value)
+              for key, value in row.items() if key != 'id'} for row in rows]).scalars().all()
+        return {row['id']: new_id for row, new_id in zip(rows, new_ids)}
+
+    def _free_slugs(self, connection, slugs):
+        """Slugs are unique per database; the few that collide get a suffix."""
+        from ..models import Resume
+        resumes = Resume.__table__
+        used = set()
+
+        def taken(candidate):
+            return candidate in used or connection.execute(
+                select(resumes.c.id).where(resumes.c.slug == candidate)).first() is not None
+
+        free = []
+        for slug in slugs:
+            candidate, count = slug, 1
+            while taken(candidate):
+                candidate = f'{slug}-{count}'
+                count += 1
+            used.add(candidate)
+            free.append(candidate)
+        return free
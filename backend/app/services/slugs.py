@@ -0,0 +1,58 @@
+import re
+from urllib.parse import unquote
+from .. import db
+from ..models import Resume
+
+def slugify(text):
+    """Convert text to a URL-friendly slug."""
+    text = unquote(text.lower())
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[\s-]+', '-', text).strip('-_')
+    return text
+
+class SlugAllocator:
+    """Hands out unique resume slugs for many titles at once.
+
+    Collisions are resolved with one ``IN`` query per round instead of one
+    query per candidate, and suffix counters persist across calls so a long
+    import of similar titles does not rescan taken suffixes every batch.
+    """
+
+    def __init__(self):
+        self.counters = {}
+
+    def _next(self, base):
+        count = self.counters.get(base, 0) + 1
+        self.counters[base] = count
+        return f'{base}-{count}'
+
+    def allocate(self, titles):
+        bases = [slugify(title) or 'resume' for title in titles]
+        candidates = []
+        seen = set()
+        for base in bases:
+            slug = base if base not in self.counters else self._next(base)
+            while slug in seen:
+                slug = self._next(base)
+            seen.add(slug)
+            candidates.append(slug)
+
+        pending = list(range(len(candidates)))
+        while pending:
+            taken = {slug for (slug,) in db.session.query(Resume.slug).filter(
+                Resume.slug.in_([candidates[i] for i in pending]))}
+            pending = [i for i in pending if candidates[i] in taken]
+            for i in pending:
+                slug = self._next(bases[i])
+                while slug in seen:
+                    slug = self._next(bases[i])
+                seen.add(slug)
+                candidates[i] = slug
+        return candidates
+
+def slug_for_title(title, resume_id):
+    """Slug following a renamed resume's title, suffixed only if another resume has it."""
+    slug = slugify(title) or 'resume'
+    if Resume.query.filter(Resume.slug == slug, Resume.id != resume_id).first():
+        slug = SlugAllocator().allocate([title])[0]
+    return slug
@@ -0,0 +1,169 @@
+"""Delta sync for offline clients.
+
+Every write to a resume, section or entry appends a row to the user's change
+journal (``change_log``) in the same transaction. ``GET /api/sync?since=N``
+reads the journal rows after ``N`` through the ``(user_id, id)`` index and
+returns the current state of just those objects, so catching up costs time
+proportional to what changed rather than to the size of the account.
+
+Ops are ``upserted``, ``deleted`` (the tombstone) and ``replaced``, which
+marks a resume whose whole tree was rewritten (duplicate, import, version
+restore): the client swaps in the full document sent under ``replaced``.
+Deleting a resume or section only records its own tombstone; the client
+drops the children with it, as the database does.
+
+Cursors read ``<epoch>.<journal id>``. Journal ids are per shard, so moving
+a user to another shard bumps their epoch, and a cursor from an older epoch
+gets a full snapshot instead of a delta.
+
+The journal is kept for ``SYNC_RETENTION_DAYS``: ``flask expire-change-log``
+deletes older rows, tombstones included, and raises the user's
+``journal_horizon`` to the last id it deleted. A cursor below the horizon
+may have missed some of those rows, so it also gets a full snapshot.
+"""
+from sqlalchemy import func, insert, select
+from .. import db
+from ..models import Change, User
+from .exporter import iter_resume_documents, load_documents
+from .records import EntryRecord, ResumeRecord, SectionRecord, fetch
+
+UPSERTED = 'upserted'
+DELETED = 'deleted'
+REPLACED = 'replaced'
+
+# Response key for each kind of object
+PLURALS = {'resume': 'resumes', 'section': 'sections', 'entry': 'entries'}
+
+def _lock_user(user_id):
+    # Change ids are allocated at insert but become visible at commit. Holding
+    # the user's row until commit makes one user's changes commit in id order,
+    # so a cursor can never step over a change that commits late. FOR NO KEY
+    # UPDATE does not conflict with the key-share locks taken by inserts
+    # referencing the user, so it cannot deadlock against them.
+    session = db.session()
+    transaction = session.get_transaction()
+    if transaction is None or session.info.get('change_lock') is not transaction:
+        session.execute(select(User.id).where(User.id == user_id)
+                        .with_for_update(key_share=True))
+        session.info['change_lock'] = session.get_transaction()
+
+def record_changes(user_id, changes):
+    """Journal ``(resume_id, kind, object_id, op)`` tuples in the current transaction.
+
+    Call it after the transaction's other writes, just before commit: the
+    user lock it takes is then the last lock acquired, which rules out
+    deadlocks between concurrent writers.
+    """
+    if not changes:
+        return
+    _lock_user(user_id)
+    db.session.execute(insert(Change), [
+        {'user_id': user_id, 'resume_id': resume_id, 'kind': kind,
+         'object_id': object_id, 'op': op}
+        for resume_id, kind, object_id, op in changes])
+
+def record_change(user_id, resume_id, kind, object_id, op=UPSERTED):
+    record_changes(user_id, [(resume_id, kind, object_id, op)])
+
+def parse_cursor(value):
+    """``(epoch, journal id)`` from a cursor; plain ids are from epoch 0."""
+    epoch, _, change_id = value.rpartition('.')
+    if not change_id.isdigit() or not (epoch.isdigit() or value.isdigit()):
+        raise ValueError(f'Invalid sync cursor {value!r}')
+    return int(epoch or 0), int(change_id)
+
+def format_cursor(epoch, change_id):
+    return f'{epoch}.{change_id}'
+
+def current_cursor(user_id):
+    return db.session.scalar(
+        select(func.coalesce(func.max(Change.id), 0)).where(Change.user_id == user_id))
+
+def _empty_delta(cursor):
+    return {
+        'cursor': cursor,
+        'has_more': False,
+        'full': False,
+        'resumes': [],
+        'sections': [],
+        'entries': [],
+        'replaced': [],
+        'deleted': {'resumes': [], 'sections': [], 'entries': []}
+    }
+
+def snapshot(user_id):
+    """The whole account, for a client syncing for the first time."""
+    # Read the cursor first: anything committed meanwhile is simply sent again
+    delta = _empty_delta(current_cursor(user_id))
+    delta['full'] = True
+    delta['replaced'] = list(iter_resume_documents(user_id))
+    return delta
+
+def journal_horizon(user_id):
+    return db.session.scalar(select(User.journal_horizon).where(User.id == user_id)) or 0
+
+def delta_since(user_id, since, limit):
+    """Changes after cursor ``since``, at most ``limit`` journal rows per call.
+
+    A cursor older than the retained journal gets a full snapshot instead.
+    """
+    if since < journal_horizon(user_id):
+        return snapshot(user_id)
+    rows = db.session.execute(
+        select(Change.id, Change.resume_id, Change.kind, Change.object_id, Change.op)
+        .where(Change.user_id == user_id, Change.id > since)
+        .order_by(Change.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    delta = _empty_delta(rows[-1].id if rows else since)
+    delta['has_more'] = has_more
+
+    # Collapse to one op per object; a rewrite is only undone by a later delete
+    latest = {}
+    for row in rows:
+        key = (row.kind, row.object_id)
+        previous = latest.get(key)
+        if previous is not None and previous[1] == REPLACED and row.op == UPSERTED:
+            continue
+        latest[key] = (row.resume_id, row.op)
+
+    whole = {object_id for (kind, object_id), (_, op) in latest.items()
+             if kind == 'resume' and op in (REPLACED, DELETED)}
+    wanted = {'resume': [], 'section': [], 'entry': []}
+    replaced = []
+    for (kind, object_id), (resume_id, op) in latest.items():
+        if kind != 'resume' and resume_id in whole:
+            continue
+        if op == DELETED:
+            delta['deleted'][PLURALS[kind]].append(object_id)
+        elif op == REPLACED:
+            replaced.append(object_id)
+        else:
+            wanted[kind].append(object_id)
+
+    # Objects deleted after this page are skipped; their tombstones follow
+    resumes = ResumeRecord.table
+    sections = SectionRecord.table
+    entries = EntryRecord.table
+    if replaced:
+        delta['replaced'] = load_documents(fetch(ResumeRecord, ResumeRecord.select().where(
+            resumes.c.id.in_(replaced), resumes.c.user_id == user_id).order_by(resumes.c.id)))
+    if wanted['resume']:
+        delta['resumes'] = [resume.to_dict() for resume in fetch(
+            ResumeRecord, ResumeRecord.select()
+            .where(resumes.c.id.in_(wanted['resume']), resumes.c.user_id == user_id)
+            .order_by(resumes.c.id))]
+    if wanted['section']:
+        delta['sections'] = [section.to_dict() for section in fetch(
+            SectionRecord, SectionRecord.select()
+            .join(resumes, resumes.c.id == sections.c.resume_id)
+            .where(sections.c.id.in_(wanted['section']), resumes.c.user_id == user_id)
+            .order_by(sections.c.id))]
+    if wanted['entry']:
+        delta['entries'] = [entry.to_dict() for entry in fetch(
+            EntryRecord, EntryRecord.select()
+            .join(sections, sections.c.id == entries.c.section_id)
+            .join(resumes, resumes.c.id == sections.c.resume_id)
+            .where(entries.c.id.in_(wanted['entry']), resumes.c.user_id == user_id)
+            .order_by(entries.c.id))]
+    return delta
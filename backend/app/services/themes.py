@@ -0,0 +1,141 @@
+"""Per-process registry of compiled resume themes.
+
+Parsing a stylesheet and building a font configuration dominate the cost of
+a WeasyPrint render, and every resume uses one of a handful of themes. The
+registry compiles each ``themes/<name>.css`` once, shares a single
+``FontConfiguration`` across renders, and recompiles a theme when its file's
+modification time changes (checked at most every ``THEME_CHECK_INTERVAL``
+seconds). Each theme has its own lock around the check and compile, so
+concurrent renders compile it once and other themes are not held up.
+"""
+import os
+import threading
+import time
+
+from . import native
+
+THEMES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'themes')
+DEFAULT_THEME = 'classic'
+
+class _CompiledTheme:
+    __slots__ = ('path', 'mtime', 'stylesheets', 'checked')
+
+    def __init__(self, path, mtime, stylesheets, checked):
+        self.path = path
+        self.mtime = mtime
+        self.stylesheets = stylesheets
+        self.checked = checked
+
+class ThemeRegistry:
+
+    def __init__(self, app=None, themes_dir=THEMES_DIR):
+        self.themes_dir = themes_dir
+        self.check_interval = 2.0
+        self.lock = threading.Lock()
+        # theme name -> lock held while checking or compiling it
+        self.theme_locks = {}
+        self.compiled = {}
+        self._font_config = None
+        self.sources = {}
+        self.hits = 0
+        self.compiles = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.check_interval = app.config.get('THEME_CHECK_INTERVAL', 2.0)
+        app.extensions['themes'] = self
+
+    def names(self):
+        return sorted(name[:-4] for name in os.listdir(self.themes_dir)
+                      if name.endswith('.css'))
+
+    def path_for(self, theme):
+        """Stylesheet path for ``theme``, falling back to the default theme."""
+        name = os.path.basename(theme or DEFAULT_THEME)
+        path = os.path.join(self.themes_dir, f'{name}.css')
+        if not os.path.exists(path):
+            path = os.path.join(self.themes_dir, f'{DEFAULT_THEME}.css')
+        return path
+
+    @property
+    def font_config(self):
+        if self._font_config is None:
+            from .pdf import load_weasyprint
+            load_weasyprint()
+            from weasyprint.text.fonts import FontConfiguration
+            with self.lock:
+                if self._font_config is None:
+                    self._font_config = FontConfiguration()
+        return self._font_config
+
+    def _theme_lock(self, name):
+        with self.lock:
+            return self.theme_locks.setdefault(name, threading.Lock())
+
+    def stylesheets(self, theme):
+        """Compiled ``weasyprint.CSS`` objects for ``theme``."""
+        from .pdf import load_weasyprint
+        now = time.monotonic()
+        name = theme or DEFAULT_THEME
+        compiled = self.compiled.get(name)
+        if compiled is not None and now - compiled.checked < self.check_interval:
+            self.hits += 1
+            return compiled.stylesheets
+
+        # Unknown themes share the default's entry rather than growing the cache
+        path = self.path_for(name)
+        name = os.path.basename(path)[:-4]
+        with self._theme_lock(name):
+            # Another render may have compiled it while this one waited
+            compiled = self.compiled.get(name)
+            mtime = os.stat(path).st_mtime_ns
+            if compiled is not None and compiled.path == path and compiled.mtime == mtime:
+                compiled.checked = now
+                self.hits += 1
+                return compiled.stylesheets
+
+            weasyprint = load_weasyprint()
+            stylesheets = [weasyprint.CSS(filename=path, font_config=self.font_config)]
+            self.compiled[name] = _CompiledTheme(path, mtime, stylesheets, now)
+            self.compiles += 1
+        return stylesheets
+
+    def source(self, theme):
+        """Raw CSS text of ``theme``, for inlining into HTML previews."""
+        path = self.path_for(theme)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.sources.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding='utf-8') as f:
+                cached = (mtime, f.read())
+            self.sources[path] = cached
+        return cached[1]
+
+    def invalidate(self, theme=None):
+        with self.lock:
+            if theme is None:
+                self.compiled.clear()
+                self.sources.clear()
+            else:
+                self.compiled.pop(theme, None)
+                self.sources.pop(self.path_for(theme), None)
+
+    def warm(self, themes=None):
+        """Compile ``themes`` (default: every theme on disk) ahead of the first render."""
+        for name in themes or self.names():
+            self.stylesheets(name)
+
+    def warm_in_background(self, logger=None):
+        """Warm up without delaying the caller, e.g. a freshly forked worker."""
+        def run():
+            try:
+                self.warm()
+            except Exception as e:
+                if logger is not None:
+                    logger.warning(f'Theme warm-up skipped: {str(e)}')
+        # Compiling is CPU-bound; a greenlet would hold up the worker's requests
+        return native.start(run, name='theme-warmup')
+
+    def stats(self):
+        return {'themes': sorted(self.compiled), 'hits': self.hits, 'compiles': self.compiles}
@@ -0,0 +1,326 @@
+"""Page-one thumbnails of resumes for the dashboard.
+
+Rendering a PDF takes far too long for a request, so thumbnails are made
+in the background. Every change a worker commits reaches ``schedule``
+through the change broker; a resume is rendered once it has been quiet for
+``THUMBNAIL_DEBOUNCE`` seconds (at most ``THUMBNAIL_MAX_DELAY`` after the
+first change), through the same WeasyPrint path as the PDF export, and its
+first page is rasterized with pypdfium2 at each of ``THUMBNAIL_SIZES``.
+A render whose HTML and stylesheet hash to the stored fingerprint is
+skipped, so edits that do not change the page cost nothing. Rendering and
+rasterizing run on native threads (services/native.py), and a render is
+claimed in ``resume_thumbnails`` first so two processes never do the same one.
+
+Images are stored under ``THUMBNAIL_DIR`` by the SHA-256 of their bytes
+and never change; ``resume_thumbnails`` maps each resume to its current
+digests. They are only served to the resume's owner, with the digest as
+the ETag. Files nothing refers to any more are removed by
+``flask prune-thumbnails``.
+
+pypdfium2 is optional: without it (or WeasyPrint) the endpoint keeps
+answering with the placeholder.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from . import native
+from .sharding import current_shard
+
+RENDERED = 'rendered'
+SKIPPED = 'skipped'
+BUSY = 'busy'
+
+_pdfium = None
+
+class ThumbnailsUnavailable(RuntimeError):
+    """pypdfium2 or Pillow is not installed."""
+
+def load_pdfium():
+    global _pdfium
+    if _pdfium is None:
+        try:
+            import pypdfium2
+            import PIL.Image  # noqa: F401 (pypdfium2's to_pil needs it)
+        except ImportError as e:
+            raise ThumbnailsUnavailable(f'pypdfium2 could not be loaded: {e}')
+        _pdfium = pypdfium2
+    return _pdfium
+
+def rasterize(pdf, widths):
+    """PNG bytes of the first page of ``pdf`` at each width in ``widths``."""
+    from PIL import Image
+    pdfium = load_pdfium()
+    document = pdfium.PdfDocument(pdf)
+    try:
+        page = document[0]
+        # Render once at the largest size and scale down from there
+        largest = max(widths.values())
+        image = page.render(scale=largest / page.get_width()).to_pil()
+    finally:
+        document.close()
+    images = {}
+    for size, width in widths.items():
+        scaled = image if width == largest else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        scaled.save(buffer, 'PNG', optimize=True)
+        images[size] = buffer.getvalue()
+    return images
+
+def placeholder_svg(width):
+    """Blank A4 page shown while a thumbnail is pending."""
+    height = round(width * 297 / 210)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}"><rect width="100%" height="100%" fill="#f3f4f6"/>'
+            f'</svg>')
+
+class ThumbnailStore:
+    """Content-addressed PNG files: ``<dir>/<digest[:2]>/<digest>.png``."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], f'{digest}.png')
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write beside the target and rename, so readers never see half a file
+            fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(partial, path)
+        return digest
+
+    def prune(self, keep, min_age=3600):
+        """Delete files not in ``keep`` and older than ``min_age`` seconds
+        (younger ones may belong to a render that has not committed yet)."""
+        removed = 0
+        cutoff = time.time() - min_age
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name[:-len('.png')] in keep or os.path.getmtime(path) > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
+
+class ThumbnailPipeline:
+    """Flask extension rendering thumbnails of changed resumes in the background."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        # (shard, resume id) -> (first change, last change)
+        self.pending = {}
+        self.failed = set()
+        self.sizes = {'small': 240, 'large': 480}
+        self.debounce = 10
+        self.max_delay = 60
+        self.claim_timeout = 300
+        self.store = None
+        self.app = None
+        self.worker_pid = None
+        self.rendered = 0
+        self.skipped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from .. import events
+        app.config.setdefault('THUMBNAIL_SIZES', {'small': 240, 'large': 480})
+        app.config.setdefault('THUMBNAIL_DEBOUNCE', 10)
+        app.config.setdefault('THUMBNAIL_MAX_DELAY', 60)
+        app.config.setdefault('THUMBNAIL_CLAIM_TIMEOUT', 300)
+        if not app.config.get('THUMBNAIL_DIR'):
+            app.config['THUMBNAIL_DIR'] = os.path.join(app.instance_path, 'thumbnails')
+        self.sizes = app.config['THUMBNAIL_SIZES']
+        self.debounce = app.config['THUMBNAIL_DEBOUNCE']
+        self.max_delay = app.config['THUMBNAIL_MAX_DELAY']
+        self.claim_timeout = app.config['THUMBNAIL_CLAIM_TIMEOUT']
+        self.store = ThumbnailStore(app.config['THUMBNAIL_DIR'])
+        self.app = app
+        events.listen(self.on_change)
+        app.extensions['thumbnails'] = self
+
+    def on_change(self, resume_id, event_type):
+        key = (current_shard(), resume_id)
+        if event_type == 'resume.deleted':
+            with self.lock:
+                self.pending.pop(key, None)
+                self.failed.discard(key)
+            return
+        self.schedule(resume_id)
+
+    def schedule(self, resume_id, delay=None):
+        """Render ``resume_id`` on the current shard once its edits settle."""
+        key = (current_shard(), resume_id)
+        now = time.monotonic()
+        delay = self.debounce if delay is None else delay
+        with self.lock:
+            self.failed.discard(key)
+            first, _ = self.pending.get(key, (now, now))
+            # ``last`` may lie in the future to shorten or stretch the wait
+            self.pending[key] = (first, now - self.debounce + delay)
+        self._start()
+
+    def status(self, resume_id):
+        key = (current_shard(), resume_id)
+        with self.lock:
+            if key in self.pending:
+                return 'pending'
+            if key in self.failed:
+                return 'failed'
+        return None
+
+    def due(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return [key for key, (first, last) in self.pending.items()
+                    if now - last >= self.debounce or now - first >= self.max_delay]
+
+    def render(self, resume_id):
+        """Render ``resume_id`` on the current shard now.
+
+        Returns ``RENDERED``, ``SKIPPED`` when the page is unchanged or the
+        resume is gone, or ``BUSY`` when another process holds the claim.
+        """
+        from .. import db, themes
+        from ..models import ResumeThumbnail
+        from .pdf import render_resume_html, render_resume_pdf
+        from .records import ResumeRecord, attach_sections, fetch
+
+        resumes = ResumeRecord.table
+        found = fetch(ResumeRecord, ResumeRecord.select().where(resumes.c.id == resume_id))
+        if not found:
+            db.session.rollback()
+            return SKIPPED
+        doc = attach_sections(found)[0].to_dict()
+        html = render_resume_html(doc)
+        fingerprint = hashlib.sha256(
+            (html + themes.source(doc.get('theme') or 'classic')).encode('utf-8')).hexdigest()
+        current = db.session.execute(select(ResumeThumbnail.fingerprint)
+                                     .where(ResumeThumbnail.resume_id == resume_id)).scalar()
+        # Do not hold the read transaction across a render that takes seconds
+        db.session.rollback()
+        if current == fingerprint:
+            self.skipped += 1
+            return SKIPPED
+        if not self._claim(resume_id):
+            return BUSY
+
+        try:
+            # Layout and rasterizing run on native threads; see services/native.py
+            images = native.run(rasterize, render_resume_pdf(doc), self.sizes)
+            digests = {size: self.store.put(data) for size, data in images.items()}
+        except Exception:
+            self._release(resume_id)
+            raise
+        db.session.execute(update(ResumeThumbnail)
+                           .where(ResumeThumbnail.resume_id == resume_id)
+                           .values(fingerprint=fingerprint, digests=json.dumps(digests),
+                                   rendered_at=datetime.now(timezone.utc), claimed_until=None))
+        db.session.commit()
+        self.rendered += 1
+        return RENDERED
+
+    def _claim(self, resume_id):
+        """Take ``resume_id``'s render for ``THUMBNAIL_CLAIM_TIMEOUT`` seconds.
+
+        Workers and ``flask render-thumbnails`` schedule renders on their
+        own, so the row is claimed in the database first; a process that
+        dies mid-render loses the claim when it times out.
+        """
+        from .. import db
+        from ..models import ResumeThumbnail
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(seconds=self.claim_timeout)
+        try:
+            with db.session.begin_nested():
+                # Rendered for the first time: the row itself is the claim
+                db.session.execute(insert(ResumeThumbnail).values(
+                    resume_id=resume_id, fingerprint='', digests='{}', claimed_until=until))
+            claimed = True
+        except IntegrityError:
+            claimed = db.session.execute(
+                update(ResumeThumbnail)
+                .where(ResumeThumbnail.resume_id == resume_id,
+                       or_(ResumeThumbnail.claimed_until.is_(None),
+                           ResumeThumbnail.claimed_until < now))
+                .values(claimed_until=until)).rowcount == 1
+        db.session.commit()
+        return claimed
+
+    def _release(self, resume_id):
+        from .. import db
+        from ..models import ResumeThumbnail
+        try:
+            db.session.rollback()
+            db.session.execute(update(ResumeThumbnail)
+                               .where(ResumeThumbnail.resume_id == resume_id)
+                               .values(claimed_until=None))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Error releasing thumbnail claim: {str(e)}')
+
+    def run_due(self):
+        """Render every due resume; needs an app context."""
+        from .. import db, shards
+        from .pdf import PDFUnavailable
+        for key in self.due():
+            with self.lock:
+                if self.pending.pop(key, None) is None:
+                    continue
+            shard, resume_id = key
+            try:
+                with shards.use(shard):
+                    if self.render(resume_id) == BUSY:
+                        # Try again once the other render is done; its result
+                        # may predate the change that scheduled this one
+                        self.schedule(resume_id)
+            except Exception as e:
+                db.session.rollback()
+                with self.lock:
+                    self.failed.add(key)
+                level = 'warning' if isinstance(e, (PDFUnavailable, ThumbnailsUnavailable)) \
+                    else 'error'
+                getattr(current_app.logger, level)(
+                    f'Error rendering thumbnail of resume {resume_id}: {str(e)}')
+
+    def _start(self):
+        with self.lock:
+            if self.worker_pid == os.getpid() or self.app is None:
+                return
+            self.worker_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='thumbnails', daemon=True)
+        thread.start()
+
+    def _run(self):
+        tick = max(min(self.debounce, self.max_delay) / 4, 0.1)
+        while True:
+            time.sleep(tick)
+            if not self.due():
+                continue
+            try:
+                with self.app.app_context():
+                    self.run_due()
+            except Exception as e:
+                self.app.logger.error(f'Error in thumbnail worker: {str(e)}')
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'failed': len(self.failed),
+                    'rendered': self.rendered, 'skipped': self.skipped}
@@ -0,0 +1,360 @@
+"""Content-addressed version history for resumes.
+
+A version is a tree of blobs: the resume manifest lists section hashes and
+each section blob lists entry hashes. Blobs are keyed by the hash of their
+canonical JSON, so consecutive versions share every section and entry that
+was not edited and only the changed path is written.
+
+Each version also records the user's change journal cursor when it was
+taken (``change_id``). While the journal shows no change to the resume past
+that cursor, the resume still matches the version, so snapshotting it again
+or backing it up before a restore can reuse it without rehashing the tree.
+"""
+import hashlib
+import json
+from datetime import date, datetime, timezone
+
+from flask import current_app
+from sqlalchemy import exists, insert, select
+from .. import db
+from ..models import Change, Section, Entry, ResumeVersion, VersionBlob
+from .sync import current_cursor, journal_horizon
+
+ENTRY_FIELDS = ('title', 'subtitle', 'description', 'start_date', 'end_date',
+                'current', 'order')
+SECTION_FIELDS = ('title', 'order')
+RESUME_FIELDS = ('title', 'theme')
+
+# Keep IN (...) lists below SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _canonical(doc):
+    return json.dumps(doc, sort_keys=True, separators=(',', ':'))
+
+def _entry_doc(entry):
+    return {
+        'id': entry.id,
+        'title': entry.title,
+        'subtitle': entry.subtitle,
+        'description': entry.description,
+        'start_date': entry.start_date.isoformat() if entry.start_date else None,
+        'end_date': entry.end_date.isoformat() if entry.end_date else None,
+        'current': bool(entry.current),
+        'order': entry.order
+    }
+
+def _entry_values(doc):
+    """Convert (part of) an entry blob back into column values."""
+    values = {field: doc[field] for field in ENTRY_FIELDS if field in doc}
+    for field in ('start_date', 'end_date'):
+        if values.get(field):
+            values[field] = date.fromisoformat(values[field])
+    return values
+
+class BlobWriter:
+    """Collects blobs for one resume and writes only the ones not stored yet."""
+
+    def __init__(self, resume_id):
+        self.resume_id = resume_id
+        self.pending = {}
+
+    def put(self, kind, doc):
+        text = _canonical(doc)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        self.pending.setdefault(digest, (kind, text))
+        return digest
+
+    def flush(self):
+        if not self.pending:
+            return
+        blobs = VersionBlob.__table__
+        rows = [{'resume_id': self.resume_id, 'hash': digest, 'kind': kind, 'data': text}
+                for digest, (kind, text) in self.pending.items()]
+        self.pending = {}
+        dialect = db.session.get_bind(mapper=VersionBlob.__mapper__).dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            # A concurrent snapshot of the same resume may store the same blobs
+            # first (autosave and a manual snapshot, say); theirs are identical
+            db.session.execute(upsert(blobs).on_conflict_do_nothing(
+                index_elements=[blobs.c.resume_id, blobs.c.hash]), rows)
+            return
+        existing = set()
+        for chunk in _chunks(row['hash'] for row in rows):
+            existing.update(db.session.execute(
+                select(blobs.c.hash).where(blobs.c.resume_id == self.resume_id,
+                                           blobs.c.hash.in_(chunk))).scalars())
+        fresh = [row for row in rows if row['hash'] not in existing]
+        if fresh:
+            db.session.execute(insert(blobs), fresh)
+
+def load_blobs(resume_id, hashes, writer=None):
+    """Return a ``{hash: doc}`` mapping for the requested blobs."""
+    docs = {}
+    missing = []
+    for digest in set(hashes):
+        if writer is not None and digest in writer.pending:
+            docs[digest] = json.loads(writer.pending[digest][1])
+        else:
+            missing.append(digest)
+    for chunk in _chunks(missing):
+        for blob in VersionBlob.query.filter(VersionBlob.resume_id == resume_id,
+                                             VersionBlob.hash.in_(chunk)):
+            docs[blob.hash] = json.loads(blob.data)
+    return docs
+
+def build_tree(resume, writer):
+    """Hash the live resume into ``writer`` and return the root hash."""
+    sections = Section.query.filter_by(resume_id=resume.id)\
+        .order_by(Section.order, Section.id).all()
+    entries_by_section = {section.id: [] for section in sections}
+    for chunk in _chunks(entries_by_section):
+        for entry in Entry.query.filter(Entry.section_id.in_(chunk))\
+                .order_by(Entry.order, Entry.id):
+            entries_by_section[entry.section_id].append(entry)
+
+    section_hashes = []
+    for section in sections:
+        entry_hashes = [writer.put('entry', _entry_doc(entry))
+                        for entry in entries_by_section[section.id]]
+        section_hashes.append(writer.put('section', {
+            'id': section.id,
+            'title': section.title,
+            'order': section.order,
+            'entries': entry_hashes
+        }))
+
+    return writer.put('resume', {
+        'title': resume.title,
+        'theme': resume.theme,
+        'sections': section_hashes
+    })
+
+def latest_version(resume_id):
+    return ResumeVersion.query.filter_by(resume_id=resume_id)\
+        .order_by(ResumeVersion.id.desc()).first()
+
+def unchanged_since(resume, version):
+    """Whether the journal shows no change to ``resume`` since ``version`` was taken.
+
+    ``False`` when that cannot be told, e.g. for versions from before the
+    journal, copied over from another shard, or older than what it retains.
+    """
+    if version.change_id is None or version.change_id < journal_horizon(resume.user_id):
+        return False
+    return not db.session.scalar(select(exists().where(
+        Change.user_id == resume.user_id, Change.id > version.change_id,
+        Change.resume_id == resume.id)))
+
+def create_version(resume, label=None, compact=True):
+    """Snapshot ``resume``; returns ``(version, created)``.
+
+    If nothing changed since the latest version and no label was given, that
+    version is returned instead of storing an identical one.
+    """
+    latest = latest_version(resume.id)
+    if latest is not None and not label and unchanged_since(resume, latest):
+        return latest, False
+
+    # Read before the tree: a change the hash misses is then past the cursor
+    change_id = current_cursor(resume.user_id)
+    writer = BlobWriter(resume.id)
+    root_hash = build_tree(resume, writer)
+
+    if latest is not None and latest.root_hash == root_hash and not label:
+        return latest, False
+
+    writer.flush()
+    version = ResumeVersion(resume_id=resume.id, label=label, root_hash=root_hash,
+                            change_id=change_id)
+    db.session.add(version)
+    db.session.flush()
+
+    if compact:
+        compact_versions(resume.id)
+    return version, True
+
+def _field_changes(old, new, fields):
+    return {field: {'from': old.get(field), 'to': new.get(field)}
+            for field in fields if old.get(field) != new.get(field)}
+
+def _by_id(hashes, exclude, docs):
+    return {docs[h]['id']: docs[h] for h in hashes if h not in exclude}
+
+def _diff_entries(resume_id, old_hashes, new_hashes, writer):
+    old_set, new_set = set(old_hashes), set(new_hashes)
+    docs = load_blobs(resume_id, old_set ^ new_set, writer)
+    old_entries = _by_id(old_hashes, new_set, docs)
+    new_entries = _by_id(new_hashes, old_set, docs)
+    return {
+        'added': [doc for eid, doc in new_entries.items() if eid not in old_entries],
+        'removed': [doc for eid, doc in old_entries.items() if eid not in new_entries],
+        'changed': [
+            {'id': eid, 'fields': _field_changes(old_entries[eid], doc, ENTRY_FIELDS)}
+            for eid, doc in new_entries.items() if eid in old_entries
+        ]
+    }
+
+def diff_trees(resume_id, old_root, new_root, writer=None):
+    """Describe what changes between two version trees.
+
+    Shared blobs are skipped by hash, so the work done is proportional to
+    the number of sections and entries that differ.
+    """
+    diff = {'resume': {}, 'sections': {'added': [], 'removed': [], 'changed': []}}
+    if old_root == new_root:
+        return diff
+
+    roots = load_blobs(resume_id, {old_root, new_root}, writer)
+    old_manifest, new_manifest = roots[old_root], roots[new_root]
+    diff['resume'] = _field_changes(old_manifest, new_manifest, RESUME_FIELDS)
+
+    old_set, new_set = set(old_manifest['sections']), set(new_manifest['sections'])
+    docs = load_blobs(resume_id, old_set ^ new_set, writer)
+    old_sections = _by_id(old_manifest['sections'], new_set, docs)
+    new_sections = _by_id(new_manifest['sections'], old_set, docs)
+
+    for sid, doc in new_sections.items():
+        if sid in old_sections:
+            old_doc = old_sections[sid]
+            diff['sections']['changed'].append({
+                'id': sid,
+                'fields': _field_changes(old_doc, doc, SECTION_FIELDS),
+                'entries': _diff_entries(resume_id, old_doc['entries'], doc['entries'], writer)
+            })
+        else:
+            entry_docs = load_blobs(resume_id, doc['entries'], writer)
+            diff['sections']['added'].append(dict(
+                doc, entries=[entry_docs[h] for h in doc['entries']]))
+
+    diff['sections']['removed'] = [
+        {'id': sid, 'title': doc['title']}
+        for sid, doc in old_sections.items() if sid not in new_sections
+    ]
+    return diff
+
+def _add_entries(section_id, docs):
+    db.session.add_all(Entry(section_id=section_id, **_entry_values(doc)) for doc in docs)
+
+def restore_version(resume, version):
+    """Bring ``resume`` back to ``version`` by applying only the differences.
+
+    The live state is kept as a version first so the restore can itself be
+    undone: the latest version if the resume has not changed since, so the
+    restore costs time in proportion to the diff, or else a new snapshot.
+    Returns ``(backup_version, diff)``.
+    """
+    backup = latest_version(resume.id)
+    if backup is None or not unchanged_since(resume, backup):
+        backup, _ = create_version(resume, label=f'Before restoring version {version.id}',
+                                   compact=False)
+    diff = diff_trees(resume.id, backup.root_hash, version.root_hash)
+
+    for field, change in diff['resume'].items():
+        setattr(resume, field, change['to'])
+
+    removed_ids = [section['id'] for section in diff['sections']['removed']]
+    for chunk in _chunks(removed_ids):
+        Section.query.filter(Section.resume_id == resume.id,
+                             Section.id.in_(chunk)).delete(synchronize_session=False)
+
+    for doc in diff['sections']['added']:
+        # The original row is gone, so the section comes back with a new id
+        section = Section(title=doc['title'], order=doc['order'], resume_id=resume.id)
+        db.session.add(section)
+        db.session.flush()
+        _add_entries(section.id, doc['entries'])
+
+    for change in diff['sections']['changed']:
+        if change['fields']:
+            values = {field: c['to'] for field, c in change['fields'].items()}
+            Section.query.filter_by(id=change['id'], resume_id=resume.id).update(
+                dict(values, version=Section.version + 1), synchronize_session=False)
+        entries = change['entries']
+        removed_entry_ids = [doc['id'] for doc in entries['removed']]
+        if removed_entry_ids:
+            Entry.query.filter(Entry.section_id == change['id'],
+                               Entry.id.in_(removed_entry_ids)).delete(synchronize_session=False)
+        _add_entries(change['id'], entries['added'])
+        for entry_change in entries['changed']:
+            values = _entry_values({field: c['to'] for field, c in entry_change['fields'].items()})
+            values['version'] = Entry.version + 1
+            Entry.query.filter_by(id=entry_change['id'], section_id=change['id'])\
+                .update(values, synchronize_session=False)
+
+    resume.updated_at = datetime.now(timezone.utc)
+    return backup, diff
+
+def _as_utc(value):
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def compact_versions(resume_id, now=None):
+    """Thin out old versions and drop blobs no remaining version references.
+
+    The newest ``VERSION_KEEP_RECENT`` versions and every labelled version are
+    kept. Older ones are reduced to one per day for ``VERSION_KEEP_DAILY_DAYS``
+    and one per ISO week for ``VERSION_KEEP_WEEKLY_WEEKS``; anything older
+    than that is dropped. Returns the number of versions removed.
+    """
+    config = current_app.config
+    now = now or datetime.now(timezone.utc)
+    versions = db.session.query(ResumeVersion.id, ResumeVersion.created_at,
+                                ResumeVersion.label, ResumeVersion.root_hash)\
+        .filter_by(resume_id=resume_id)\
+        .order_by(ResumeVersion.created_at.desc(), ResumeVersion.id.desc()).all()
+
+    keep_recent = config.get('VERSION_KEEP_RECENT', 20)
+    daily_days = config.get('VERSION_KEEP_DAILY_DAYS', 30)
+    weekly_weeks = config.get('VERSION_KEEP_WEEKLY_WEEKS', 52)
+
+    kept_roots = set()
+    drop_ids = []
+    buckets = set()
+    for position, version in enumerate(versions):
+        created = _as_utc(version.created_at)
+        age_days = (now - created).days
+        if position < keep_recent or version.label:
+            bucket = None
+        elif age_days <= daily_days:
+            bucket = ('day', created.date())
+        elif age_days <= weekly_weeks * 7:
+            bucket = ('week', created.isocalendar()[:2])
+        else:
+            drop_ids.append(version.id)
+            continue
+
+        if bucket is not None:
+            if bucket in buckets:
+                drop_ids.append(version.id)
+                continue
+            buckets.add(bucket)
+        kept_roots.add(version.root_hash)
+
+    if not drop_ids:
+        return 0
+
+    for chunk in _chunks(drop_ids):
+        ResumeVersion.query.filter(ResumeVersion.id.in_(chunk))\
+            .delete(synchronize_session=False)
+
+    # Mark everything reachable from the surviving roots, then sweep the rest
+    reachable = set(kept_roots)
+    manifests = load_blobs(resume_id, kept_roots)
+    section_hashes = {h for doc in manifests.values() for h in doc['sections']}
+    reachable.update(section_hashes)
+    for doc in load_blobs(resume_id, section_hashes).values():
+        reachable.update(doc['entries'])
+
+    stored = [h for (h,) in db.session.query(VersionBlob.hash).filter_by(resume_id=resume_id)]
+    for chunk in _chunks(h for h in stored if h not in reachable):
+        VersionBlob.query.filter(VersionBlob.resume_id == resume_id,
+                                 VersionBlob.hash.in_(chunk)).delete(synchronize_session=False)
+    return len(drop_ids)
@@ -0,0 +1,80 @@
+"""CRUD latency while anonymous clients flood the login endpoint.
+
+Every login attempt hashes a password, so a flood of them competes with
+ordinary requests for the worker's CPU. This measures ``GET
+/api/resumes/<id>`` latency alone, during a flood with the shipped
+admission limits, and during the same flood with admission control off.
+Flooders send ``X-Forwarded-For`` (``TRUSTED_PROXIES=1``): from one
+address the rate limit turns them away, from many addresses only the
+concurrency cap protects the worker.
+
+    python benchmarks/admission_flood.py [--flooders 16] [--requests 300]
+"""
+import argparse
+import threading
+
+from common import make_app, percentile, seed_resume, seed_user, timed
+
+def measure(app, headers, resume_id, requests):
+    client = app.test_client()
+    samples = []
+    for _ in range(requests):
+        response, seconds = timed(client.get, f'/api/resumes/{resume_id}', headers=headers)
+        assert response.status_code == 200, response.status_code
+        samples.append(seconds * 1000)
+    return samples
+
+def flood(app, stop, counts, index, spread):
+    client = app.test_client()
+    attempt = 0
+    while not stop.is_set():
+        attempt += 1
+        address = f'10.{index}.{attempt // 250 % 250}.{attempt % 250}' if spread else '10.0.0.1'
+        response = client.post('/api/auth/login',
+                               json={'email': 'bench@example.com', 'password': 'wrong'},
+                               headers={'X-Forwarded-For': address})
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+def run(app, headers, resume_id, flooders, requests, spread=True):
+    stop = threading.Event()
+    counts = {}
+    threads = [threading.Thread(target=flood, args=(app, stop, counts, i, spread), daemon=True)
+               for i in range(flooders)]
+    for thread in threads:
+        thread.start()
+    try:
+        return measure(app, headers, resume_id, requests), counts
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def report(label, samples, counts=None):
+    line = (f'{label:<28} p50 {percentile(samples, 0.5):7.1f} ms   '
+            f'p99 {percentile(samples, 0.99):7.1f} ms')
+    if counts:
+        line += '   logins ' + ', '.join(f'{code}: {n}' for code, n in sorted(counts.items()))
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--flooders', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=300)
+    options = parser.parse_args()
+
+    app = make_app(TRUSTED_PROXIES=1)
+    from app import admission
+    _, headers = seed_user(app)
+    resume_id = seed_resume(app.test_client(), headers)
+
+    report('no flood', measure(app, headers, resume_id, options.requests))
+    report('one address, admission', *run(app, headers, resume_id, options.flooders,
+                                          options.requests, spread=False))
+    report('many addresses, admission', *run(app, headers, resume_id, options.flooders,
+                                             options.requests))
+    admission.limits = {}
+    report('many addresses, no admission', *run(app, headers, resume_id, options.flooders,
+                                                options.requests))
+
+if __name__ == '__main__':
+    main()
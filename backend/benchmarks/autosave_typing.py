@@ -0,0 +1,84 @@
+"""Editor typing workload: PUT per keystroke against coalesced autosave.
+
+Replays typing a paragraph into one entry's description, one request per
+keystroke, with a pause after every ``--burst`` keystrokes as a typist
+would make. The PUT path commits every keystroke; autosave buffers them and
+writes once per pause (``AUTOSAVE_WINDOW``). Reports request latency,
+keystrokes per second and the number of commits each path made.
+
+    python benchmarks/autosave_typing.py [--keystrokes 600] [--burst 40] [--pause 0.6]
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+
+from common import make_app, percentile, seed_resume, seed_user, timed
+
+TEXT = 'Led a team of five engineers rebuilding the billing platform on Postgres. '
+
+def target(client, headers, resume_id):
+    doc = client.get(f'/api/resumes/{resume_id}', headers=headers).json
+    section = doc['sections'][0]
+    return section['id'], section['entries'][0]
+
+def typing(options, send):
+    """Send ``options.keystrokes`` keystrokes; returns (latencies in ms, busy seconds)."""
+    samples = []
+    for i in range(options.keystrokes):
+        text = (TEXT * (i // len(TEXT) + 1))[:i + 1]
+        _, seconds = timed(send, text)
+        samples.append(seconds * 1000)
+        if (i + 1) % options.burst == 0:
+            time.sleep(options.pause)
+    return samples, sum(samples) / 1000
+
+def report(label, samples, busy, commits):
+    print(f'{label:<10} p50 {percentile(samples, 0.5):6.2f} ms   '
+          f'p99 {percentile(samples, 0.99):6.2f} ms   '
+          f'{len(samples) / busy:7.0f} keystrokes/s   {commits} commits')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keystrokes', type=int, default=600)
+    parser.add_argument('--burst', type=int, default=40)
+    parser.add_argument('--pause', type=float, default=0.6)
+    options = parser.parse_args()
+
+    app = make_app(AUTOSAVE_WINDOW=options.pause / 2)
+    from app import autosave, db
+    _, headers = seed_user(app)
+    client = app.test_client()
+    resume_id = seed_resume(client, headers, sections=1, entries=1)
+    section_id, entry = target(client, headers, resume_id)
+    url = f'/api/sections/{resume_id}/sections/{section_id}/entries/{entry["id"]}'
+
+    commits = [0]
+    with app.app_context():
+        event.listen(db.engine, 'commit', lambda connection: commits.__setitem__(0, commits[0] + 1))
+
+    def put(text):
+        response = client.put(url, json={'description': text}, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    samples, busy = typing(options, put)
+    report('PUT', samples, busy, commits[0])
+
+    _, entry = target(client, headers, resume_id)
+    version = [entry['version']]
+
+    def save(text):
+        response = client.post(f'/api/resumes/{resume_id}/autosave', json={'changes': [{
+            'kind': 'entry', 'id': entry['id'], 'version': version[0],
+            'fields': {'description': text}}]}, headers=headers)
+        assert response.status_code in (200, 202), response.status_code
+        version[0] = response.json['results'][0]['version']
+
+    commits[0] = 0
+    samples, busy = typing(options, save)
+    with app.app_context():
+        autosave.flush_all()
+    report('autosave', samples, busy, commits[0])
+
+if __name__ == '__main__':
+    main()
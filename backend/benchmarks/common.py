@@ -0,0 +1,66 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Each script builds the app against a throwaway SQLite file, seeds it
+through the models and times requests made with the Flask test client;
+run them from ``backend/``, e.g. ``python benchmarks/admission_flood.py``.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_app(**settings):
+    """App on a fresh SQLite file, with ``settings`` overriding the config."""
+    directory = tempfile.mkdtemp(prefix='papertrail-bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    os.environ.setdefault('EVENTS_BACKEND', 'memory')
+    os.environ.setdefault('ADMISSION_SQLITE_PATH', os.path.join(directory, 'admission.db'))
+    from config import config
+    from app import create_app, db
+    base = config['production']
+    overrides = type('BenchConfig', (base,), dict(settings))
+    config['bench'] = overrides
+    app = create_app('bench')
+    with app.app_context():
+        db.create_all()
+    return app
+
+def seed_user(app, name='bench', password='bench-password'):
+    """Create a user the way registration does; returns ``(user id, headers)``."""
+    from app import db, shards
+    from app.models import User, UserDirectory
+    with app.app_context():
+        listing = UserDirectory(username=name, email=f'{name}@example.com')
+        db.session.add(listing)
+        db.session.flush()
+        listing.shard = shards.shard_for_new_user(listing.id)
+        db.session.commit()
+        shards.activate(listing.shard)
+        user = User(id=listing.id, username=name, email=f'{name}@example.com')
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user.id, {'Authorization': f'Bearer {user.get_token()}'}
+
+def seed_resume(client, headers, sections=2, entries=3, title='Benchmark resume'):
+    """Create a resume through the API; returns its id."""
+    resume_id = client.post('/api/resumes', json={'title': title}, headers=headers).json['id']
+    for s in range(sections):
+        section_id = client.post(f'/api/sections/{resume_id}/sections',
+                                 json={'title': f'Section {s}'}, headers=headers).json['id']
+        for e in range(entries):
+            client.post(f'/api/sections/{resume_id}/sections/{section_id}/entries',
+                        json={'title': f'Entry {s}.{e}'}, headers=headers)
+    return resume_id
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def timed(function, *args, **kwargs):
+    """``(result, seconds)``."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,83 @@
+"""Deleting a large resume: ORM cascade against ON DELETE CASCADE.
+
+Seeds a resume with ``--entries`` entries and deletes it in two ways:
+
+* ``ORM cascade``: as DELETE /api/resumes/<id> did before the foreign keys
+  cascaded. The session loads the resume, its sections, entries and
+  versions, and deletes every row.
+* ``DB cascade``: DELETE /api/resumes/<id> as it is now, one DELETE that
+  the database cascades.
+
+Reports the median time and the number of SQL statements for each.
+
+    python benchmarks/resume_delete.py [--entries 1000] [--runs 5]
+"""
+import argparse
+import statistics
+
+from sqlalchemy import event, insert
+
+from common import make_app, seed_resume, seed_user, timed
+
+def seed_entries(app, resume_id, entries, per_section=100):
+    from app import db
+    from app.models import Entry, Section
+    with app.app_context():
+        for start in range(0, entries, per_section):
+            section = Section(resume_id=resume_id, title=f'Section {start // per_section}',
+                              order=start // per_section + 1)
+            db.session.add(section)
+            db.session.flush()
+            db.session.execute(insert(Entry), [
+                {'section_id': section.id, 'title': f'Entry {n}', 'description': 'x' * 200,
+                 'order': n + 1}
+                for n in range(min(per_section, entries - start))])
+        db.session.commit()
+
+def orm_cascade(app, resume_id):
+    from app import db
+    from app.models import Resume
+    with app.app_context():
+        resume = db.session.get(Resume, resume_id)
+        for section in resume.sections:
+            for entry in section.entries:
+                db.session.delete(entry)
+            db.session.delete(section)
+        for version in resume.versions:
+            db.session.delete(version)
+        db.session.delete(resume)
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    options = parser.parse_args()
+
+    app = make_app()
+    from app import db
+    _, headers = seed_user(app)
+    client = app.test_client()
+
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+    def api_delete(resume_id):
+        response = client.delete(f'/api/resumes/{resume_id}', headers=headers)
+        assert response.status_code == 204, response.status_code
+
+    for label, delete in (('ORM cascade', lambda resume_id: orm_cascade(app, resume_id)),
+                          ('DB cascade', api_delete)):
+        samples = []
+        for _ in range(options.runs):
+            resume_id = seed_resume(client, headers, sections=0)
+            seed_entries(app, resume_id, options.entries)
+            statements[0] = 0
+            _, seconds = timed(delete, resume_id)
+            samples.append(seconds * 1000)
+        print(f'{label:<12} {statistics.median(samples):8.1f} ms   {statements[0]:5d} statements')
+
+if __name__ == '__main__':
+    main()
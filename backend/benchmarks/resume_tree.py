@@ -0,0 +1,112 @@
+"""Loading every resume of an account: ORM instances against Core records.
+
+Seeds ``--resumes`` resumes of ``--sections`` sections with ``--entries``
+entries each and compares time and peak traced memory for three ways of
+producing the documents:
+
+* ``ORM``: ``Resume.to_dict`` on model instances, one entries query per
+  section through the dynamic relationships.
+* ``records``: the whole tree as records (services/records.py), built in
+  three queries and serialized at once.
+* ``GET /api/resumes``: the endpoint, which streams the records a page of
+  ``RESUME_LIST_PAGE_SIZE`` resumes at a time; the body is read and dropped.
+
+It also checks that the three give the same documents.
+
+    python benchmarks/resume_tree.py [--resumes 20] [--sections 10] [--entries 52] [--runs 5]
+                                     [--page-size 100]
+"""
+import argparse
+import datetime
+import json
+import statistics
+import tracemalloc
+
+from sqlalchemy import insert
+
+from common import make_app, seed_user, timed
+
+def seed(app, user_id, resumes, sections, entries):
+    from app import db
+    from app.models import Entry, Resume, Section
+    with app.app_context():
+        for r in range(resumes):
+            resume = Resume(title=f'Resume {r}', slug=f'resume-{r}', user_id=user_id)
+            db.session.add(resume)
+            db.session.flush()
+            rows = [Section(title=f'Section {s}', order=s + 1, resume_id=resume.id)
+                    for s in range(sections)]
+            db.session.add_all(rows)
+            db.session.flush()
+            db.session.execute(insert(Entry), [
+                {'section_id': section.id, 'title': f'Entry {e}', 'subtitle': 'Subtitle',
+                 'description': 'x' * 200, 'start_date': datetime.date(2020, 1, 1),
+                 'order': e + 1, 'current': False}
+                for section in rows for e in range(entries)])
+        db.session.commit()
+
+def measure(app, function, runs):
+    """``(result, median milliseconds, peak MB)`` of ``function``.
+
+    Timed and traced in separate runs, as tracing slows allocation down.
+    """
+    from app import db
+    samples = []
+    for _ in range(runs):
+        with app.app_context():
+            result, seconds = timed(function)
+            samples.append(seconds * 1000)
+            db.session.rollback()
+    with app.app_context():
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.rollback()
+    return result, statistics.median(samples), peak / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resumes', type=int, default=20)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--entries', type=int, default=52)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100,
+                        help='RESUME_LIST_PAGE_SIZE for the endpoint.')
+    options = parser.parse_args()
+
+    app = make_app(RESUME_LIST_PAGE_SIZE=options.page_size)
+    from app.models import Resume
+    from app.services.exporter import iter_resume_documents
+    user_id, headers = seed_user(app)
+    seed(app, user_id, options.resumes, options.sections, options.entries)
+    client = app.test_client()
+
+    def orm():
+        documents = [resume.to_dict() for resume in
+                     Resume.query.filter_by(user_id=user_id).order_by(Resume.id)]
+        for document in documents:
+            document['sections'].sort(key=lambda section: (section['order'], section['id']))
+        return documents
+
+    def records():
+        # One page as large as the account: the whole tree at once
+        return list(iter_resume_documents(user_id=user_id, page_size=options.resumes))
+
+    def endpoint():
+        response = client.get('/api/resumes', headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    results = {}
+    for label, function in (('ORM', orm), ('records', records), ('GET /api/resumes', endpoint)):
+        results[label], milliseconds, peak = measure(app, function, options.runs)
+        print(f'{label:<17} {milliseconds:7.0f} ms   peak {peak:6.1f} MB')
+
+    body = client.get('/api/resumes', headers=headers).get_data()
+    assert results['ORM'] == results['records'] == json.loads(body), 'documents differ'
+    print(f'{options.resumes * options.sections * options.entries} entries, identical documents')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""PDF renders per second with cold and with warm theme caches.
+
+Renders the same resume through ``render_resume_pdf``. For the cold runs
+the theme registry forgets its compiled stylesheets and font configuration
+before every render, as each render did before themes were cached. The warm
+runs reuse them. Needs WeasyPrint and its system libraries (pango, cairo).
+
+    python benchmarks/theme_renders.py [--renders 50] [--theme classic]
+"""
+import argparse
+import time
+
+from common import make_app, seed_resume, seed_user
+
+def renders_per_second(app, document, renders, cold):
+    from app import themes
+    from app.services.pdf import render_resume_pdf
+    with app.app_context():
+        render_resume_pdf(document)
+        started = time.perf_counter()
+        for _ in range(renders):
+            if cold:
+                themes.invalidate()
+                themes._font_config = None
+            render_resume_pdf(document)
+        return renders / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--renders', type=int, default=50)
+    parser.add_argument('--theme', default='classic')
+    options = parser.parse_args()
+
+    app = make_app(THEME_WARMUP=False)
+    from app.services.pdf import load_weasyprint
+    load_weasyprint()
+    _, headers = seed_user(app)
+    client = app.test_client()
+    resume_id = seed_resume(client, headers, sections=4, entries=4)
+    client.put(f'/api/resumes/{resume_id}', json={'theme': options.theme}, headers=headers)
+    document = client.get(f'/api/resumes/{resume_id}', headers=headers).json
+
+    cold = renders_per_second(app, document, options.renders, cold=True)
+    warm = renders_per_second(app, document, options.renders, cold=False)
+    print(f'cold  {cold:6.1f} renders/s')
+    print(f'warm  {warm:6.1f} renders/s   ({warm / cold:.1f}x)')
+
+if __name__ == '__main__':
+    main()
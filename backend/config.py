@@ -1,9 +1,20 @@
 import os
+import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
+def parse_binds(value):
+    """Parse ``name=url,name=url`` into a ``SQLALCHEMY_BINDS`` dict."""
+    binds = {}
+    for item in (value or '').split(','):
+        if item.strip():
+            name, _, url = item.partition('=')
+            binds[name.strip()] = url.strip()
+    return binds
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-123'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -12,6 +23,110 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-123'
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
 
+    # Register the ``flask db`` commands. Setting them up imports Alembic,
+    # so servers, which never run them, start faster with DB_MIGRATIONS=0
+    DB_MIGRATIONS = os.environ.get('DB_MIGRATIONS', '1') != '0'
+
+    # Version history compaction: keep the newest N versions, then one per
+    # day and one per week for the given windows
+    VERSION_KEEP_RECENT = 20
+    VERSION_KEEP_DAILY_DAYS = 30
+    VERSION_KEEP_WEEKLY_WEEKS = 52
+
+    # Bulk import
+    IMPORT_BATCH_SIZE = 500
+    IMPORT_MAX_ERRORS = 100
+    IMPORT_MAX_RECORD_BYTES = 1024 * 1024
+
+    # Bulk export: resumes per keyset page, entry rows per cursor fetch
+    EXPORT_PAGE_SIZE = 100
+    EXPORT_YIELD_PER = 1000
+    # GET /api/resumes: resumes loaded per page of the streamed list
+    RESUME_LIST_PAGE_SIZE = 100
+
+    # PDF themes: how often to check theme files for changes, and whether
+    # workers compile every theme in the background right after they fork
+    THEME_CHECK_INTERVAL = 2.0
+    THEME_WARMUP = True
+
+    # Live preview: rendered section fragments kept per process
+    PREVIEW_CACHE_SIZE = 2048
+
+    # Number of reverse proxies in front of the app that append to
+    # X-Forwarded-For. Admission control keys anonymous callers on the
+    # client address they report; leave at 0 when clients connect directly,
+    # or anyone could pick their own address.
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES') or 0)
+
+    # Admission control for expensive endpoints, keyed by endpoint or
+    # blueprint name (see app/services/admission.py). 'memory' keeps state
+    # per worker; 'sqlite' shares it between the workers on this host, in
+    # admission.db under the app's instance folder unless a path is given.
+    ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND') or 'memory'
+    ADMISSION_SQLITE_PATH = os.environ.get('ADMISSION_SQLITE_PATH')
+    ADMISSION_LIMITS = {
+        'auth.login': {'rate': 10, 'per': 60, 'burst': 10, 'concurrency': 8},
+        'auth.register': {'rate': 5, 'per': 3600, 'burst': 5, 'concurrency': 4},
+        'auth.change_password': {'rate': 5, 'per': 300, 'burst': 5, 'concurrency': 4},
+        'resumes.export_pdf': {'rate': 30, 'per': 60, 'burst': 10, 'concurrency': 4},
+        'resumes.import_resumes': {'rate': 5, 'per': 3600, 'burst': 2, 'concurrency': 2},
+        'resumes.export_resumes': {'rate': 10, 'per': 3600, 'burst': 2, 'concurrency': 2},
+    }
+
+    # Server-sent change feed (see app/services/events.py). 'sqlite' shares
+    # events between the workers on this host; 'memory' keeps them per worker
+    # and is only correct with a single worker (gunicorn refuses it otherwise).
+    # The SQLite file defaults to events.db under the app's instance folder.
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or 'sqlite'
+    EVENTS_SQLITE_PATH = os.environ.get('EVENTS_SQLITE_PATH')
+    EVENTS_HISTORY = 256
+    EVENTS_HEARTBEAT = 15
+    EVENTS_POLL_INTERVAL = 0.5
+
+    # Autosave coalescing (see app/services/autosave.py): a row is written
+    # once idle for AUTOSAVE_WINDOW seconds, and at most AUTOSAVE_MAX_DELAY
+    # seconds after its first buffered change. A window of 0 writes through.
+    AUTOSAVE_WINDOW = float(os.environ.get('AUTOSAVE_WINDOW') or 0.5)
+    AUTOSAVE_MAX_DELAY = 3.0
+
+    # Token revocation (see app/services/revocation.py): each worker picks up
+    # new revocations within REVOCATION_REFRESH seconds
+    REVOCATION_REFRESH = 5
+    REVOCATION_REBUILD = 3600
+    REVOCATION_BLOOM_BITS = 1 << 20
+    REVOCATION_BLOOM_HASHES = 7
+
+    # Resume view and download counters (see app/services/counters.py) are
+    # written every COUNTER_FLUSH_INTERVAL seconds or COUNTER_FLUSH_EVENTS hits
+    COUNTER_FLUSH_INTERVAL = 5
+    COUNTER_FLUSH_EVENTS = 1000
+
+    # Dashboard thumbnails (see app/services/thumbnails.py): a resume is
+    # rendered once untouched for THUMBNAIL_DEBOUNCE seconds, and at most
+    # THUMBNAIL_MAX_DELAY seconds after the first change. Widths in pixels.
+    # Images go to thumbnails/ under the app's instance folder by default.
+    THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR')
+    THUMBNAIL_SIZES = {'small': 240, 'large': 480}
+    THUMBNAIL_DEBOUNCE = 10
+    THUMBNAIL_MAX_DELAY = 60
+    # A render claimed longer ago than this is presumed dead and taken over
+    THUMBNAIL_CLAIM_TIMEOUT = 300
+
+    # Journal rows returned per GET /api/sync call. `flask expire-change-log`
+    # deletes rows older than SYNC_RETENTION_DAYS; a client whose cursor is
+    # older than that gets a full snapshot instead.
+    SYNC_PAGE_SIZE = 1000
+    SYNC_RETENTION_DAYS = 90
+
+    # User-keyed sharding (see app/services/sharding.py). SHARDS lists the
+    # databases new users are spread over: 'default' is DATABASE_URL, other
+    # names are binds given as SHARD_DATABASE_URLS=name=url,name=url.
+    SQLALCHEMY_BINDS = parse_binds(os.environ.get('SHARD_DATABASE_URLS'))
+    SHARDS = [name.strip() for name in (os.environ.get('SHARDS') or 'default').split(',')
+              if name.strip()]
+    SHARD_VNODES = 64
+    SHARD_CACHE_TTL = 60
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_ECHO = True
@@ -20,12 +135,34 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    ADMISSION_LIMITS = {}
+    EVENTS_BACKEND = 'memory'
 
 class ProductionConfig(Config):
     DEBUG = False
     # Ensure the DATABASE_URL is set in production
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
+@lru_cache(maxsize=None)
+def validate_config(config_class):
+    """Check a config class once per process, however many apps are created from it."""
+    if not (getattr(config_class, 'SQLALCHEMY_DATABASE_URI', None) or
+            getattr(config_class, 'SQLALCHEMY_BINDS', None)):
+        raise RuntimeError(f'{config_class.__name__} has no database configured; '
+                           'set DATABASE_URL')
+    if config_class.ADMISSION_BACKEND not in ('memory', 'sqlite'):
+        raise RuntimeError(f'Unknown ADMISSION_BACKEND {config_class.ADMISSION_BACKEND!r}')
+    if config_class.EVENTS_BACKEND not in ('memory', 'sqlite'):
+        raise RuntimeError(f'Unknown EVENTS_BACKEND {config_class.EVENTS_BACKEND!r}')
+    for shard in config_class.SHARDS:
+        if shard != 'default' and shard not in config_class.SQLALCHEMY_BINDS:
+            raise RuntimeError(f'Shard {shard!r} has no URL in SHARD_DATABASE_URLS')
+    if not (getattr(config_class, 'DEBUG', False) or getattr(config_class, 'TESTING', False)):
+        for key, default in (('SECRET_KEY', 'dev-key-123'), ('JWT_SECRET_KEY', 'jwt-secret-123')):
+            if getattr(config_class, key) == default:
+                logging.getLogger(__name__).warning(f'{key} is using the development default')
+    return True
+
 config = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
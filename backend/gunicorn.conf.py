@@ -0,0 +1,64 @@
+"""Gunicorn settings for the API.
+
+The app is created once in the master (``preload_app``) and forked into the
+workers, so a new worker serves its first request without importing or
+configuring anything. Heavy optional modules such as WeasyPrint are still
+loaded lazily, on first use, inside each worker.
+
+Workers are gevent-based by default so the server-sent change feed can hold
+many idle connections per worker, each parked on a greenlet rather than a
+thread; ``GUNICORN_WORKER_CLASS=sync`` restores the plain pre-fork model.
+Under gevent, psycopg2 is made cooperative with psycogreen, and CPU-bound
+work (PDF rendering, theme compilation, thumbnails) runs on native threads
+through app/services/native.py rather than on the hub.
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    # Patch before the preloaded app creates its locks, queues and sockets,
+    # otherwise they would block the whole worker instead of one greenlet
+    from gevent import monkey
+    monkey.patch_all()
+    # psycopg2 blocks in C; without this every query would stall the hub
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+# Workers never run ``flask db``; skip importing Alembic into them
+os.environ.setdefault('DB_MIGRATIONS', '0')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '1000'))
+preload_app = True
+
+
+def when_ready(server):
+    from run import app
+    # Each worker would keep its own feed: editors connected to one worker
+    # would miss edits served by another, and event ids would not line up
+    if server.cfg.workers > 1 and app.config['EVENTS_BACKEND'] == 'memory':
+        raise RuntimeError('EVENTS_BACKEND=memory needs a single worker; '
+                           'use EVENTS_BACKEND=sqlite or WEB_CONCURRENCY=1')
+
+
+def post_fork(server, worker):
+    from run import app
+    from app import db, themes
+    # Pooled connections opened in the master must not be shared by workers
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # Compile theme stylesheets on a native thread (see app/services/native.py)
+    # so the worker serves requests meanwhile and the first PDF finds its
+    # theme ready
+    if app.config.get('THEME_WARMUP'):
+        themes.warm_in_background(logger=app.logger)
+
+
+def worker_exit(server, worker):
+    from app import autosave, counters
+    # Write buffered autosaves and counters while the worker is still whole;
+    # the atexit hooks only cover processes not run under gunicorn
+    autosave.flush_all()
+    counters.flush_all()
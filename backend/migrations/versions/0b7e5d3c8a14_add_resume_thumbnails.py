@@ -0,0 +1,31 @@
+"""Add resume thumbnails
+
+Revision ID: 0b7e5d3c8a14
+Revises: f1c6a9e2b058
+Create Date: 2026-10-19 20:55:41.306172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e5d3c8a14'
+down_revision = 'f1c6a9e2b058'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resume_thumbnails',
+    sa.Column('resume_id', sa.Integer(), nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('digests', sa.Text(), nullable=False),
+    sa.Column('rendered_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['resume_id'], ['resumes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('resume_id')
+    )
+
+
+def downgrade():
+    op.drop_table('resume_thumbnails')
@@ -0,0 +1,28 @@
+"""Revoke tokens to the sub-second
+
+Revision ID: 3c8e5a1f9d26
+Revises: 9f3b1e6c2d47
+Create Date: 2026-10-20 14:37:52.116830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e5a1f9d26'
+down_revision = '9f3b1e6c2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.alter_column('not_before', existing_type=sa.Integer(), type_=sa.Float(),
+                              existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.alter_column('not_before', existing_type=sa.Float(), type_=sa.Integer(),
+                              existing_nullable=True)
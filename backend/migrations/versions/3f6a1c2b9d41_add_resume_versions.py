@@ -0,0 +1,47 @@
+"""Add resume version history
+
+Revision ID: 3f6a1c2b9d41
+Revises: 92d5cdd9cb2e
+Create Date: 2026-10-19 09:12:04.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a1c2b9d41'
+down_revision = '92d5cdd9cb2e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resume_versions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('label', sa.String(length=100), nullable=True),
+    sa.Column('root_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('resume_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['resume_id'], ['resumes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('resume_versions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_resume_versions_resume_id'), ['resume_id'], unique=False)
+
+    op.create_table('version_blobs',
+    sa.Column('resume_id', sa.Integer(), nullable=False),
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['resume_id'], ['resumes.id'], ),
+    sa.PrimaryKeyConstraint('resume_id', 'hash')
+    )
+
+
+def downgrade():
+    op.drop_table('version_blobs')
+    with op.batch_alter_table('resume_versions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_resume_versions_resume_id'))
+
+    op.drop_table('resume_versions')
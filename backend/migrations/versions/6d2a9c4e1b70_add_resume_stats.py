@@ -0,0 +1,31 @@
+"""Add resume stats
+
+Revision ID: 6d2a9c4e1b70
+Revises: 0b7e5d3c8a14
+Create Date: 2026-10-19 22:14:03.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2a9c4e1b70'
+down_revision = '0b7e5d3c8a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resume_stats',
+    sa.Column('resume_id', sa.Integer(), nullable=False),
+    sa.Column('views', sa.Integer(), nullable=False),
+    sa.Column('downloads', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['resume_id'], ['resumes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('resume_id')
+    )
+
+
+def downgrade():
+    op.drop_table('resume_stats')
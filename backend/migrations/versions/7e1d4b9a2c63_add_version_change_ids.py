@@ -0,0 +1,26 @@
+"""Record the change journal cursor of each resume version
+
+Revision ID: 7e1d4b9a2c63
+Revises: 3c8e5a1f9d26
+Create Date: 2026-10-21 10:12:05.448913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1d4b9a2c63'
+down_revision = '3c8e5a1f9d26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('resume_versions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('resume_versions', schema=None) as batch_op:
+        batch_op.drop_column('change_id')
@@ -0,0 +1,46 @@
+"""Add global user directory for sharding
+
+Revision ID: 8a4d6b0e3f17
+Revises: 5c8e2f7a1d93
+Create Date: 2026-10-19 13:05:12.640357
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6b0e3f17'
+down_revision = '5c8e2f7a1d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_directory',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=64), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('shard', sa.String(length=50), nullable=False),
+    sa.Column('epoch', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('user_directory', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_directory_email'), ['email'], unique=True)
+        batch_op.create_index(batch_op.f('ix_user_directory_username'), ['username'], unique=True)
+
+    # Every existing user lives in the default database
+    op.execute("INSERT INTO user_directory (id, username, email, shard, epoch, created_at) "
+               "SELECT id, username, email, 'default', 0, created_at FROM users")
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("SELECT setval(pg_get_serial_sequence('user_directory', 'id'), "
+                   "COALESCE(MAX(id), 0) + 1, false) FROM user_directory")
+
+
+def downgrade():
+    with op.batch_alter_table('user_directory', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_directory_username'))
+        batch_op.drop_index(batch_op.f('ix_user_directory_email'))
+
+    op.drop_table('user_directory')
@@ -0,0 +1,26 @@
+"""Add thumbnail render claims
+
+Revision ID: 9f3b1e6c2d47
+Revises: 6d2a9c4e1b70
+Create Date: 2026-10-20 10:02:17.804512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b1e6c2d47'
+down_revision = '6d2a9c4e1b70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('resume_thumbnails', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('resume_thumbnails', schema=None) as batch_op:
+        batch_op.drop_column('claimed_until')
@@ -0,0 +1,61 @@
+"""Cascade deletes through foreign keys
+
+Revision ID: b71e0d4c5a28
+Revises: 3f6a1c2b9d41
+Create Date: 2026-10-19 10:02:47.130954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e0d4c5a28'
+down_revision = '3f6a1c2b9d41'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table)
+FOREIGN_KEYS = [
+    ('resumes', 'user_id', 'users'),
+    ('sections', 'resume_id', 'resumes'),
+    ('entries', 'section_id', 'sections'),
+    ('resume_versions', 'resume_id', 'resumes'),
+    ('version_blobs', 'resume_id', 'resumes'),
+]
+
+# Lets SQLite batch mode name the unnamed constraints it reflects
+NAMING_CONVENTION = {
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+}
+
+
+def _fk_name(table, column, referred):
+    return f'fk_{table}_{column}_{referred}'
+
+
+def _existing_fk_name(table, column, referred):
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        for fk in sa.inspect(bind).get_foreign_keys(table):
+            if fk['constrained_columns'] == [column] and fk['name']:
+                return fk['name']
+    return _fk_name(table, column, referred)
+
+
+def _replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        old_name = _existing_fk_name(table, column, referred)
+        with op.batch_alter_table(table, schema=None,
+                                  naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(old_name, type_='foreignkey')
+            batch_op.create_foreign_key(_fk_name(table, column, referred), referred,
+                                        [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
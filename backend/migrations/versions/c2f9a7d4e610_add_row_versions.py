@@ -0,0 +1,29 @@
+"""Add optimistic concurrency version columns
+
+Revision ID: c2f9a7d4e610
+Revises: 8a4d6b0e3f17
+Create Date: 2026-10-19 14:31:48.207713
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f9a7d4e610'
+down_revision = '8a4d6b0e3f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('resumes', 'sections', 'entries'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1',
+                                          nullable=False))
+
+
+def downgrade():
+    for table in ('entries', 'sections', 'resumes'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,27 @@
+"""Add the per-user change journal horizon
+
+Revision ID: d8a3f6c1e254
+Revises: 7e1d4b9a2c63
+Create Date: 2026-10-21 15:40:27.903156
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a3f6c1e254'
+down_revision = '7e1d4b9a2c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('journal_horizon', sa.Integer(), server_default='0',
+                                      nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('journal_horizon')
@@ -0,0 +1,41 @@
+"""Add revoked tokens
+
+Revision ID: e4b8d1a7c925
+Revises: c2f9a7d4e610
+Create Date: 2026-10-19 16:12:37.918245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d1a7c925'
+down_revision = 'c2f9a7d4e610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revoked_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('not_before', sa.Integer(), nullable=True),
+    sa.Column('expires', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_jti'), ['jti'], unique=True)
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_user_id'))
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_jti'))
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_created_at'))
+
+    op.drop_table('revoked_tokens')
@@ -0,0 +1,49 @@
+"""Add maintenance checkpoints and child order indexes
+
+Revision ID: f1c6a9e2b058
+Revises: e4b8d1a7c925
+Create Date: 2026-10-19 18:40:03.512966
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a9e2b058'
+down_revision = 'e4b8d1a7c925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('maintenance_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job', sa.String(length=100), nullable=False),
+    sa.Column('shard', sa.String(length=50), nullable=False),
+    sa.Column('lower', sa.Integer(), nullable=False),
+    sa.Column('upper', sa.Integer(), nullable=True),
+    sa.Column('last_key', sa.Integer(), nullable=False),
+    sa.Column('batches', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('job', 'shard', 'lower', name='uq_maintenance_checkpoints_range')
+    )
+    with op.batch_alter_table('sections', schema=None) as batch_op:
+        batch_op.create_index('ix_sections_resume_id_order', ['resume_id', 'order'], unique=False)
+
+    with op.batch_alter_table('entries', schema=None) as batch_op:
+        batch_op.create_index('ix_entries_section_id_order', ['section_id', 'order'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_entries_section_id_order')
+
+    with op.batch_alter_table('sections', schema=None) as batch_op:
+        batch_op.drop_index('ix_sections_resume_id_order')
+
+    op.drop_table('maintenance_checkpoints')
@@ -1,6 +1,8 @@
 import os
-from app import create_app, db
+import click
+from app import create_app, db, shards
 from app.models.user import User
+from app.models.directory import UserDirectory
 from app.models.resume import Resume
 from app.models.section import Section
 from app.models.entry import Entry
@@ -17,6 +19,321 @@ def make_shell_context():
         'Entry': Entry
     }
 
+def batch_options(command):
+    """Options shared by the batched maintenance commands (app/services/maintenance.py)."""
+    options = [
+        click.option('--batch-size', type=int, default=1000,
+                     help='Keys per batch; each batch is one transaction.'),
+        click.option('--load', type=float, default=0.5,
+                     help='Fraction of the time spent working; sleeps the rest.'),
+        click.option('--pause', type=float, default=0.0, help='Extra seconds to sleep per batch.'),
+        click.option('--parts', type=int, default=1,
+                     help='Split the key range into this many ranges, run in parallel.'),
+        click.option('--part', type=int,
+                     help='Run only this range (0-based) of --parts, e.g. one per process.'),
+        click.option('--shard', help='Only this shard; defaults to every shard.'),
+        click.option('--restart', is_flag=True, help='Discard the checkpoints of an interrupted run.'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+def run_jobs(jobs, shard, **options):
+    from app.services.maintenance import MaintenanceError, run, target_shards
+    
+    if options['part'] is not None and not 0 <= options['part'] < options['parts']:
+        raise click.BadParameter('must be below --parts', param_hint='--part')
+    for job in jobs:
+        for name in target_shards(job, shard):
+            try:
+                changed = run(job, name, **options)
+            except MaintenanceError as e:
+                raise click.ClickException(str(e))
+            click.echo(f'{job.name} on {name}: {changed} rows changed')
+
+@app.cli.command('repair-entry-order')
+@batch_options
+def repair_entry_order(shard, **options):
+    """Renumber entry order 1..n per section, closing gaps left by deletes."""
+    from app.services.maintenance import JOBS
+    run_jobs([JOBS['repair-entry-order']], shard, **options)
+
+@app.cli.command('repair-section-order')
+@batch_options
+def repair_section_order(shard, **options):
+    """Renumber section order 1..n per resume, closing gaps left by deletes."""
+    from app.services.maintenance import JOBS
+    run_jobs([JOBS['repair-section-order']], shard, **options)
+
+@app.cli.command('prune-orphans')
+@click.option('--table', 'tables', multiple=True, help='Only these tables; repeatable.')
+@batch_options
+def prune_orphans(tables, shard, **options):
+    """Delete rows whose parent row is gone, e.g. from before foreign keys were enforced."""
+    from app.services.maintenance import ORPHANS, prune_jobs
+    
+    unknown = set(tables) - {name for name, *_ in ORPHANS}
+    if unknown:
+        raise click.BadParameter(f"Unknown tables: {', '.join(sorted(unknown))}",
+                                 param_hint='--table')
+    run_jobs(prune_jobs(tables), shard, **options)
+
+@app.cli.command('backfill')
+@click.argument('table')
+@click.argument('column')
+@click.option('--value', help='JSON value to set, e.g. false, 0 or \'"2020-01-01"\'.')
+@click.option('--from-column', 'source', help='Copy the value of this column instead.')
+@batch_options
+def backfill(table, column, value, source, shard, **options):
+    """Fill the NULLs of TABLE.COLUMN, e.g. after adding a column."""
+    from app.services.maintenance import MaintenanceError, backfill_job
+    
+    if (value is None) == (source is None):
+        raise click.UsageError('Pass exactly one of --value and --from-column')
+    try:
+        job = backfill_job(table, column, value=value, source=source)
+    except MaintenanceError as e:
+        raise click.ClickException(str(e))
+    run_jobs([job], shard, **options)
+
+@app.cli.command('expire-change-log')
+@click.option('--days', type=int, help='Keep this many days; defaults to SYNC_RETENTION_DAYS.')
+@batch_options
+def expire_change_log(days, shard, **options):
+    """Delete sync journal rows older than the retention period.
+
+    Clients whose cursor is older get a full snapshot on their next sync.
+    """
+    from app.services.maintenance import MaintenanceError, expire_changes_job
+    
+    if days is None:
+        days = app.config.get('SYNC_RETENTION_DAYS', 90)
+    try:
+        job = expire_changes_job(days)
+    except MaintenanceError as e:
+        raise click.ClickException(str(e))
+    run_jobs([job], shard, **options)
+
+@app.cli.command('purge-revoked-tokens')
+@batch_options
+def purge_revoked_tokens(shard, **options):
+    """Delete revocations whose tokens have expired anyway."""
+    from app.services.maintenance import JOBS
+    run_jobs([JOBS['purge-revoked-tokens']], shard, **options)
+
+@app.cli.command('vacuum')
+@click.option('--shard', help='Only this shard; defaults to every shard.')
+@click.option('--table', 'tables', multiple=True, help='Only these tables (PostgreSQL).')
+def vacuum(shard, tables):
+    """Reclaim space and refresh planner statistics.
+
+    On SQLite this rebuilds the whole file and blocks writers meanwhile.
+    """
+    from app.services.maintenance import vacuum as vacuum_shard
+    
+    for name in [shard] if shard else shards.names:
+        vacuum_shard(name, list(tables))
+        click.echo(f'Vacuumed {name}')
+
+@app.cli.command('maintenance-status')
+@click.option('--job', help='Only this job, e.g. repair-entry-order.')
+def maintenance_status(job):
+    """Show the checkpoints of batched maintenance jobs."""
+    from app.models import MaintenanceCheckpoint
+    
+    query = MaintenanceCheckpoint.query.order_by(MaintenanceCheckpoint.job,
+                                                 MaintenanceCheckpoint.shard,
+                                                 MaintenanceCheckpoint.lower)
+    if job:
+        query = query.filter_by(job=job)
+    for checkpoint in query:
+        upper = '' if checkpoint.upper is None else checkpoint.upper
+        state = 'done' if checkpoint.finished_at else f'at {checkpoint.last_key}'
+        click.echo(f'{checkpoint.job} {checkpoint.shard} [{checkpoint.lower}, {upper}): '
+                   f'{state}, {checkpoint.batches} batches, {checkpoint.processed} rows changed')
+
+def find_user(user_ref):
+    """Look up a user by id or email for CLI commands and route to their shard."""
+    if user_ref.isdigit():
+        listing = UserDirectory.query.get(int(user_ref))
+    else:
+        listing = UserDirectory.query.filter_by(email=user_ref).first()
+    user = None
+    if listing:
+        shards.activate(listing.shard)
+        user = User.query.get(listing.id)
+    if not user:
+        raise click.BadParameter(f'No user matches {user_ref!r}', param_hint='--user')
+    return user
+
+@app.cli.command('import-resumes')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user', 'user_ref', required=True, help='Owner id or email.')
+@click.option('--format', 'fmt', type=click.Choice(['json', 'ndjson']),
+              help='Input format; defaults to ndjson for .ndjson/.jsonl files.')
+@click.option('--batch-size', type=int, help='Records per INSERT batch.')
+def import_resumes(source, user_ref, fmt, batch_size):
+    """Bulk import JSON Resume or PaperTrail documents from SOURCE ('-' for stdin)."""
+    from app.services.importer import import_stream
+    
+    user = find_user(user_ref)
+    if fmt is None:
+        fmt = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'json'
+    
+    def progress(importer):
+        click.echo(f'{importer.imported} imported, {importer.failed} failed', err=True)
+    
+    summary = import_stream(source, user.id, fmt, batch_size=batch_size, progress=progress)
+    for error in summary['errors']:
+        click.echo(f"record {error['record']}: {error['error']}", err=True)
+    click.echo(f"Imported {summary['imported']} resumes, {summary['failed']} failed")
+
+@app.cli.command('export-resumes')
+@click.option('--user', 'user_ref', help='Owner id or email; omit to export every account.')
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'zip']), default='ndjson')
+@click.option('--after', 'after_id', type=int, default=0,
+              help='Resume from this resume id (exclusive).')
+@click.option('--pdf', 'include_pdf', is_flag=True, help='Add a rendered PDF per resume (zip only).')
+@click.option('--shard', help='Export only this shard; --after ids are per shard.')
+@click.option('--output', '-o', type=click.File('wb'), default='-')
+def export_resumes(user_ref, fmt, after_id, include_pdf, shard, output):
+    """Stream resumes to OUTPUT as NDJSON or a zip of per-resume JSON/PDF files."""
+    from app.services.exporter import EXPORT_FORMATS, iter_resume_documents
+    
+    if after_id and shards.enabled and not (user_ref or shard):
+        raise click.BadParameter('resume ids are per shard; add --user or --shard',
+                                 param_hint='--after')
+    user_id = find_user(user_ref).id if user_ref else None
+    serialize = EXPORT_FORMATS[fmt][2]
+    options = {'include_pdf': include_pdf} if fmt == 'zip' else {}
+    
+    def all_shards():
+        for name in [shard] if shard else shards.names:
+            with shards.use(name):
+                yield from iter_resume_documents(after_id=after_id)
+    
+    if user_id is not None:
+        documents = iter_resume_documents(user_id=user_id, after_id=after_id)
+    else:
+        documents = all_shards()
+    for chunk in serialize(documents, **options):
+        output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+@app.cli.command('render-thumbnails')
+@click.option('--user', 'user_ref', help='Owner id or email; omit for every account.')
+@click.option('--shard', help='Only this shard; defaults to every shard.')
+@click.option('--batch-size', type=int, default=500, help='Resume ids read per batch.')
+def render_thumbnails(user_ref, shard, batch_size):
+    """Render dashboard thumbnails now, e.g. after changing a theme.
+
+    Resumes whose rendered page is unchanged since their last thumbnail
+    are skipped, as are those a worker is rendering at the same time.
+    """
+    from app import thumbnails
+    from app.services.pdf import PDFUnavailable
+    from app.services.sharding import current_shard
+    from app.services.thumbnails import BUSY, RENDERED, SKIPPED, ThumbnailsUnavailable
+    
+    if user_ref:
+        user = find_user(user_ref)
+        targets = [current_shard()]
+    else:
+        targets = [shard] if shard else shards.names
+    
+    counts = {RENDERED: 0, SKIPPED: 0, BUSY: 0}
+    for name in targets:
+        with shards.use(name):
+            after_id = 0
+            while True:
+                query = db.session.query(Resume.id).filter(Resume.id > after_id)
+                if user_ref:
+                    query = query.filter(Resume.user_id == user.id)
+                batch = [row[0] for row in query.order_by(Resume.id).limit(batch_size)]
+                db.session.rollback()
+                if not batch:
+                    break
+                for resume_id in batch:
+                    try:
+                        counts[thumbnails.render(resume_id)] += 1
+                    except (PDFUnavailable, ThumbnailsUnavailable) as e:
+                        raise click.ClickException(str(e))
+                after_id = batch[-1]
+    click.echo(f'{counts[RENDERED]} thumbnails rendered, {counts[SKIPPED]} unchanged, '
+               f'{counts[BUSY]} being rendered elsewhere')
+
+@app.cli.command('prune-thumbnails')
+@click.option('--min-age', type=int, default=3600,
+              help='Keep unreferenced files younger than this many seconds.')
+def prune_thumbnails(min_age):
+    """Delete thumbnail files no resume on any shard refers to any more."""
+    import json
+    from app import thumbnails
+    from app.models import ResumeThumbnail
+    
+    keep = set()
+    for name in shards.names:
+        with shards.use(name):
+            for (digests,) in db.session.query(ResumeThumbnail.digests)\
+                    .execution_options(yield_per=1000):
+                keep.update(json.loads(digests).values())
+            db.session.rollback()
+    removed = thumbnails.store.prune(keep, min_age)
+    click.echo(f'{removed} thumbnail files removed, {len(keep)} in use')
+
+@app.cli.command('init-shards')
+def init_shards():
+    """Create the per-user tables on every shard in SHARDS.
+
+    The default database is managed by migrations (``flask db upgrade``).
+    """
+    for name in shards.names:
+        if name != 'default':
+            shards.create_schema(name)
+            click.echo(f'Initialised shard {name}')
+
+@app.cli.command('rebalance-shards')
+@click.option('--to-shards', help='Comma-separated target shards; defaults to SHARDS.')
+@click.option('--dry-run', is_flag=True, help='Only report which users would move.')
+@click.option('--batch-size', type=int, default=500, help='Directory rows read per batch.')
+def rebalance_shards(to_shards, dry_run, batch_size):
+    """Move users whose shard differs from their place on the hash ring.
+
+    Run it while the moving users are not being served, then set SHARDS to
+    the new list so new users are placed the same way.
+    """
+    from app.services.sharding import HashRing
+    
+    names = [name.strip() for name in to_shards.split(',')] if to_shards else shards.names
+    unknown = [name for name in names
+               if name != 'default' and name not in app.config['SQLALCHEMY_BINDS']]
+    if unknown:
+        raise click.BadParameter(f"Unknown shards: {', '.join(unknown)}",
+                                 param_hint='--to-shards')
+    ring = HashRing(names, app.config['SHARD_VNODES'])
+    
+    moved = {}
+    after_id = 0
+    while True:
+        batch = db.session.query(UserDirectory.id, UserDirectory.shard)\
+            .filter(UserDirectory.id > after_id)\
+            .order_by(UserDirectory.id).limit(batch_size).all()
+        db.session.rollback()
+        if not batch:
+            break
+        for user_id, shard in batch:
+            target = ring.node_for(user_id)
+            if target == shard:
+                continue
+            if not dry_run:
+                shards.move_user(user_id, target)
+            moved[(shard, target)] = moved.get((shard, target), 0) + 1
+        after_id = batch[-1][0]
+    
+    for (source, target), count in sorted(moved.items()):
+        click.echo(f'{source} -> {target}: {count} users')
+    verb = 'would move' if dry_run else 'moved'
+    click.echo(f'{sum(moved.values())} users {verb}')
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
@@ -0,0 +1,75 @@
+"""Shared fixtures: apps on throwaway SQLite files, and users seeded directly.
+
+Users are added the way registration adds them, without going through
+``/api/auth/register``, whose email check looks the domain up.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app from the testing config, with keyword settings overriding it.
+
+    Every shard in ``SHARDS`` other than ``default`` gets its own SQLite file.
+    """
+    from config import config
+    from app import create_app, db, shards
+
+    def make(**settings):
+        settings.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'default.db'}")
+        settings.setdefault('THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+        names = settings.get('SHARDS', ['default'])
+        settings.setdefault('SQLALCHEMY_BINDS', {
+            name: f"sqlite:///{tmp_path / f'{name}.db'}" for name in names if name != 'default'})
+        config['test'] = type('TestConfig', (config['testing'],), settings)
+        app = create_app('test')
+        with app.app_context():
+            # Earlier apps' bind keys stay registered on ``db``, so name the default
+            db.create_all(bind_key=None)
+            for name in names:
+                if name != 'default':
+                    shards.create_schema(name)
+        shards.invalidate()
+        return app
+
+    return make
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def add_user(app, name='alice', shard=None):
+    """Create a user, on ``shard`` or where the ring puts them; returns ``(id, headers)``."""
+    from app import db, shards
+    from app.models import User, UserDirectory
+    with app.app_context():
+        listing = UserDirectory(username=name, email=f'{name}@example.com')
+        db.session.add(listing)
+        db.session.flush()
+        listing.shard = shard or shards.shard_for_new_user(listing.id)
+        db.session.commit()
+        shards.activate(listing.shard)
+        user = User(id=listing.id, username=name, email=f'{name}@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user.id, {'Authorization': f'Bearer {user.get_token()}'}
+
+def add_resume(client, headers, sections=2, entries=2, title='My resume'):
+    """Create a resume through the API; returns its document."""
+    resume_id = client.post('/api/resumes', json={'title': title}, headers=headers).json['id']
+    for s in range(sections):
+        section_id = client.post(f'/api/sections/{resume_id}/sections',
+                                 json={'title': f'Section {s}'}, headers=headers).json['id']
+        for e in range(entries):
+            client.post(f'/api/sections/{resume_id}/sections/{section_id}/entries',
+                        json={'title': f'Entry {s}.{e}'}, headers=headers)
+    return client.get(f'/api/resumes/{resume_id}', headers=headers).json
@@ -0,0 +1,40 @@
+"""Token buckets shared through SQLite."""
+import sqlite3
+import time
+
+from app.services.admission import SQLiteStore
+
+def bucket_keys(path):
+    with sqlite3.connect(path) as connection:
+        return {key for (key,) in connection.execute('SELECT key FROM buckets')}
+
+def test_empty_bucket_waits_for_refill(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'admission.db'))
+
+    assert store.take('10.0.0.1', rate=1, capacity=2) == 0
+    assert store.take('10.0.0.1', rate=1, capacity=2) == 0
+    assert 0 < store.take('10.0.0.1', rate=1, capacity=2) <= 1
+    # Other callers have buckets of their own
+    assert store.take('10.0.0.2', rate=1, capacity=2) == 0
+
+def test_sweep_forgets_refilled_buckets(tmp_path, monkeypatch):
+    path = str(tmp_path / 'admission.db')
+    store = SQLiteStore(path)
+    monkeypatch.setattr(SQLiteStore, 'SWEEP_EVERY', 3)
+
+    # Refills within a millisecond
+    store.take('10.0.0.1', rate=1000, capacity=1)
+    store.take('10.0.0.2', rate=0.001, capacity=1)
+    assert bucket_keys(path) == {'10.0.0.1', '10.0.0.2'}
+    time.sleep(0.01)
+
+    store.take('10.0.0.3', rate=0.001, capacity=1)
+    assert bucket_keys(path) == {'10.0.0.2', '10.0.0.3'}
+
+def test_adds_sweep_column_to_existing_file(tmp_path):
+    path = str(tmp_path / 'admission.db')
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    store = SQLiteStore(path)
+    assert store.take('10.0.0.1', rate=1, capacity=1) == 0
@@ -0,0 +1,129 @@
+"""Coalesced autosave: buffered writes, stale versions and writes lost at flush."""
+import json
+
+import pytest
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def app(make_app):
+    # Nothing comes due on its own; tests flush explicitly
+    return make_app(AUTOSAVE_WINDOW=60, AUTOSAVE_MAX_DELAY=60)
+
+@pytest.fixture(autouse=True)
+def coalescer(app):
+    from app import autosave
+    yield autosave
+    # The coalescer outlives the app; drop what this test left buffered
+    with autosave.lock:
+        autosave.pending.clear()
+        autosave.inflight.clear()
+        autosave.lost.clear()
+
+@pytest.fixture
+def section(app, client):
+    _, headers = add_user(app)
+    resume = add_resume(client, headers, sections=1, entries=0)
+    return headers, resume['id'], resume['sections'][0]
+
+def autosave(client, headers, resume_id, *changes, flush=False):
+    body = {'changes': [{'kind': kind, 'id': obj_id, 'version': version, 'fields': fields}
+                        for kind, obj_id, version, fields in changes]}
+    if flush:
+        body['flush'] = True
+    return client.post(f'/api/resumes/{resume_id}/autosave', json=body, headers=headers)
+
+def stored(client, headers, resume_id):
+    return client.get(f'/api/resumes/{resume_id}', headers=headers).json['sections'][0]
+
+def test_flush_writes_through(client, section):
+    headers, resume_id, s = section
+
+    response = autosave(client, headers, resume_id,
+                        ('section', s['id'], s['version'], {'title': 'Experience'}), flush=True)
+    assert response.status_code == 200
+    assert response.json['results'][0]['status'] == 'saved'
+    assert response.json['results'][0]['version'] == s['version'] + 1
+    assert stored(client, headers, resume_id)['title'] == 'Experience'
+
+def test_burst_is_merged_into_one_write(client, section, coalescer):
+    headers, resume_id, s = section
+
+    first = autosave(client, headers, resume_id,
+                     ('section', s['id'], s['version'], {'title': 'Exp'}))
+    assert first.status_code == 202
+    version = first.json['results'][0]['version']
+    second = autosave(client, headers, resume_id,
+                      ('section', s['id'], version, {'title': 'Experience', 'order': 4}))
+    assert second.status_code == 202
+    assert stored(client, headers, resume_id)['title'] == s['title']
+
+    coalescer.flush_all()
+    saved = stored(client, headers, resume_id)
+    assert (saved['title'], saved['order']) == ('Experience', 4)
+    assert saved['version'] == s['version'] + 1
+
+def test_stale_version_conflicts(client, section):
+    headers, resume_id, s = section
+    autosave(client, headers, resume_id,
+             ('section', s['id'], s['version'], {'title': 'A'}), flush=True)
+
+    response = autosave(client, headers, resume_id,
+                        ('section', s['id'], s['version'], {'title': 'B'}))
+    assert response.status_code == 409
+    assert response.json['results'][0]['version'] == s['version'] + 1
+
+def test_change_behind_the_buffered_write_conflicts(client, section):
+    headers, resume_id, s = section
+    autosave(client, headers, resume_id, ('section', s['id'], s['version'], {'title': 'A'}))
+
+    response = autosave(client, headers, resume_id,
+                        ('section', s['id'], s['version'], {'title': 'B'}))
+    assert response.status_code == 409
+    assert response.json['results'][0]['version'] == s['version'] + 1
+
+def test_lost_write_is_published_and_reported_to_the_next_change(app, client, section,
+                                                                 coalescer):
+    from app import events
+    from app.services.events import resume_channel
+    headers, resume_id, s = section
+    buffered = autosave(client, headers, resume_id,
+                        ('section', s['id'], s['version'], {'title': 'Mine'}))
+    version = buffered.json['results'][0]['version']
+    # Another request writes the row before the buffer is flushed
+    client.patch(f"/api/sections/{resume_id}/sections/{s['id']}",
+                 json={'title': 'Theirs'}, headers=headers)
+
+    with app.test_request_context():
+        subscription, _ = events.subscribe(resume_channel(resume_id))
+    try:
+        coalescer.flush_all()
+        event = subscription.get(timeout=1)
+    finally:
+        subscription.close()
+    assert event.type == 'section.conflict'
+    assert json.loads(event.data) == {'id': s['id'], 'version': s['version'] + 1,
+                                      'lost_version': version, 'fields': ['title']}
+    assert stored(client, headers, resume_id)['title'] == 'Theirs'
+
+    response = autosave(client, headers, resume_id,
+                        ('section', s['id'], version, {'title': 'Mine again'}))
+    assert response.status_code == 409
+    assert response.json['results'][0]['version'] is None
+
+def test_other_users_rows_are_not_found(app, client, section):
+    _, resume_id, s = section
+    _, intruder = add_user(app, name='mallory')
+
+    response = autosave(client, intruder, resume_id,
+                        ('section', s['id'], s['version'], {'title': 'Mine'}))
+    assert response.status_code == 404
+
+def test_invalid_body_is_rejected(client, section):
+    headers, resume_id, s = section
+
+    response = autosave(client, headers, resume_id,
+                        ('section', s['id'], 'one', {'title': 'A'}))
+    assert response.status_code == 400
+    assert client.post(f'/api/resumes/{resume_id}/autosave', json={'changes': []},
+                       headers=headers).status_code == 400
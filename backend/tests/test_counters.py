@@ -0,0 +1,130 @@
+"""Write-behind view and download counters."""
+import pytest
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def app(make_app):
+    # Tests flush explicitly
+    return make_app(COUNTER_FLUSH_INTERVAL=60, COUNTER_FLUSH_EVENTS=10 ** 6)
+
+@pytest.fixture(autouse=True)
+def counters(app):
+    from app import counters
+
+    def reset():
+        with counters.lock:
+            counters.pending, counters.inflight, counters.events = {}, {}, 0
+
+    # The aggregator outlives the app; start and end with nothing buffered
+    reset()
+    yield counters
+    reset()
+
+@pytest.fixture
+def resume(app, client):
+    _, headers = add_user(app)
+    return headers, add_resume(client, headers, sections=1, entries=1)['id']
+
+def stats(client, headers, resume_id):
+    response = client.get(f'/api/resumes/{resume_id}/stats', headers=headers)
+    assert response.status_code == 200
+    return response.json['views'], response.json['downloads']
+
+def stored(app, resume_id):
+    from app.models import ResumeStat
+    with app.app_context():
+        row = ResumeStat.query.filter_by(resume_id=resume_id).first()
+        return (row.views, row.downloads) if row else None
+
+def test_preview_counts_a_view_and_loading_does_not(client, resume):
+    headers, resume_id = resume
+
+    client.get(f'/api/resumes/{resume_id}', headers=headers)
+    assert stats(client, headers, resume_id) == (0, 0)
+    assert client.get(f'/api/resumes/{resume_id}/preview', headers=headers).status_code == 200
+    assert stats(client, headers, resume_id) == (1, 0)
+
+def test_flush_adds_deltas_to_stored_totals(app, client, resume, counters):
+    headers, resume_id = resume
+    for _ in range(2):
+        client.get(f'/api/resumes/{resume_id}/preview', headers=headers)
+
+    with app.app_context():
+        assert counters.flush() == 1
+    assert counters.pending == counters.inflight == {}
+    assert counters.events == 0
+    assert stored(app, resume_id) == (2, 0)
+    assert stats(client, headers, resume_id) == (2, 0)
+
+    client.get(f'/api/resumes/{resume_id}/preview', headers=headers)
+    with app.app_context():
+        counters.flush()
+    assert stored(app, resume_id) == (3, 0)
+
+def test_deltas_being_written_are_counted_once(app, client, resume, counters, monkeypatch):
+    headers, resume_id = resume
+    client.get(f'/api/resumes/{resume_id}/preview', headers=headers)
+    write = counters._write
+    seen = []
+
+    def observed_write(deltas):
+        seen.append(counters.totals(resume_id))
+        return write(deltas)
+
+    monkeypatch.setattr(counters, '_write', observed_write)
+    with app.app_context():
+        counters.flush()
+    assert seen == [{'views': 1, 'downloads': 0}]
+    assert stats(client, headers, resume_id) == (1, 0)
+
+def test_failed_write_puts_deltas_back(app, client, resume, counters, monkeypatch):
+    headers, resume_id = resume
+    for _ in range(3):
+        client.get(f'/api/resumes/{resume_id}/preview', headers=headers)
+
+    def failing_write(deltas):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(counters, '_write', failing_write)
+    with app.app_context():
+        counters.flush()
+    assert counters.inflight == {}
+    assert counters.events == 3
+    assert stored(app, resume_id) is None
+    assert stats(client, headers, resume_id) == (3, 0)
+
+    monkeypatch.undo()
+    with app.app_context():
+        counters.flush()
+    assert stored(app, resume_id) == (3, 0)
+    assert counters.pending == {}
+
+def test_hits_on_deleted_resumes_are_dropped(app, client, resume, counters):
+    headers, resume_id = resume
+    kept = add_resume(client, headers, sections=0)['id']
+    client.get(f'/api/resumes/{resume_id}/preview', headers=headers)
+    client.get(f'/api/resumes/{kept}/preview', headers=headers)
+    client.delete(f'/api/resumes/{resume_id}', headers=headers)
+
+    with app.app_context():
+        assert counters.flush() == 1
+    assert stored(app, kept) == (1, 0)
+    assert counters.pending == {}
+
+def test_pdf_export_counts_a_download(client, resume):
+    from app.services.pdf import PDFUnavailable, load_weasyprint
+    headers, resume_id = resume
+
+    try:
+        load_weasyprint()
+    except PDFUnavailable:
+        # An export that fails counts nothing
+        response = client.get(f'/api/resumes/{resume_id}/export/pdf', headers=headers)
+        assert response.status_code == 503
+        assert stats(client, headers, resume_id) == (0, 0)
+        pytest.skip('WeasyPrint is not installed')
+
+    response = client.get(f'/api/resumes/{resume_id}/export/pdf', headers=headers)
+    assert response.status_code == 200
+    assert stats(client, headers, resume_id) == (0, 1)
@@ -0,0 +1,66 @@
+"""Streaming import: records are read one at a time and bad ones are skipped."""
+import io
+import json
+
+import pytest
+
+from app.services import importer
+from app.services.importer import RecordError, iter_records
+from conftest import add_user
+
+def records(data, fmt='json', max_record_bytes=1024):
+    return [doc if not isinstance(doc, RecordError) else 'error'
+            for _, doc in iter_records(io.BytesIO(data.encode('utf-8')), fmt, max_record_bytes)]
+
+@pytest.fixture(params=[3, 64 * 1024], ids=['tiny-reads', 'whole-reads'])
+def read_size(request, monkeypatch):
+    # Tiny reads cut every record, string and number across reads
+    monkeypatch.setattr(importer, 'READ_SIZE', request.param)
+
+def test_json_array_and_concatenated_documents(read_size):
+    docs = [{'title': 'A "quoted" [title]'}, {'title': 'B', 'sections': []}]
+
+    assert records(json.dumps(docs)) == docs
+    assert records(' '.join(json.dumps(doc) for doc in docs)) == docs
+
+def test_numbers_are_not_cut_by_reads(read_size):
+    assert records('[4.5, 12345, {"order": 3.25}]') == [4.5, 12345, {'order': 3.25}]
+
+def test_bad_record_is_reported_and_reading_resumes(read_size):
+    data = '[{"title": "A"}, {"title": nope, "x": "}"}, {"title": "C"}]'
+
+    assert records(data) == [{'title': 'A'}, 'error', {'title': 'C'}]
+
+def test_oversized_record_is_skipped(read_size):
+    data = json.dumps([{'title': 'A'}, {'title': 'x' * 200}, {'title': 'C'}])
+
+    assert records(data, max_record_bytes=100) == [{'title': 'A'}, 'error', {'title': 'C'}]
+
+def test_unterminated_record_ends_the_stream(read_size):
+    assert records('[{"title": "A"}, {"title": "B') == [{'title': 'A'}, 'error']
+
+def test_ndjson_skips_invalid_and_oversized_lines(read_size):
+    data = '{"title": "A"}\nnot json\n\n{"title": "%s"}\n{"title": "D"}' % ('x' * 200)
+
+    assert records(data, 'ndjson', max_record_bytes=100) == [{'title': 'A'}, 'error', 'error',
+                                                             {'title': 'D'}]
+
+def test_import_endpoint_reports_failures_and_imports_the_rest(app, client):
+    _, headers = add_user(app)
+    lines = [
+        {'title': 'PaperTrail', 'sections': [{'title': 'Work', 'entries': [{'title': 'Dev'}]}]},
+        {'basics': {'name': 'JSON Resume'}, 'work': [{'name': 'Acme', 'position': 'Dev',
+                                                      'startDate': '2020-01-01'}]},
+        {'sections': []},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines) + '\n{broken\n'
+
+    response = client.post('/api/resumes/import?format=ndjson', data=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json['imported'] == 2
+    assert [error['record'] for error in response.json['errors']] == [3, 4]
+
+    resumes = client.get('/api/resumes', headers=headers).json
+    assert sorted(resume['title'] for resume in resumes) == ['JSON Resume', 'PaperTrail']
+    work = next(resume for resume in resumes if resume['title'] == 'JSON Resume')['sections'][0]
+    assert work['entries'][0]['current'] is True
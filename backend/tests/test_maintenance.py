@@ -0,0 +1,71 @@
+"""Batched maintenance jobs plan and walk the shard they are run on."""
+import pytest
+from sqlalchemy import select, update
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def app(make_app):
+    return make_app(SHARDS=['default', 'b'])
+
+def scramble_section_order(app, shard):
+    from app import db, shards
+    from app.models import Section
+    with app.app_context(), shards.use(shard):
+        db.session.execute(update(Section).values(order=7))
+        db.session.commit()
+
+def section_orders(app, shard):
+    from app import db, shards
+    from app.models import Section
+    with app.app_context(), shards.use(shard):
+        return db.session.execute(select(Section.resume_id, Section.order)
+                                  .order_by(Section.resume_id, Section.order)).all()
+
+def test_plan_reads_key_range_from_target_shard(app, client):
+    from app.services.maintenance import JOBS, plan
+    _, headers = add_user(app, 'bob', shard='b')
+    for _ in range(5):
+        add_resume(client, headers, sections=1, entries=0)
+
+    with app.app_context():
+        checkpoints = plan(JOBS['repair-section-order'], 'b', parts=2)
+        assert [(c.shard, c.lower, c.upper) for c in checkpoints] == [('b', 1, 3), ('b', 3, None)]
+        # The default shard has no resumes at all
+        assert plan(JOBS['repair-section-order'], 'default', restart=True) == []
+
+def test_repair_runs_on_other_shard(app, client):
+    from app.services.maintenance import JOBS, run
+    _, alice = add_user(app, 'alice', shard='default')
+    _, bob = add_user(app, 'bob', shard='b')
+    # The default shard's lowest resume id is above every id on b
+    for _ in range(4):
+        resume = add_resume(client, alice, sections=2, entries=0)
+        if resume['id'] < 4:
+            client.delete(f"/api/resumes/{resume['id']}", headers=alice)
+    for _ in range(3):
+        add_resume(client, bob, sections=3, entries=0)
+    scramble_section_order(app, 'b')
+
+    with app.app_context():
+        assert run(JOBS['repair-section-order'], 'b', load=1) == 9
+    assert section_orders(app, 'b') == [(r, o) for r in (1, 2, 3) for o in (1, 2, 3)]
+
+def test_interrupted_run_resumes_from_checkpoint(app, client):
+    from app import db
+    from app.models import MaintenanceCheckpoint
+    from app.services.maintenance import JOBS, plan, run
+    _, headers = add_user(app, 'bob', shard='b')
+    for _ in range(4):
+        add_resume(client, headers, sections=2, entries=0)
+    scramble_section_order(app, 'b')
+
+    job = JOBS['repair-section-order']
+    with app.app_context():
+        [checkpoint] = plan(job, 'b')
+        # As if a run had stopped after the first two resumes
+        checkpoint.last_key = 2
+        db.session.commit()
+        assert run(job, 'b', load=1) == 4
+        assert MaintenanceCheckpoint.query.one().finished_at is not None
+    assert section_orders(app, 'b')[:4] == [(1, 7), (1, 7), (2, 7), (2, 7)]
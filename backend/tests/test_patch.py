@@ -0,0 +1,23 @@
+"""PATCH responses agree with GET whatever ``?return=`` asks for."""
+from conftest import add_resume, add_user
+
+def test_changed_and_full_responses_format_updated_at_alike(app, client):
+    _, headers = add_user(app)
+    resume = add_resume(client, headers, sections=0)
+    url = f"/api/resumes/{resume['id']}"
+
+    changed = client.patch(url, json={'title': 'Renamed'}, headers=headers).json
+    stored = client.get(url, headers=headers).json
+    assert changed['title'] == 'Renamed'
+    assert changed['updated_at'] == stored['updated_at']
+
+    full = client.patch(f'{url}?return=full', json={'theme': 'modern'}, headers=headers).json
+    assert full['updated_at'] == client.get(url, headers=headers).json['updated_at']
+
+def test_minimal_response_is_empty(app, client):
+    _, headers = add_user(app)
+    resume = add_resume(client, headers, sections=0)
+
+    response = client.patch(f"/api/resumes/{resume['id']}?return=minimal",
+                            json={'title': 'Renamed'}, headers=headers)
+    assert response.status_code == 204
@@ -0,0 +1,84 @@
+"""Revoked access tokens: logout, password changes and the in-memory mirror."""
+import math
+import time
+
+import pytest
+
+from app.services.revocation import ISSUED_CLAIM, BloomFilter
+from conftest import add_user
+
+@pytest.fixture(autouse=True)
+def revocations(app):
+    from app import revocations
+    # The mirror outlives the app; start from this test's database
+    revocations.loaded_at = None
+    revocations.next_refresh = 0
+    return revocations
+
+def login(client, name='alice'):
+    response = client.post('/api/auth/login',
+                           json={'email': f'{name}@example.com', 'password': 'password'})
+    assert response.status_code == 200
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+def me(client, headers):
+    return client.get('/api/auth/me', headers=headers).status_code
+
+def test_logout_revokes_only_that_token(app, client):
+    add_user(app)
+    phone, laptop = login(client), login(client)
+
+    assert client.post('/api/auth/logout', headers=phone).status_code == 200
+    assert me(client, phone) == 401
+    assert me(client, laptop) == 200
+
+def test_password_change_revokes_earlier_tokens(app, client):
+    add_user(app)
+    other, current = login(client), login(client)
+
+    response = client.post('/api/auth/change-password', headers=current,
+                           json={'current_password': 'password', 'new_password': 'secret'})
+    assert response.status_code == 200
+    fresh = {'Authorization': f"Bearer {response.json['access_token']}"}
+    # Issued within the same second as the revocation, most likely
+    assert me(client, other) == 401
+    assert me(client, current) == 401
+    assert me(client, fresh) == 200
+
+def test_user_revocation_compares_exact_issue_times(app, revocations):
+    from app import db
+    user_id, _ = add_user(app)
+    before = math.floor(time.time()) + 0.5
+
+    with app.app_context():
+        revocations.revoke_user(user_id, before=before)
+        db.session.commit()
+        earlier = {'sub': user_id, 'iat': int(before), ISSUED_CLAIM: before - 0.1}
+        later = {'sub': user_id, 'iat': int(before), ISSUED_CLAIM: before + 0.1}
+        assert revocations.is_revoked({}, earlier)
+        assert not revocations.is_revoked({}, later)
+        # Tokens without the exact claim fall back to whole seconds
+        assert revocations.is_revoked({}, {'sub': user_id, 'iat': int(before)})
+        assert not revocations.is_revoked({}, {'sub': user_id + 1, 'iat': int(before)})
+
+def test_unrevoked_tokens_cost_no_lookup(app, client, revocations):
+    add_user(app)
+    kept, revoked = login(client), login(client)
+    client.post('/api/auth/logout', headers=revoked)
+
+    lookups = revocations.lookups
+    assert me(client, kept) == 200
+    assert revocations.lookups == lookups
+    assert me(client, revoked) == 401
+    assert revocations.lookups == lookups + 1
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(bits=10000, hashes=7)
+    keys = [f'jti-{i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    # Sized for about 1% false positives at this load
+    misses = sum(f'other-{i}' in bloom for i in range(10000))
+    assert misses < 300
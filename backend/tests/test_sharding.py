@@ -0,0 +1,49 @@
+"""Requests reach the shard their user lives on."""
+import pytest
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def app(make_app):
+    return make_app(SHARDS=['default', 'b'])
+
+def test_hash_ring_places_keys_stably():
+    from app.services.sharding import HashRing
+    ring = HashRing(['default', 'b'])
+    grown = HashRing(['default', 'b', 'c'])
+
+    placed = [ring.node_for(key) for key in range(1000)]
+    assert set(placed) == {'default', 'b'}
+    assert placed == [ring.node_for(key) for key in range(1000)]
+    # Adding a shard only moves keys onto it
+    moved = [key for key in range(1000) if grown.node_for(key) != placed[key]]
+    assert moved and all(grown.node_for(key) == 'c' for key in moved)
+
+def test_users_see_only_their_shard(app, client):
+    _, alice = add_user(app, 'alice', shard='default')
+    _, bob = add_user(app, 'bob', shard='b')
+    resume = add_resume(client, bob, sections=1, entries=1)
+
+    assert client.get(f"/api/resumes/{resume['id']}", headers=bob).status_code == 200
+    assert client.get('/api/resumes', headers=alice).json == []
+    with app.app_context():
+        from app import db
+        from app.models import Resume
+        assert db.session.query(Resume).count() == 0
+
+def test_change_feed_token_in_query_string_is_routed(app, client):
+    _, headers = add_user(app, 'bob', shard='b')
+    resume = add_resume(client, headers, sections=0)
+    token = headers['Authorization'].split()[1]
+
+    response = client.get(f"/api/resumes/{resume['id']}/events?jwt={token}", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+
+def test_query_string_token_still_rejected_elsewhere(app, client):
+    _, headers = add_user(app, 'bob', shard='b')
+    resume = add_resume(client, headers, sections=0)
+    token = headers['Authorization'].split()[1]
+
+    assert client.get(f"/api/resumes/{resume['id']}?jwt={token}").status_code == 401
@@ -0,0 +1,84 @@
+"""Cold-start budget for a worker: importing the app and serving its first request.
+
+Each measurement runs in a fresh interpreter, as a newly started worker
+would, with the settings gunicorn.conf.py uses (no Flask-Migrate).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds; generous enough for a loaded CI machine, and a large regression
+# such as importing WeasyPrint or Alembic at startup still fails them
+IMPORT_BUDGET = 1.0
+FIRST_REQUEST_BUDGET = 0.5
+
+# Imported on first use only; see app/services/pdf.py and app/routes/auth.py
+LAZY_MODULES = ('alembic', 'flask_migrate', 'weasyprint', 'email_validator', 'pypdfium2')
+
+FIRST_REQUEST = '''
+import json, time
+started = time.perf_counter()
+from app import create_app, db
+app = create_app('production')
+created = time.perf_counter()
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+before = time.perf_counter()
+response = client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'x'})
+print(json.dumps({'create': created - started, 'first_request': time.perf_counter() - before,
+                  'status': response.status_code}))
+'''
+
+@pytest.fixture
+def environment(tmp_path):
+    env = dict(os.environ)
+    env.update(DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", DB_MIGRATIONS='0',
+               EVENTS_BACKEND='memory', ADMISSION_SQLITE_PATH=str(tmp_path / 'admission.db'),
+               PYTHONDONTWRITEBYTECODE='1')
+    return env
+
+def run_python(env, *args):
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result
+
+def parse_importtime(stderr):
+    """``{module: cumulative seconds}`` from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1e6
+        if not name.startswith('  '):
+            modules.setdefault('<top level>', 0)
+            modules['<top level>'] += int(cumulative) / 1e6
+    return modules
+
+def test_import_stays_within_budget(environment):
+    # create_app too, since extensions may import more as they are set up
+    code = "from app import create_app; create_app('production')"
+    # Warm the filesystem cache so the measurement is of Python, not the disk
+    run_python(environment, '-c', code)
+    modules = parse_importtime(run_python(environment, '-X', 'importtime', '-c', code).stderr)
+    
+    eager = [name for name in LAZY_MODULES if name in modules]
+    assert not eager, f'imported at startup: {", ".join(eager)}'
+    assert modules['<top level>'] < IMPORT_BUDGET, \
+        f"importing the app took {modules['<top level>']:.2f}s"
+
+def test_first_request_stays_within_budget(environment):
+    run_python(environment, '-c', FIRST_REQUEST)
+    timings = json.loads(run_python(environment, '-c', FIRST_REQUEST).stdout.splitlines()[-1])
+    
+    assert timings['status'] == 401
+    assert timings['create'] < IMPORT_BUDGET, f"create_app took {timings['create']:.2f}s"
+    assert timings['first_request'] < FIRST_REQUEST_BUDGET, \
+        f"the first request took {timings['first_request']:.2f}s"
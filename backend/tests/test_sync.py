@@ -0,0 +1,122 @@
+"""Delta sync: cursors, tombstones and the retained journal."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def user(app):
+    return add_user(app)
+
+def sync(client, headers, cursor=None):
+    response = client.get('/api/sync', query_string={'since': cursor} if cursor else {},
+                          headers=headers)
+    assert response.status_code == 200
+    return response.json
+
+def test_first_sync_is_a_snapshot(client, user):
+    _, headers = user
+    resume = add_resume(client, headers, sections=1, entries=1)
+
+    delta = sync(client, headers)
+    assert delta['full'] is True
+    assert delta['replaced'] == [resume]
+    assert delta['cursor'].startswith('0.')
+
+def test_delta_carries_only_changes_since_cursor(client, user):
+    _, headers = user
+    resume = add_resume(client, headers, sections=2, entries=1)
+    cursor = sync(client, headers)['cursor']
+
+    section = resume['sections'][0]
+    client.patch(f"/api/sections/{resume['id']}/sections/{section['id']}",
+                 json={'title': 'Experience'}, headers=headers)
+    delta = sync(client, headers, cursor)
+
+    assert delta['full'] is False
+    assert [s['title'] for s in delta['sections']] == ['Experience']
+    assert delta['resumes'] == delta['entries'] == delta['replaced'] == []
+    assert sync(client, headers, delta['cursor'])['sections'] == []
+
+def test_deletes_leave_tombstones(client, user):
+    _, headers = user
+    resume = add_resume(client, headers, sections=2, entries=1)
+    cursor = sync(client, headers)['cursor']
+
+    section, other = resume['sections']
+    entry = other['entries'][0]
+    client.delete(f"/api/sections/{resume['id']}/sections/{section['id']}", headers=headers)
+    client.delete(f"/api/sections/{resume['id']}/sections/{other['id']}/entries/{entry['id']}",
+                  headers=headers)
+    delta = sync(client, headers, cursor)
+
+    assert delta['deleted'] == {'resumes': [], 'sections': [section['id']],
+                                'entries': [entry['id']]}
+    client.delete(f"/api/resumes/{resume['id']}", headers=headers)
+    assert sync(client, headers, delta['cursor'])['deleted']['resumes'] == [resume['id']]
+
+def test_long_journal_is_paged(app, client, user):
+    _, headers = user
+    app.config['SYNC_PAGE_SIZE'] = 3
+    cursor = sync(client, headers)['cursor']
+    add_resume(client, headers, sections=2, entries=1)
+
+    pages = []
+    while True:
+        delta = sync(client, headers, cursor)
+        pages.append(delta)
+        cursor = delta['cursor']
+        if not delta['has_more']:
+            break
+    assert len(pages) == 2
+    assert sum(len(page['sections']) for page in pages) == 2
+
+def test_invalid_cursor_is_rejected(client, user):
+    _, headers = user
+    assert client.get('/api/sync?since=abc', headers=headers).status_code == 400
+
+def age_journal(app, days):
+    from app import db
+    from app.models import Change
+    with app.app_context():
+        db.session.execute(update(Change).values(
+            created_at=datetime.now(timezone.utc) - timedelta(days=days)))
+        db.session.commit()
+
+def test_expired_cursor_gets_a_snapshot(app, client, user):
+    from app.models import Change
+    from app.services.maintenance import expire_changes_job, run
+    user_id, headers = user
+    resume = add_resume(client, headers, sections=1, entries=0)
+    stale = sync(client, headers)['cursor']
+    client.patch(f"/api/resumes/{resume['id']}", json={'title': 'Renamed'}, headers=headers)
+    current = sync(client, headers, stale)['cursor']
+    age_journal(app, 100)
+
+    with app.app_context():
+        assert run(expire_changes_job(90), 'default', load=1) == 3
+        assert Change.query.count() == 0
+
+    delta = sync(client, headers, stale)
+    assert delta['full'] is True
+    assert [r['title'] for r in delta['replaced']] == ['Renamed']
+    # A cursor that had seen everything expired still gets deltas
+    assert sync(client, headers, current)['full'] is False
+
+def test_expiry_keeps_recent_rows(app, client, user):
+    from app.models import Change
+    from app.services.maintenance import expire_changes_job, run
+    _, headers = user
+    add_resume(client, headers, sections=1, entries=0)
+    age_journal(app, 100)
+    cursor = sync(client, headers)['cursor']
+    add_resume(client, headers, sections=0)
+
+    with app.app_context():
+        assert run(expire_changes_job(90), 'default', load=1) == 2
+        assert Change.query.count() == 1
+    delta = sync(client, headers, cursor)
+    assert delta['full'] is False
+    assert len(delta['resumes']) == 1
@@ -0,0 +1,50 @@
+"""Thumbnails are served to the resume's owner only."""
+import json
+
+import pytest
+
+from conftest import add_resume, add_user
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+@pytest.fixture
+def rendered(app, client):
+    from app import db, thumbnails
+    from app.models import ResumeThumbnail
+    _, headers = add_user(app)
+    resume = add_resume(client, headers, sections=0)
+    digest = thumbnails.store.put(PNG)
+    with app.app_context():
+        db.session.add(ResumeThumbnail(resume_id=resume['id'], fingerprint='f' * 64,
+                                       digests=json.dumps({'small': digest})))
+        db.session.commit()
+    return resume['id'], headers, digest
+
+def test_owner_gets_the_image(client, rendered):
+    resume_id, headers, digest = rendered
+
+    response = client.get(f'/api/resumes/{resume_id}/thumbnail', headers=headers)
+    assert response.status_code == 200
+    assert response.data == PNG
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    again = client.get(f'/api/resumes/{resume_id}/thumbnail',
+                       headers=dict(headers, **{'If-None-Match': f'"{digest}"'}))
+    assert again.status_code == 304
+
+def test_others_get_nothing(app, client, rendered):
+    resume_id, _, digest = rendered
+    _, stranger = add_user(app, 'mallory')
+
+    assert client.get(f'/api/resumes/{resume_id}/thumbnail').status_code == 401
+    assert client.get(f'/api/resumes/{resume_id}/thumbnail', headers=stranger).status_code == 404
+    assert client.get(f'/api/thumbnails/{digest}.png').status_code == 404
+
+def test_unrendered_resume_gets_placeholder(app, client):
+    _, headers = add_user(app)
+    resume = add_resume(client, headers, sections=0)
+
+    response = client.get(f"/api/resumes/{resume['id']}/thumbnail?size=large", headers=headers)
+    assert response.status_code == 202
+    assert response.mimetype == 'image/svg+xml'
+    assert 'Retry-After' in response.headers
@@ -0,0 +1,168 @@
+"""Version history: snapshots, diffs, restores and compaction."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_resume, add_user
+
+@pytest.fixture
+def user(app):
+    return add_user(app)
+
+@pytest.fixture
+def resume(client, user):
+    return add_resume(client, user[1], sections=2, entries=2)
+
+def snapshot(client, headers, resume_id, label=None):
+    response = client.post(f'/api/resumes/{resume_id}/versions',
+                           json={'label': label} if label else {}, headers=headers)
+    assert response.status_code in (200, 201)
+    return response
+
+def edit_entry(client, headers, resume, **fields):
+    section = resume['sections'][0]
+    entry = section['entries'][0]
+    url = f"/api/sections/{resume['id']}/sections/{section['id']}/entries/{entry['id']}"
+    assert client.patch(url, json=fields, headers=headers).status_code == 200
+    return entry['id']
+
+def count_statements(app):
+    from app import db
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+def test_unchanged_resume_reuses_latest_version(client, user, resume):
+    _, headers = user
+    first = snapshot(client, headers, resume['id'])
+    again = snapshot(client, headers, resume['id'])
+
+    assert first.status_code == 201
+    assert again.status_code == 200
+    assert again.json['id'] == first.json['id']
+
+def test_versions_share_unchanged_blobs(app, client, user, resume):
+    from app.models import VersionBlob
+    _, headers = user
+    snapshot(client, headers, resume['id'])
+    with app.app_context():
+        stored = VersionBlob.query.count()
+    edit_entry(client, headers, resume, title='Renamed')
+    snapshot(client, headers, resume['id'])
+
+    with app.app_context():
+        # Only the edited entry, its section and the resume manifest are new
+        assert VersionBlob.query.count() == stored + 3
+
+def test_diff_lists_only_changes(client, user, resume):
+    _, headers = user
+    first = snapshot(client, headers, resume['id']).json
+    entry_id = edit_entry(client, headers, resume, title='Renamed')
+    second = snapshot(client, headers, resume['id']).json
+
+    changes = client.get(f"/api/resumes/{resume['id']}/versions/{second['id']}/diff",
+                         headers=headers).json['changes']
+    [section] = changes['sections']['changed']
+    assert section['entries']['changed'] == [
+        {'id': entry_id, 'fields': {'title': {'from': 'Entry 0.0', 'to': 'Renamed'}}}]
+    assert not changes['sections']['added'] and not changes['sections']['removed']
+
+    current = client.get(f"/api/resumes/{resume['id']}/versions/{first['id']}/diff?base=current",
+                         headers=headers).json['changes']
+    assert current == client.get(
+        f"/api/resumes/{resume['id']}/versions/{first['id']}/diff?base={second['id']}",
+        headers=headers).json['changes']
+
+def test_restore_brings_back_content(client, user, resume):
+    _, headers = user
+    first = snapshot(client, headers, resume['id']).json
+    edit_entry(client, headers, resume, title='Renamed')
+    section_id = resume['sections'][1]['id']
+    client.delete(f"/api/sections/{resume['id']}/sections/{section_id}", headers=headers)
+
+    response = client.post(f"/api/resumes/{resume['id']}/versions/{first['id']}/restore",
+                           headers=headers)
+    assert response.status_code == 200
+    restored = client.get(f"/api/resumes/{resume['id']}", headers=headers).json
+    assert [[e['title'] for e in s['entries']] for s in restored['sections']] == \
+        [['Entry 0.0', 'Entry 0.1'], ['Entry 1.0', 'Entry 1.1']]
+
+    # The backup holds the state from before the restore
+    backup = response.json['backup_version_id']
+    changes = client.get(f"/api/resumes/{resume['id']}/versions/{backup}/diff?base=current",
+                         headers=headers).json['changes']
+    assert changes['sections']['removed'][0]['title'] == 'Section 1'
+
+def test_restore_of_unchanged_resume_skips_snapshot(app, client, user, resume):
+    _, headers = user
+    first = snapshot(client, headers, resume['id']).json
+    edit_entry(client, headers, resume, title='Renamed')
+    latest = snapshot(client, headers, resume['id']).json
+
+    statements = count_statements(app)
+    response = client.post(f"/api/resumes/{resume['id']}/versions/{first['id']}/restore",
+                           headers=headers)
+
+    assert response.json['backup_version_id'] == latest['id']
+    # The live tree was not read to hash it
+    assert not [s for s in statements if s.lstrip().startswith('SELECT')
+                and 'FROM entries' in s and 'section_id IN' in s]
+
+def test_concurrent_snapshots_store_blobs_once(app, user, resume):
+    from app import db
+    from app.models import Resume, VersionBlob
+    from app.services.versions import BlobWriter, build_tree
+    with app.app_context():
+        live = db.session.get(Resume, resume['id'])
+        first, second = BlobWriter(live.id), BlobWriter(live.id)
+        build_tree(live, first)
+        build_tree(live, second)
+        # Both saw every blob as missing
+        first.flush()
+        second.flush()
+        db.session.commit()
+        assert VersionBlob.query.count() == 2 + 2 * 2 + 1
+
+def test_compaction_thins_old_versions(app, user, resume):
+    from app import db
+    from app.models import Resume, ResumeVersion
+    from app.services.versions import compact_versions, create_version
+    app.config.update(VERSION_KEEP_RECENT=2, VERSION_KEEP_DAILY_DAYS=3,
+                      VERSION_KEEP_WEEKLY_WEEKS=2)
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        live = db.session.get(Resume, resume['id'])
+        for age in (0, 0, 1, 1, 2, 8, 8, 40):
+            version, _ = create_version(live, label='x', compact=False)
+            version.label = None
+            version.created_at = now - timedelta(days=age, hours=1)
+        labelled, _ = create_version(live, label='Keep me', compact=False)
+        labelled.created_at = now - timedelta(days=100)
+        db.session.commit()
+
+        removed = compact_versions(live.id, now=now)
+        db.session.commit()
+        ages = sorted((now - version.created_at.replace(tzinfo=timezone.utc)).days
+                      for version in ResumeVersion.query)
+    # Two recent ones, one per day for three days, one per week for two weeks
+    assert removed == 3
+    assert ages == [0, 0, 1, 2, 8, 100]
+
+def test_expired_journal_falls_back_to_hashing(app, client, user, resume):
+    from app import db
+    from app.models import Resume, User
+    from app.services.versions import create_version, unchanged_since
+    _, headers = user
+    snapshot(client, headers, resume['id'])
+    with app.app_context():
+        live = db.session.get(Resume, resume['id'])
+        version, _ = create_version(live)
+        assert unchanged_since(live, version)
+        # As if the rows after the version had expired
+        db.session.get(User, live.user_id).journal_horizon = version.change_id + 1
+        db.session.commit()
+        assert not unchanged_since(live, version)
+        assert create_version(live) == (version, False)
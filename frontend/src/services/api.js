@@ -39,6 +39,7 @@ api.interceptors.response.use(
 export const auth = {
   register: (userData) => api.post('/auth/register', userData),
   login: (credentials) => api.post('/auth/login', credentials),
+  logout: () => api.post('/auth/logout'),
   getMe: () => api.get('/auth/me'),
   changePassword: (data) => api.post('/auth/change-password', data),
 };
@@ -52,6 +53,10 @@ export const resumes = {
   delete: (id) => api.delete(`/resumes/${id}`),
   duplicate: (id) => api.post(`/resumes/${id}/duplicate`),
   exportPdf: (id) => api.get(`/resumes/${id}/export/pdf`),
+  getStats: (id) => api.get(`/resumes/${id}/stats`),
+  // Fetched with the Authorization header; the image follows the redirect
+  getThumbnail: (id, size = 'small') =>
+    api.get(`/resumes/${id}/thumbnail`, { params: { size }, responseType: 'blob' }),
 };
 
 // Sections API
@@ -0,0 +1,78 @@
+import { defineStore } from 'pinia';
+import { ref, computed } from 'vue';
+import { auth } from '@/services/api';
+
+// Store for the signed-in user and their access token
+export const useAuthStore = defineStore('auth', () => {
+  // State
+  const token = ref(localStorage.getItem('token'));
+  const user = ref(null);
+
+  // Getters
+  const isAuthenticated = computed(() => !!token.value);
+
+  // Actions
+  const setToken = (value) => {
+    token.value = value;
+    if (value) {
+      localStorage.setItem('token', value);
+    } else {
+      localStorage.removeItem('token');
+    }
+  };
+
+  const login = async (credentials) => {
+    const { data } = await auth.login(credentials);
+    setToken(data.access_token);
+    user.value = data.user;
+    return data.user;
+  };
+
+  const register = async (userData) => {
+    const { data } = await auth.register(userData);
+    setToken(data.access_token);
+    user.value = data.user;
+    return data.user;
+  };
+
+  const fetchUser = async () => {
+    const { data } = await auth.getMe();
+    user.value = data.user;
+    return data.user;
+  };
+
+  const logout = async () => {
+    try {
+      // Revoke the token on the server before forgetting it here
+      if (token.value) {
+        await auth.logout();
+      }
+    } catch (e) {
+      console.error('Failed to revoke token:', e);
+    } finally {
+      setToken(null);
+      user.value = null;
+    }
+  };
+
+  const changePassword = async (currentPassword, newPassword) => {
+    const { data } = await auth.changePassword({
+      current_password: currentPassword,
+      new_password: newPassword,
+    });
+    // Every older token is revoked; this session continues with the new one
+    setToken(data.access_token);
+    return data;
+  };
+
+  return {
+    token,
+    user,
+    isAuthenticated,
+    login,
+    register,
+    fetchUser,
+    logout,
+    changePassword
+  };
+});
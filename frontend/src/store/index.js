@@ -3,3 +3,4 @@ import { createPinia } from 'pinia'
 export const pinia = createPinia()
 
 // Any global store configurations can go here
+export { useAuthStore } from './auth'